@@ -1,22 +1,99 @@
+import importlib
+
 import click
 
-from chanzuck.cli_helpers.describe import describe
-from chanzuck.cli_helpers.segment import segment
-from chanzuck.cli_helpers.stats import generate_stats
-from chanzuck.cli_helpers.visualize import plot_stats, view
+from chanzuck.utils.memory import MEMORY_ENV, set_memory_budget
 
 
-@click.group()
-def cli():
-    pass
+class LazyGroup(click.Group):
+    """
+    Click group that only imports a subcommand's module when that command
+    is looked up, so ``chanzuck --help`` and each command only pay for the
+    imports they use.
+
+    Commands are registered as ``{"name": "module.path:attribute"}``.
+    """
+
+    def __init__(self, *args, lazy_subcommands: dict | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx: click.Context) -> list[str]:
+        return sorted(
+            {*super().list_commands(ctx), *self.lazy_subcommands.keys()}
+        )
+
+    def get_command(
+        self, ctx: click.Context, cmd_name: str
+    ) -> click.Command | None:
+        if cmd_name in self.lazy_subcommands:
+            return self._load_command(cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def _load_command(self, cmd_name: str) -> click.Command:
+        module_name, attribute = self.lazy_subcommands[cmd_name].split(":")
+        command = getattr(importlib.import_module(module_name), attribute)
+        if not isinstance(command, click.Command):
+            raise ValueError(
+                f"Lazy loading of {cmd_name} failed: {module_name}:{attribute}"
+                " is not a click command."
+            )
+        return command
+
+
+def _apply_memory_budget(ctx: click.Context, param, value: str | None):
+    try:
+        set_memory_budget(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e), ctx=ctx, param=param) from e
+    return value
+
+
+def _apply_fetch_workers(ctx: click.Context, param, value: int | None):
+    if value is not None:
+        # Only imported when given, it pulls in zarr
+        from chanzuck.utils.remote import set_fetch_workers
+
+        set_fetch_workers(value)
+    return value
 
 
 ## Add commands
-cli.add_command(segment)
-cli.add_command(describe)
-cli.add_command(view)
-cli.add_command(plot_stats)
-cli.add_command(generate_stats)
+@click.group(
+    cls=LazyGroup,
+    lazy_subcommands={
+        "segment": "chanzuck.cli_helpers.segment:segment",
+        "describe": "chanzuck.cli_helpers.describe:describe",
+        "view": "chanzuck.cli_helpers.visualize:view",
+        "plot-stats": "chanzuck.cli_helpers.visualize:plot_stats",
+        "generate-stats": "chanzuck.cli_helpers.stats:generate_stats",
+        "pyramid": "chanzuck.cli_helpers.pyramid:pyramid",
+        "export-patches": "chanzuck.cli_helpers.patches:export_patches",
+        "run": "chanzuck.cli_helpers.run:run",
+        "track": "chanzuck.cli_helpers.track:track",
+        "render-movie": "chanzuck.cli_helpers.visualize:render_movie",
+    },
+)
+@click.option(
+    "--max-memory",
+    envvar=MEMORY_ENV,
+    callback=_apply_memory_budget,
+    expose_value=False,
+    help="Memory budget shared by every command, e.g. '8GB'. Limits worker "
+    "counts and processes frames in Z slabs when they do not fit.",
+)
+@click.option(
+    "--fetch-workers",
+    type=click.IntRange(min=1),
+    callback=_apply_fetch_workers,
+    expose_value=False,
+    help="Chunks read concurrently per dataset (default 16, or "
+    "CHANZUCK_FETCH_WORKERS). Raise it for object stores and network "
+    "filesystems.",
+)
+def cli():
+    pass
+
 
 if __name__ == "__main__":
     cli()
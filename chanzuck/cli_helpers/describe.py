@@ -3,7 +3,7 @@ from pathlib import Path
 
 import click
 
-from chanzuck.utils.describe import describe_dataset, format_pretty_output
+from chanzuck.cli_helpers.location import DATASET_LOCATION
 
 
 # Chat gpt
@@ -11,8 +11,8 @@ from chanzuck.utils.describe import describe_dataset, format_pretty_output
 @click.option(
     "--dataset-path",
     required=True,
-    type=click.Path(exists=True, dir_okay=True),
-    help="Path to the dataset.",
+    type=DATASET_LOCATION,
+    help="Path or fsspec URL (s3://, gs://, ...) of the OME-Zarr dataset.",
 )
 @click.option(
     "--out-file",
@@ -26,19 +26,48 @@ from chanzuck.utils.describe import describe_dataset, format_pretty_output
     is_flag=True,
     help="Output in JSON format instead of pretty CLI format.",
 )
-def describe(dataset_path: str, out_file: str | None, as_json: bool):
+@click.option(
+    "--refresh",
+    is_flag=True,
+    help="Ignore the cached metadata index and rescan the dataset.",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    help="Also report per-channel intensity statistics for each position.",
+)
+@click.option(
+    "--workers",
+    default=8,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Threads used to read chunks when profiling.",
+)
+def describe(
+    dataset_path: str,
+    out_file: str | None,
+    as_json: bool,
+    refresh: bool,
+    profile: bool,
+    workers: int,
+):
     """Describe an OME-Zarr dataset and optionally save metadata to a file."""
-    dataset_path = Path(dataset_path)
-
-    if not dataset_path.exists() or not dataset_path.is_dir():
-        click.secho(
-            f"Error: Dataset path '{dataset_path}' does not exist or is not a directory.",
-            fg="red",
-        )
-        raise click.Abort()
+    from chanzuck.utils.describe import (
+        describe_dataset_fast,
+        format_pretty_output,
+    )
 
     try:
-        metadata = describe_dataset(dataset_path)
+        metadata = describe_dataset_fast(dataset_path, use_cache=not refresh)
+        if profile:
+            from chanzuck.utils.data_profile import profile_dataset
+
+            profile_dataset(
+                dataset_path,
+                metadata,
+                use_cache=not refresh,
+                max_workers=workers,
+            )
         output_str = (
             json.dumps(metadata, indent=2)
             if as_json
@@ -0,0 +1,20 @@
+import click
+
+
+class DatasetLocation(click.ParamType):
+    """
+    A dataset given as a local path, which must exist, or an fsspec URL such
+    as ``s3://bucket/plate.zarr`` that is checked when it is opened.
+    """
+
+    name = "path or URL"
+
+    def convert(self, value, param, ctx):
+        if "://" in str(value):
+            return str(value)
+        return click.Path(exists=True, dir_okay=True).convert(
+            value, param, ctx
+        )
+
+
+DATASET_LOCATION = DatasetLocation()
@@ -0,0 +1,75 @@
+import click
+
+
+@click.command("export-patches")
+@click.option(
+    "--dataset-path",
+    type=click.Path(exists=True, dir_okay=True),
+    required=True,
+    help="Path to the segmented OME-Zarr dataset.",
+)
+@click.option(
+    "--out-dir",
+    type=click.Path(file_okay=False),
+    required=True,
+    help="Directory to write patches.npy, masks.npy and metadata.csv to.",
+)
+@click.option(
+    "--stats-dir",
+    type=click.Path(exists=True, file_okay=False),
+    required=False,
+    help="Stats from generate-stats, used to label infected cells.",
+)
+@click.option(
+    "--patch-size",
+    default="8,64,64",
+    show_default=True,
+    help="Patch shape as 'Z,Y,X'.",
+)
+@click.option(
+    "--channel",
+    "channels",
+    type=int,
+    multiple=True,
+    help="Channel index to export, repeat for several. Defaults to all.",
+)
+@click.option(
+    "--workers",
+    default=8,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Threads extracting patches.",
+)
+def export_patches(
+    dataset_path: str,
+    out_dir: str,
+    stats_dir: str | None,
+    patch_size: str,
+    channels: tuple[int, ...],
+    workers: int,
+):
+    """
+    Export a fixed-size patch around every cell into memory-mappable arrays.
+    """
+    try:
+        size = tuple(int(s) for s in patch_size.split(","))
+    except ValueError as e:
+        raise click.BadParameter(
+            "Patch size must look like '8,64,64'.", param_hint="--patch-size"
+        ) from e
+    if len(size) != 3 or min(size) < 1:
+        raise click.BadParameter(
+            "Patch size needs three positive integers (Z,Y,X).",
+            param_hint="--patch-size",
+        )
+
+    from chanzuck.spatial.patches import export_patches as export
+
+    export(
+        dataset_path,
+        out_dir,
+        patch_size=size,
+        channels=list(channels) or None,
+        stats_dir=stats_dir,
+        max_workers=workers,
+    )
@@ -0,0 +1,142 @@
+import click
+
+from chanzuck.cli_helpers.selection import selection_from, selection_options
+
+
+@click.command("pyramid")
+@click.option(
+    "--dataset-path",
+    type=click.Path(exists=True, dir_okay=True),
+    required=True,
+    help="Path to the OME-Zarr dataset.",
+)
+@click.option(
+    "--levels",
+    type=click.IntRange(min=2),
+    default=3,
+    show_default=True,
+    help="Number of pyramid levels including full resolution.",
+)
+@click.option(
+    "--scheduler",
+    type=click.Choice(["threads", "processes", "synchronous"]),
+    default="threads",
+    show_default=True,
+    help="Dask scheduler used to compute each position's pyramid.",
+)
+@click.option(
+    "--isotropic/--uniform",
+    default=True,
+    show_default=True,
+    help=(
+        "Use the physical scale to only downsample axes until voxels are "
+        "isotropic, or halve Z, Y and X at every level."
+    ),
+)
+@click.option(
+    "--factor",
+    "factors",
+    multiple=True,
+    help=(
+        "Explicit 'Z,Y,X' factor of one level relative to the previous one. "
+        "Repeat once per level below full resolution."
+    ),
+)
+@click.option(
+    "--labels/--no-labels",
+    default=True,
+    show_default=True,
+    help="Also build a pyramid for the Nuclei_Segmentation labels.",
+)
+@click.option(
+    "--label-method",
+    type=click.Choice(["mode", "nearest"]),
+    default="mode",
+    show_default=True,
+    help="How label blocks are reduced, neither invents new label IDs.",
+)
+@click.option(
+    "--incremental",
+    is_flag=True,
+    help=(
+        "Keep existing levels and only rebuild timepoints that were appended "
+        "or rewritten since the last pyramid build."
+    ),
+)
+@click.option(
+    "--layout",
+    type=click.Choice(["chunked", "sharded"]),
+    default="chunked",
+    show_default=True,
+    help=(
+        "'sharded' packs the chunks of each level timepoint into a few shard "
+        "files instead of one file per chunk."
+    ),
+)
+@click.option(
+    "--projections/--no-projections",
+    default=True,
+    show_default=True,
+    help=(
+        "Also store max and mean Z projections of every channel and "
+        "projected label outlines, from the same reads as the levels."
+    ),
+)
+@selection_options(z_range=False)
+def pyramid(
+    dataset_path: str,
+    levels: int,
+    scheduler: str,
+    isotropic: bool,
+    factors: tuple[str, ...],
+    labels: bool,
+    label_method: str,
+    incremental: bool,
+    layout: str,
+    projections: bool,
+    wells: tuple[str, ...] | None,
+    positions: tuple[str, ...] | None,
+    time_range: tuple[int, int | None] | None,
+):
+    """
+    Build a multiscale downsample pyramid for every position in the dataset.
+    """
+    from chanzuck.utils.image_pyramider import (
+        create_downsample_pyramid_for_dataset,
+    )
+
+    level_factors = None
+    if factors:
+        try:
+            level_factors = [
+                tuple(int(f) for f in factor.split(",")) for factor in factors
+            ]
+        except ValueError as e:
+            raise click.BadParameter(
+                "Factors must look like '1,2,2'.", param_hint="--factor"
+            ) from e
+        if any(len(f) != 3 or min(f) < 1 for f in level_factors):
+            raise click.BadParameter(
+                "Factors need three positive integers (Z,Y,X).",
+                param_hint="--factor",
+            )
+        if len(level_factors) != levels - 1:
+            raise click.BadParameter(
+                f"Got {len(level_factors)} factors for {levels} levels, "
+                f"expected {levels - 1}.",
+                param_hint="--factor",
+            )
+
+    create_downsample_pyramid_for_dataset(
+        dataset_path,
+        levels=levels,
+        scheduler=scheduler,
+        isotropic=isotropic,
+        factors=level_factors,
+        label_names=("Nuclei_Segmentation",) if labels else (),
+        label_method=label_method,
+        incremental=incremental,
+        layout=layout,
+        projections=projections,
+        selection=selection_from(wells, positions, time_range),
+    )
@@ -0,0 +1,51 @@
+import click
+
+from chanzuck.utils.stages import STAGE_SECTIONS
+
+
+@click.command("run")
+@click.argument("config_path", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--force",
+    multiple=True,
+    type=click.Choice(STAGE_SECTIONS),
+    help="Rerun this stage even if it is up to date (repeatable).",
+)
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    required=False,
+    help="Stages run at the same time, overrides 'workers' of the config.",
+)
+def run(config_path: str, force: tuple[str, ...], workers: int | None):
+    """
+    Run the segment -> track -> (pyramid, stats) -> plots pipeline of a
+    TOML or JSON config, skipping stages whose inputs and parameters did
+    not change since their last run.
+    """
+    from chanzuck.utils.pipeline import (
+        build_pipeline,
+        load_config,
+        read_run_record,
+        run_stages,
+        write_run_record,
+    )
+
+    config = load_config(config_path)
+    stages = build_pipeline(config)
+    click.echo(
+        f"🧪 Pipeline: {', '.join(stage.name for stage in stages)} "
+        f"on {config['dataset']}"
+    )
+    status = run_stages(
+        stages,
+        read_run_record(config["dataset"]),
+        save_record=lambda record: write_run_record(config["dataset"], record),
+        force=force,
+        max_workers=workers or config.get("workers", 2),
+    )
+
+    for name, state in status.items():
+        click.echo(f"  {name:<8} {state}")
+    if any(state in ("failed", "blocked") for state in status.values()):
+        raise SystemExit(1)
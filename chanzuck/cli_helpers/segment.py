@@ -2,7 +2,14 @@ import traceback
 
 import click
 
-from chanzuck.utils.describe import describe_dataset
+from chanzuck.cli_helpers.selection import (
+    run_selection,
+    selection_from,
+    selection_options,
+    worker_options,
+)
+
+MODEL_TYPES = ["cellpose", "otsu", "watershed"]
 
 
 # Chat gpt
@@ -15,12 +22,14 @@ from chanzuck.utils.describe import describe_dataset
 )
 @click.option(
     "--model-type",
-    type=click.Choice(["cellpose", "otsu"], case_sensitive=False),
+    type=click.Choice(MODEL_TYPES, case_sensitive=False),
     required=False,
     help=(
         "Model type to use:\n"
-        "  'cellpose' - Use Cellpose nuclei model\n"
-        "  'otsu'     - Otsu threshold the channel if your signal is clean enough\n"
+        "  'cellpose'  - Use Cellpose nuclei model\n"
+        "  'otsu'      - Otsu threshold the channel if your signal is clean enough\n"
+        "  'watershed' - Otsu foreground split into touching nuclei by a\n"
+        "                distance transform watershed, much faster than Cellpose\n"
     ),
 )
 @click.option(
@@ -35,7 +44,87 @@ from chanzuck.utils.describe import describe_dataset
     show_default=True,
     help="Use GPU for segmentation if available (Cellpose only).",
 )
-def segment(dataset_path, model_type, channel_index, gpu):
+@click.option(
+    "--label-dtype",
+    type=click.Choice(["auto", "uint16", "uint32"]),
+    default="auto",
+    show_default=True,
+    help=(
+        "Dtype of the label array. 'auto' stores uint16 and promotes to "
+        "uint32 if a frame has more labels."
+    ),
+)
+@click.option(
+    "--codec",
+    type=click.Choice(["zstd", "lz4", "zlib", "blosclz", "none"]),
+    default="zstd",
+    show_default=True,
+    help="Blosc codec of the label array ('none' disables compression).",
+)
+@click.option(
+    "--clevel",
+    type=click.IntRange(0, 9),
+    default=5,
+    show_default=True,
+    help="Compression level of the label array.",
+)
+@click.option(
+    "--shuffle",
+    type=click.Choice(["none", "byte", "bit"]),
+    default="byte",
+    show_default=True,
+    help="Blosc shuffle filter of the label array.",
+)
+@click.option(
+    "--layout",
+    type=click.Choice(["chunked", "sharded"]),
+    default="chunked",
+    show_default=True,
+    help=(
+        "'sharded' packs the label chunks of each timepoint into a few "
+        "shard files instead of one file per chunk."
+    ),
+)
+@click.option(
+    "--track/--no-track",
+    default=True,
+    show_default=True,
+    help=(
+        "Track nuclei frame to frame while segmenting. Use --no-track and "
+        "run 'chanzuck track' afterwards for gap closing and divisions."
+    ),
+)
+@click.option(
+    "--projections/--no-projections",
+    default=True,
+    show_default=True,
+    help=(
+        "Store Z projections of the nuclei channel and projected label "
+        "outlines of every frame for the viewer's 2D mode."
+    ),
+)
+@selection_options()
+@worker_options
+def segment(
+    dataset_path,
+    model_type,
+    channel_index,
+    gpu,
+    label_dtype,
+    codec,
+    clevel,
+    shuffle,
+    layout,
+    track,
+    projections,
+    wells,
+    positions,
+    time_range,
+    z_range,
+    shard,
+    queue_name,
+    lease,
+):
     """
     Segment 3D time-lapse OME-Zarr datasets and track cells over time.
     Will prompt for channel and model if not provided.
@@ -43,10 +132,11 @@ def segment(dataset_path, model_type, channel_index, gpu):
     from chanzuck.segment.nuclei_segmentation import (
         segment_and_track_3d_over_time,
     )
+    from chanzuck.utils.describe import describe_dataset_fast
 
     try:
         # Get metadata and extract channels
-        metadata = describe_dataset(dataset_path)
+        metadata = describe_dataset_fast(dataset_path)
         example_pos = next(iter(metadata["Wells"].values()))
         example_meta = next(iter(example_pos.values()))
         channel_names = example_meta.get("channels", [])
@@ -72,15 +162,31 @@ def segment(dataset_path, model_type, channel_index, gpu):
         if model_type is None:
             model_type = click.prompt(
                 "🧠 Select model type",
-                type=click.Choice(["cellpose", "otsu"], case_sensitive=False),
+                type=click.Choice(MODEL_TYPES, case_sensitive=False),
                 default="cellpose",
             )
 
-        segment_and_track_3d_over_time(
-            zarr_path=dataset_path,
-            channel_index=channel_index,
-            model_type=model_type,
-            use_gpu=gpu,
+        run_selection(
+            dataset_path,
+            "segment",
+            lambda selection: segment_and_track_3d_over_time(
+                zarr_path=dataset_path,
+                channel_index=channel_index,
+                model_type=model_type,
+                use_gpu=gpu,
+                label_dtype=label_dtype,
+                codec=codec,
+                clevel=clevel,
+                shuffle=shuffle,
+                selection=selection,
+                track=track,
+                layout=layout,
+                projections=projections,
+            ),
+            selection_from(wells, positions, time_range, z_range),
+            shard,
+            queue_name,
+            lease,
         )
         click.secho("✅ Segmentation complete!", fg="green")
 
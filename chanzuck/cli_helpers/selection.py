@@ -0,0 +1,143 @@
+import click
+
+from chanzuck.utils.selection import Selection, parse_range, parse_shard
+
+
+def _split_ids(ctx, param, values):
+    # Accept repeated options and comma separated lists alike
+    ids = tuple(v.strip() for value in values for v in value.split(","))
+    return tuple(v for v in ids if v) or None
+
+
+def _range(ctx, param, value):
+    if value is None:
+        return None
+    try:
+        return parse_range(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e)) from e
+
+
+def selection_options(z_range: bool = True, time_range: bool = True):
+    """
+    Adds ``--wells``, ``--positions`` and optionally ``--time-range`` and
+    ``--z-range`` to a command. Read them back with ``selection_from``.
+    """
+    options = [
+        click.option(
+            "--wells",
+            multiple=True,
+            callback=_split_ids,
+            help="Only process these wells, e.g. 'C/2,B/3'.",
+        ),
+        click.option(
+            "--positions",
+            multiple=True,
+            callback=_split_ids,
+            help="Only process these positions, e.g. '000001' or 'C/2/000001'.",
+        ),
+    ]
+    if time_range:
+        options.append(
+            click.option(
+                "--time-range",
+                callback=_range,
+                help="Timepoints 'start:stop' (stop exclusive), e.g. '0:3'.",
+            )
+        )
+    if z_range:
+        options.append(
+            click.option(
+                "--z-range",
+                callback=_range,
+                help="Z planes 'start:stop' (stop exclusive), e.g. '10:20'.",
+            )
+        )
+
+    def decorator(command):
+        for option in reversed(options):
+            command = option(command)
+        return command
+
+    return decorator
+
+
+def selection_from(
+    wells, positions, time_range=None, z_range=None
+) -> Selection:
+    """Builds the ``Selection`` of the parsed selection options."""
+    return Selection(
+        wells=wells,
+        positions=positions,
+        time_range=time_range,
+        z_range=z_range,
+    )
+
+
+def _shard(ctx, param, value):
+    if value is None:
+        return None
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e)) from e
+
+
+def worker_options(command):
+    """
+    Adds ``--shard``, ``--queue`` and ``--lease`` for splitting a plate
+    across processes and hosts. Pass them on to ``run_selection``.
+    """
+    options = [
+        click.option(
+            "--shard",
+            callback=_shard,
+            help="Only process shard 'i/N' of the positions (i from 0).",
+        ),
+        click.option(
+            "--queue",
+            "queue_name",
+            help=(
+                "Cooperate with other workers through lock files in the "
+                "store. Workers using the same queue name never process a "
+                "position twice and take over positions of dead workers."
+            ),
+        ),
+        click.option(
+            "--lease",
+            type=click.FloatRange(min=1),
+            default=120.0,
+            show_default=True,
+            help="Seconds without a heartbeat before a claim is taken over.",
+        ),
+    ]
+    for option in reversed(options):
+        command = option(command)
+    return command
+
+
+def run_selection(
+    dataset_path, stage, process, selection, shard, queue_name, lease
+) -> list:
+    """
+    Calls ``process(selection)`` once, or once per position of this worker
+    when a shard or queue is given.
+
+    Returns:
+        list: Results of every call.
+    """
+    if shard is None and queue_name is None:
+        return [process(selection)]
+
+    from chanzuck.utils.work_queue import WorkQueue, run_positions
+
+    queue = (
+        WorkQueue(dataset_path, stage, name=queue_name, lease=lease)
+        if queue_name
+        else None
+    )
+    results = run_positions(
+        dataset_path, process, selection, shard=shard, queue=queue
+    )
+    click.echo(f"🧩 Processed {len(results)} positions.")
+    return list(results.values())
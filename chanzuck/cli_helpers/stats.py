@@ -1,12 +1,20 @@
 import click
 
+from chanzuck.cli_helpers.location import DATASET_LOCATION
+from chanzuck.cli_helpers.selection import (
+    run_selection,
+    selection_from,
+    selection_options,
+    worker_options,
+)
+
 
 @click.command("generate-stats")
 @click.option(
     "--dataset-path",
-    type=click.Path(exists=True, dir_okay=True),
+    type=DATASET_LOCATION,
     required=True,
-    help="Path to the OME-Zarr dataset.",
+    help="Path or fsspec URL (s3://, gs://, ...) of the OME-Zarr dataset.",
 )
 @click.option(
     "--stats-dir",
@@ -20,28 +28,63 @@ import click
     show_default=True,
     help="Whether to visualize the stats after generating them.",
 )
-def generate_stats(dataset_path: str, stats_dir: str, visualize: bool):
+@click.option(
+    "--out-dir",
+    type=click.Path(file_okay=False),
+    required=False,
+    help="Render every plot headlessly into this directory (implies --visualize).",
+)
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(["png", "pdf", "svg", "jpg"], case_sensitive=False),
+    default="png",
+    show_default=True,
+    help="File format of the plots written to --out-dir.",
+)
+@selection_options()
+@worker_options
+def generate_stats(
+    dataset_path: str,
+    stats_dir: str,
+    visualize: bool,
+    out_dir: str | None,
+    fmt: str,
+    wells: tuple[str, ...] | None,
+    positions: tuple[str, ...] | None,
+    time_range: tuple[int, int | None] | None,
+    z_range: tuple[int, int | None] | None,
+    shard: tuple[int, int] | None,
+    queue_name: str | None,
+    lease: float,
+):
     """
     Gather features over the segmented image and optionally display plots
     """
     from chanzuck.spatial.stats import extract_cell_stats
 
-    if not visualize:
-        _ = extract_cell_stats(dataset_path, save_dir=stats_dir)
+    results = run_selection(
+        dataset_path,
+        "generate-stats",
+        lambda selection: extract_cell_stats(
+            dataset_path, save_dir=stats_dir, selection=selection
+        ),
+        selection_from(wells, positions, time_range, z_range),
+        shard,
+        queue_name,
+        lease,
+    )
+    if not visualize and not out_dir:
         return
 
     # If the user wants to visualize then import
-    from chanzuck.spatial.visualize import (
-        plot_cell_count_over_time,
-        plot_infection_rate_change_over_time,
-        plot_mean_dapi_vs_virus,
-        plot_phase_intensity_over_time,
-        plot_predicted_infection_over_time,
-        plot_viral_intensity_over_time,
-    )
+    from chanzuck.spatial.visualize import plot_all, render_plots_to_dir
 
     # Flatten the dictionaries to get the well and position id combo
-    cell_stats_dict = extract_cell_stats(dataset_path, save_dir=stats_dir)
+    cell_stats_dict = {}
+    for result in results:
+        for well_id, pos_dict in result.items():
+            cell_stats_dict.setdefault(well_id, {}).update(pos_dict)
 
     names = []
     dfs = []
@@ -51,9 +94,8 @@ def generate_stats(dataset_path: str, stats_dir: str, visualize: bool):
             dfs.append(df)
 
     # Plot quantitities of interest
-    plot_viral_intensity_over_time(names, dfs)
-    plot_predicted_infection_over_time(names, dfs)
-    plot_infection_rate_change_over_time(names, dfs)
-    plot_cell_count_over_time(names, dfs)
-    plot_mean_dapi_vs_virus(names, dfs)
-    plot_phase_intensity_over_time(names, dfs)
+    if out_dir:
+        paths = render_plots_to_dir(names, dfs, out_dir, fmt=fmt)
+        click.echo(f"🖼️ Wrote {len(paths)} plots to {out_dir}")
+    else:
+        plot_all(names, dfs)
@@ -0,0 +1,77 @@
+import click
+
+from chanzuck.cli_helpers.selection import selection_from, selection_options
+
+
+@click.command("track")
+@click.option(
+    "--dataset-path",
+    type=click.Path(exists=True, dir_okay=True),
+    required=True,
+    help="Path to the segmented OME-Zarr dataset.",
+)
+@click.option(
+    "--max-dist-um",
+    type=click.FloatRange(min=0, min_open=True),
+    default=50,
+    show_default=True,
+    help="Max distance in microns between linked nuclei, also across gaps.",
+)
+@click.option(
+    "--max-gap",
+    type=click.IntRange(min=0),
+    default=2,
+    show_default=True,
+    help="Timepoints a nucleus may be missing from and keep its ID.",
+)
+@click.option(
+    "--split-dist-um",
+    type=click.FloatRange(min=0),
+    default=None,
+    help=(
+        "Max distance in microns between a dividing nucleus and a daughter "
+        "(default half of --max-dist-um, 0 ignores divisions)."
+    ),
+)
+@click.option(
+    "--promote/--no-promote",
+    default=True,
+    show_default=True,
+    help="Promote uint16 labels to uint32 when track IDs do not fit.",
+)
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="Threads measuring and relabeling timepoints.",
+)
+@selection_options(z_range=False, time_range=False)
+def track(
+    dataset_path: str,
+    max_dist_um: float,
+    max_gap: int,
+    split_dist_um: float | None,
+    promote: bool,
+    workers: int,
+    wells: tuple[str, ...] | None,
+    positions: tuple[str, ...] | None,
+):
+    """
+    Track segmented nuclei over time from their centroids and relabel them.
+
+    Centroids and areas are measured once per timepoint and cached, so
+    re-tracking with other parameters only rewrites the labels.
+    """
+    from chanzuck.segment.tracking import track_dataset
+
+    track_dataset(
+        dataset_path,
+        selection=selection_from(wells, positions),
+        max_dist_um=max_dist_um,
+        max_gap=max_gap,
+        split_dist_um=split_dist_um,
+        promote=promote,
+        max_workers=workers,
+    )
+    click.secho("✅ Tracking complete!", fg="green")
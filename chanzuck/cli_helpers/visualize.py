@@ -1,12 +1,15 @@
 import click
 
+from chanzuck.cli_helpers.location import DATASET_LOCATION
+from chanzuck.cli_helpers.selection import selection_from, selection_options
+
 
 @click.command("view")
 @click.option(
     "--dataset-path",
-    type=click.Path(exists=True, dir_okay=True),
+    type=DATASET_LOCATION,
     required=True,
-    help="Path to the OME-Zarr dataset.",
+    help="Path or fsspec URL (s3://, gs://, ...) of the OME-Zarr dataset.",
 )
 @click.option(
     "--show-segmentations/--no-show-segmentations",
@@ -14,13 +17,44 @@ import click
     show_default=True,
     help="Whether to display segmentation masks if available.",
 )
-def view(dataset_path, show_segmentations):
+@click.option(
+    "--cache-mb",
+    type=click.IntRange(min=0),
+    default=2048,
+    show_default=True,
+    help="Memory budget (MB) of the chunk cache shared across positions.",
+)
+@click.option(
+    "--prefetch/--no-prefetch",
+    default=True,
+    show_default=True,
+    help=(
+        "Read neighbouring timepoints and the next position in the "
+        "background."
+    ),
+)
+@click.option(
+    "--projection",
+    type=click.Choice(["max", "mean"]),
+    default=None,
+    help=(
+        "Start in the fast 2D mode on the cached Z projections written by "
+        "'pyramid' and 'segment'. The mode can be switched in the viewer."
+    ),
+)
+def view(dataset_path, show_segmentations, cache_mb, prefetch, projection):
     """
     Launch Napari to visualize OME-Zarr datasets.
     """
     from chanzuck.visualize.image_visualizer import view_image
 
-    view_image(dataset_path, show_segmentations)
+    view_image(
+        dataset_path,
+        show_segmentations,
+        cache_mb,
+        prefetch,
+        mode=projection or "3D",
+    )
 
 
 @click.command("plot-stats")
@@ -28,35 +62,154 @@ def view(dataset_path, show_segmentations):
     "--stats-dir",
     type=click.Path(exists=True, file_okay=False),
     required=True,
-    help="Directory containing .csv files for each position.",
+    help="Directory searched recursively for the .csv files of each position.",
 )
-def plot_stats(stats_dir):
+@click.option(
+    "--out-dir",
+    type=click.Path(file_okay=False),
+    required=False,
+    help="Render every plot headlessly into this directory instead of showing it.",
+)
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(["png", "pdf", "svg", "jpg"], case_sensitive=False),
+    default="png",
+    show_default=True,
+    help="File format of the plots written to --out-dir.",
+)
+def plot_stats(stats_dir, out_dir, fmt):
     """
     Plot some interesting features over the desired image statistics
     """
-    import os
-
-    import pandas as pd
+    from time import perf_counter
 
+    from chanzuck.spatial.stats import find_stats_files, load_stats_files
     from chanzuck.spatial.visualize import (
-        plot_cell_count_over_time,
-        plot_infection_rate_change_over_time,
-        plot_mean_dapi_vs_virus,
-        plot_phase_intensity_over_time,
-        plot_predicted_infection_over_time,
-        plot_viral_intensity_over_time,
+        PLOT_COLUMN_DTYPES,
+        plot_all,
+        render_plots_to_dir,
+    )
+
+    file_paths = find_stats_files(stats_dir)
+    if not file_paths:
+        click.secho(f"❌ No .csv files found under {stats_dir}", fg="red")
+        raise click.Abort()
+
+    start = perf_counter()
+    pos_ids, dfs = load_stats_files(
+        file_paths, stats_dir, dtypes=PLOT_COLUMN_DTYPES
+    )
+    elapsed = max(perf_counter() - start, 1e-9)
+
+    n_bytes = sum(path.stat().st_size for path in file_paths)
+    n_rows = sum(len(df) for df in dfs)
+    click.echo(
+        f"📥 Loaded {len(file_paths)} files ({n_rows:,} rows) in "
+        f"{elapsed:.2f}s | {n_bytes / 1e6 / elapsed:.1f} MB/s, "
+        f"{n_rows / elapsed:,.0f} rows/s"
     )
 
-    dfs = []
-    pos_ids = []
-    for fname in os.listdir(stats_dir):
-        if fname.endswith(".csv"):
-            pos_ids.append(fname.replace(".csv", ""))
-            dfs.append(pd.read_csv(os.path.join(stats_dir, fname)))
-
-    plot_viral_intensity_over_time(pos_ids, dfs)
-    plot_predicted_infection_over_time(pos_ids, dfs)
-    plot_infection_rate_change_over_time(pos_ids, dfs)
-    plot_cell_count_over_time(pos_ids, dfs)
-    plot_mean_dapi_vs_virus(pos_ids, dfs)
-    plot_phase_intensity_over_time(pos_ids, dfs)
+    if out_dir:
+        paths = render_plots_to_dir(pos_ids, dfs, out_dir, fmt=fmt)
+        click.echo(f"🖼️ Wrote {len(paths)} plots to {out_dir}")
+    else:
+        plot_all(pos_ids, dfs)
+
+
+@click.command("render-movie")
+@click.option(
+    "--dataset-path",
+    type=DATASET_LOCATION,
+    required=True,
+    help="Path or fsspec URL (s3://, gs://, ...) of the OME-Zarr dataset.",
+)
+@click.option(
+    "--out-dir",
+    type=click.Path(file_okay=False),
+    required=True,
+    help="Directory receiving one movie (or PNG directory) per position.",
+)
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(["mp4", "gif", "png"], case_sensitive=False),
+    default="mp4",
+    show_default=True,
+    help="Video format, or 'png' for an image sequence. Needs imageio "
+    "(mp4 also imageio-ffmpeg), PNGs are written otherwise.",
+)
+@click.option(
+    "--fps",
+    type=click.FloatRange(min=0, min_open=True),
+    default=10,
+    show_default=True,
+    help="Frames per second.",
+)
+@click.option(
+    "--level",
+    type=click.IntRange(min=0),
+    default=None,
+    help="Pyramid level to render from, the coarsest one by default.",
+)
+@click.option(
+    "--channel",
+    "channels",
+    type=int,
+    multiple=True,
+    help="Channel index to show, repeat for several. Defaults to all.",
+)
+@click.option(
+    "--stats-dir",
+    type=click.Path(exists=True, file_okay=False),
+    required=False,
+    help="Stats from generate-stats, infected nuclei are outlined in red.",
+)
+@click.option(
+    "--outlines/--no-outlines",
+    default=True,
+    show_default=True,
+    help="Draw the nuclei outlines from the label pyramid.",
+)
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Processes rendering frames.",
+)
+@selection_options(z_range=False)
+def render_movie(
+    dataset_path: str,
+    out_dir: str,
+    fmt: str,
+    fps: float,
+    level: int | None,
+    channels: tuple[int, ...],
+    stats_dir: str | None,
+    outlines: bool,
+    workers: int,
+    wells: tuple[str, ...] | None,
+    positions: tuple[str, ...] | None,
+    time_range: tuple[int, int | None] | None,
+):
+    """
+    Render a time-lapse movie of each position without a display.
+
+    Frames show the max Z projection of every channel in the viewer's
+    colors with the nuclei outlines on top.
+    """
+    from chanzuck.visualize.movie import render_movie as render
+
+    render(
+        dataset_path,
+        out_dir,
+        fmt=fmt.lower(),
+        fps=fps,
+        level=level,
+        channels=list(channels) or None,
+        stats_dir=stats_dir,
+        outlines=outlines,
+        selection=selection_from(wells, positions, time_range),
+        max_workers=workers,
+    )
@@ -0,0 +1,304 @@
+import numpy as np
+import zarr
+from scipy.ndimage import label as ndi_label
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial.distance import cdist
+from skimage.filters import threshold_otsu
+
+# Histogram bins of the streamed Otsu threshold
+OTSU_BINS = 256
+
+
+def _slabs(z_slice: slice, planes: int) -> list[slice]:
+    return [
+        slice(z, min(z + planes, z_slice.stop))
+        for z in range(z_slice.start, z_slice.stop, planes)
+    ]
+
+
+def streaming_otsu(
+    array: zarr.Array, t: int, channel: int, z_slice: slice, planes: int
+) -> float:
+    """
+    Otsu threshold of one channel of one frame, computed from a histogram
+    accumulated slab by slab so the frame is never fully in memory.
+
+    Args:
+        array (zarr.Array): (T, C, Z, Y, X) image.
+        t (int): Timepoint.
+        channel (int): Channel index.
+        z_slice (slice): Z planes of the frame to use.
+        planes (int): Z planes read at once.
+
+    Returns:
+        float: Threshold in the units of the stored data.
+    """
+    slabs = _slabs(z_slice, planes)
+    lo, hi = np.inf, -np.inf
+    for z in slabs:
+        slab = array[t, channel, z]
+        lo, hi = min(lo, slab.min()), max(hi, slab.max())
+    if lo == hi:
+        return float(lo)
+
+    counts = np.zeros(OTSU_BINS, dtype=np.int64)
+    edges = np.linspace(lo, hi, OTSU_BINS + 1)
+    for z in slabs:
+        counts += np.histogram(array[t, channel, z], bins=edges)[0]
+    centers = (edges[:-1] + edges[1:]) / 2
+    return float(threshold_otsu(hist=(counts, centers)))
+
+
+def label_in_slabs(
+    array: zarr.Array,
+    t: int,
+    channel: int,
+    z_slice: slice,
+    planes: int,
+    threshold: float,
+    scratch: zarr.Array,
+) -> np.ndarray:
+    """
+    Labels the connected components above ``threshold`` slab by slab.
+
+    Provisional per-slab labels are written to ``scratch`` and components
+    touching across slab faces are merged afterwards. Applying the returned
+    lookup table to ``scratch`` gives exactly the labels of ``ndi_label``
+    on the whole frame.
+
+    Args:
+        array (zarr.Array): (T, C, Z, Y, X) image.
+        t (int): Timepoint.
+        channel (int): Channel index.
+        z_slice (slice): Z planes to label.
+        planes (int): Z planes read at once.
+        threshold (float): Foreground threshold.
+        scratch (zarr.Array): uint32 (Z, Y, X) array covering ``z_slice``.
+
+    Returns:
+        np.ndarray: Provisional -> final label lookup table.
+    """
+    offset = 0
+    edges = []
+    previous_face = None
+    for z in _slabs(z_slice, planes):
+        labels, n = ndi_label(array[t, channel, z] > threshold)
+        labels = labels.astype(np.uint32)
+        labels[labels > 0] += offset
+        offset += n
+        if previous_face is not None:
+            touching = (previous_face > 0) & (labels[0] > 0)
+            edges.append(
+                np.stack([previous_face[touching], labels[0][touching]])
+            )
+        previous_face = labels[-1]
+        scratch[z.start - z_slice.start : z.stop - z_slice.start] = labels
+
+    edges = (
+        np.unique(np.concatenate(edges, axis=1), axis=1)
+        if edges
+        else np.zeros((2, 0), dtype=np.uint32)
+    )
+    graph = coo_matrix(
+        (np.ones(edges.shape[1]), (edges[0], edges[1])),
+        shape=(offset + 1, offset + 1),
+    )
+    n_components, component = connected_components(graph, directed=False)
+
+    # Number components by their first voxel in raster order, which is the
+    # part with the smallest provisional label, like ndi_label does
+    first = np.full(n_components, offset + 1)
+    np.minimum.at(first, component, np.arange(offset + 1))
+    rank = np.empty(n_components, dtype=np.uint32)
+    rank[np.argsort(first)] = np.arange(n_components, dtype=np.uint32)
+    return rank[component]
+
+
+def centroid_table(
+    labels, lut: np.ndarray | None, planes: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Centroids and areas of ``lut[labels]`` accumulated slab by slab.
+
+    Args:
+        labels: (Z, Y, X) zarr or dask array of (provisional) labels.
+        lut (np.ndarray | None): Lookup table applied to the labels, None
+            to use them as they are.
+        planes (int): Z planes read at once.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: (N, 3) centroids, label
+        IDs and voxel counts of every label present.
+    """
+    counts = np.zeros(1)
+    sums = np.zeros((3, 1))
+    for z in _slabs(slice(0, labels.shape[0]), planes):
+        slab = np.asarray(labels[z])
+        if lut is not None:
+            slab = lut[slab]
+        flat = slab.ravel().astype(np.intp)
+        n_labels = max(len(counts), int(flat.max(initial=0)) + 1)
+        counts = np.pad(counts, (0, n_labels - len(counts)))
+        sums = np.pad(sums, ((0, 0), (0, n_labels - sums.shape[1])))
+
+        zz, yy, xx = np.indices(slab.shape, sparse=True)
+        counts += np.bincount(flat, minlength=n_labels)
+        for axis, coords in enumerate((zz + z.start, yy, xx)):
+            sums[axis] += np.bincount(
+                flat,
+                weights=np.broadcast_to(coords, slab.shape).ravel(),
+                minlength=n_labels,
+            )
+    present = np.flatnonzero(counts[1:]) + 1
+    centroids = (sums[:, present] / counts[present]).T
+    return centroids, present, counts[present]
+
+
+def filter_small(
+    centroids: np.ndarray, labels: np.ndarray, areas: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Drops objects below the Otsu threshold of the areas when there are
+    more than two, like ``get_centroids``."""
+    if len(areas) > 2:
+        keep = areas >= threshold_otsu(np.asarray(areas))
+        return centroids[keep], labels[keep]
+    return centroids, labels
+
+
+def tracking_lut(
+    prev_centroids: np.ndarray,
+    prev_labels: np.ndarray,
+    curr_centroids: np.ndarray,
+    curr_labels: np.ndarray,
+    spatial_scales: tuple[float, float, float],
+    max_dist_um: float = 50,
+    max_label: int | None = None,
+) -> np.ndarray | None:
+    """
+    Lookup table relabeling the current frame to the previous one's IDs.
+
+    Labels are matched by the Hungarian assignment of their scaled centroid
+    distances up to ``max_dist_um``. Unmatched labels get new IDs above the
+    matched ones and labels missing from ``curr_labels`` (filtered small
+    objects) map to background.
+
+    Args:
+        prev_centroids (np.ndarray): (N, 3) centroids of the previous frame.
+        prev_labels (np.ndarray): Their label IDs.
+        curr_centroids (np.ndarray): (M, 3) centroids of the current frame.
+        curr_labels (np.ndarray): Their label IDs.
+        spatial_scales (tuple[float, float, float]): Z, Y, X microns.
+        max_dist_um (float): Max distance (in microns) allowed for matches.
+        max_label (int | None): Largest label of the current frame, sizes
+            the table. Defaults to the largest of ``curr_labels``.
+
+    Returns:
+        np.ndarray | None: Current label -> tracked label, None when nothing
+        can be matched and the frame should be kept as is.
+    """
+    if len(prev_centroids) == 0 or len(curr_centroids) == 0:
+        return None
+
+    scale_arr = np.array(spatial_scales)
+    cost_matrix = cdist(prev_centroids * scale_arr, curr_centroids * scale_arr)
+    cost_matrix[cost_matrix > max_dist_um] = np.inf
+    if np.all(np.isinf(cost_matrix)):
+        return None
+    try:
+        row_ind, col_ind = linear_sum_assignment(cost_matrix)
+    except ValueError:
+        return None
+
+    if max_label is None:
+        max_label = int(curr_labels.max())
+    lut = np.zeros(max_label + 1, dtype=np.uint32)
+    matched = [
+        (i, j)
+        for i, j in zip(row_ind, col_ind, strict=True)
+        if cost_matrix[i, j] != np.inf
+    ]
+    for i, j in matched:
+        lut[curr_labels[j]] = prev_labels[i]
+
+    new_label = max((int(prev_labels[i]) for i, _ in matched), default=0) + 1
+    for label in curr_labels:
+        if label != 0 and lut[label] == 0:
+            lut[label] = new_label
+            new_label += 1
+    return lut
+
+
+def segment_otsu_in_slabs(
+    array: zarr.Array,
+    t: int,
+    channel: int,
+    z_slice: slice,
+    planes: int,
+    scratch: zarr.Array,
+    previous_table: tuple[np.ndarray, np.ndarray] | None = None,
+    spatial_scales: tuple[float, float, float] = (1.0, 1.0, 1.0),
+    max_dist_um: float = 50,
+) -> tuple[np.ndarray, tuple[np.ndarray, np.ndarray]]:
+    """
+    Otsu segmentation and tracking of one frame that never holds more than
+    ``planes`` Z planes in memory, equivalent to thresholding, labelling and
+    ``track_labels`` on the whole frame.
+
+    Args:
+        array (zarr.Array): (T, C, Z, Y, X) image.
+        t (int): Timepoint.
+        channel (int): Channel holding the nuclei.
+        z_slice (slice): Z planes to segment.
+        planes (int): Z planes read at once.
+        scratch (zarr.Array): uint32 (Z, Y, X) array covering ``z_slice``,
+            receives provisional labels.
+        previous_table (tuple | None): Centroids and labels of the previous
+            frame from an earlier call, None for the first frame.
+        spatial_scales (tuple[float, float, float]): Z, Y, X microns.
+        max_dist_um (float): Max tracking distance in microns.
+
+    Returns:
+        tuple: Lookup table to write ``scratch`` with (``write_with_lut``)
+        and the centroid table to pass for the next frame.
+    """
+    threshold = streaming_otsu(array, t, channel, z_slice, planes)
+    lut = label_in_slabs(
+        array, t, channel, z_slice, planes, threshold, scratch
+    )
+    centroids, labels, areas = centroid_table(scratch, lut, planes)
+
+    if previous_table is not None:
+        track = tracking_lut(
+            *previous_table,
+            *filter_small(centroids, labels, areas),
+            spatial_scales,
+            max_dist_um=max_dist_um,
+            max_label=int(lut.max(initial=0)),
+        )
+        if track is not None:
+            lut = track[lut]
+            tracked = track[labels]
+            kept = tracked > 0
+            centroids, labels, areas = (
+                centroids[kept],
+                tracked[kept],
+                areas[kept],
+            )
+    return lut, filter_small(centroids, labels, areas)
+
+
+def write_with_lut(
+    scratch: zarr.Array,
+    lut: np.ndarray,
+    out: zarr.Array,
+    t: int,
+    z_slice: slice,
+    planes: int,
+):
+    """Writes ``lut[scratch]`` into ``out[t, 0, z_slice]`` slab by slab."""
+    for z in _slabs(slice(0, scratch.shape[0]), planes):
+        out[t, 0, z.start + z_slice.start : z.stop + z_slice.start] = lut[
+            scratch[z]
+        ].astype(out.dtype)
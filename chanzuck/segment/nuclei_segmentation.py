@@ -1,58 +1,245 @@
 from pathlib import Path
+from time import perf_counter
 
+import dask.array as da
 import numpy as np
-import torch
-from cellpose import models
-from iohub import open_ome_zarr
+import zarr
 from scipy.ndimage import label as ndi_label
-from scipy.optimize import linear_sum_assignment
-from scipy.spatial.distance import cdist
 from skimage.filters import threshold_otsu
 from skimage.measure import regionprops
 from tqdm import tqdm
 
+from chanzuck.segment.chunked import (
+    centroid_table,
+    filter_small,
+    segment_otsu_in_slabs,
+    tracking_lut,
+    write_with_lut,
+)
+from chanzuck.segment.watershed import watershed_segment
+from chanzuck.utils.cell_index import frame_bounding_boxes, write_cell_index
+from chanzuck.utils.data_profile import stored_size
 from chanzuck.utils.dataloader import CellposeZarrLoader
+from chanzuck.utils.image_pyramider import timepoint_signatures
+from chanzuck.utils.label_storage import (
+    LABEL_NAME,
+    create_label_array,
+    ensure_label_capacity,
+    label_compressor,
+)
+from chanzuck.utils.memory import segmentation_plane_bytes, slab_planes
+from chanzuck.utils.projections import write_projections
+from chanzuck.utils.remote import open_dataset
+from chanzuck.utils.selection import Selection
+from chanzuck.utils.sharding import sharded, writing
 
 
 def segment_and_track_3d_over_time(
     zarr_path: str | Path,
     channel_index: int = 0,
-    model_type: str = "cellpose",  # or "otsu"
+    model_type: str = "cellpose",  # or "otsu", "watershed"
     use_gpu: bool = False,
     on_level: int = 0,
+    label_dtype: str = "auto",
+    codec: str = "zstd",
+    clevel: int = 5,
+    shuffle: str = "byte",
+    selection: Selection | None = None,
+    max_dist_um: float = 50,
+    track: bool = True,
+    layout: str = "chunked",
+    projections: bool = True,
 ):
-    loader = CellposeZarrLoader(zarr_path, channel_indices=[channel_index])
+    """
+    Segments every timepoint of every position and tracks labels over time
+    into a ``Nuclei_Segmentation`` array.
+
+    A ``selection`` restricts the work to some wells, positions, timepoints
+    and Z planes, only their chunks are read and written. Label arrays of
+    partially selected positions are kept when their shape still matches,
+    and tracking continues from the stored labels of the timepoint before
+    the selected range so label IDs stay consistent with the rest.
+
+    Label volumes are mostly background and runs of identical IDs, so they
+    are written with their own compressor (zstd level 5 with byte shuffle
+    by default, several times smaller than the image codec). With
+    ``label_dtype="auto"`` labels are stored as ``uint16`` and the array is
+    promoted to ``uint32`` only if a frame holds larger IDs.
+
+    When a memory budget is set (``--max-memory``) and a frame would not
+    fit, the "otsu" model thresholds, labels and tracks it in slabs of Z
+    planes with the same result. Cellpose needs whole volumes and only
+    warns.
+
+    Args:
+        zarr_path (str | Path): Path to the OME-Zarr plate.
+        channel_index (int): Channel containing the nuclei.
+        model_type (str): "cellpose", "otsu" or "watershed".
+        use_gpu (bool): Run Cellpose on the GPU if available.
+        on_level (int): Unused, resolution level to segment.
+        label_dtype (str): "auto", "uint16" or "uint32".
+        codec (str): Blosc codec of the labels, or "none" to disable
+            compression.
+        clevel (int): Compression level (0-9).
+        shuffle (str): Blosc shuffle, "none", "byte" or "bit".
+        selection (Selection | None): Part of the plate to segment, all of
+            it when None.
+        max_dist_um (float): Largest centroid displacement in microns
+            between frames for a label to keep its ID.
+        track (bool): Track labels frame to frame while segmenting. Leave
+            it off when ``chanzuck track`` runs afterwards, each frame then
+            keeps the IDs it was segmented with.
+        layout (str): "chunked" stores every chunk of the labels in its own
+            file, "sharded" packs the chunks of each timepoint into a few
+            shard files (see ``ShardedStore``).
+        projections (bool): Store the Z projections of the segmented
+            channel and the projected label outlines of every frame that
+            is segmented whole, from the volumes already in memory (see
+            ``chanzuck.utils.projections``).
+    """
+    selection = selection or Selection()
+    loader = CellposeZarrLoader(
+        zarr_path, channel_indices=[channel_index], selection=selection
+    )
+    if len(loader) == 0:
+        raise ValueError(f"The selection matches nothing in {zarr_path}.")
+    compressor = label_compressor(codec, clevel, shuffle)
+    initial_dtype = "uint16" if label_dtype == "auto" else label_dtype
 
     if model_type == "cellpose":
+        # Only Cellpose needs torch, the CPU models run without either
+        import torch
+        from cellpose import models
+
+        if use_gpu and not torch.cuda.is_available():
+            print("⚠️ GPU requested but not available. Falling back to CPU.")
+            use_gpu = False
         model = models.Cellpose(gpu=use_gpu, model_type="nuclei")
-    if use_gpu and not torch.cuda.is_available():
-        print("⚠️ GPU requested but not available. Falling back to CPU.")
-        use_gpu = False
 
     # Store scales and prepare output
-    dataset_scales = []
-    with open_ome_zarr(zarr_path, mode="a") as dataset:
-        for i, (_, well) in enumerate(dataset.wells()):
-            for _, pos in well.positions():
-                pos._overwrite = True
-                shape = list(loader.dataset_shapes[i])
-                shape[1] = 1  # single-channel for output
-                pos.create_zeros(
-                    name="Nuclei_Segmentation",
+    dataset_scales = {}
+    slab_sizes: dict[tuple[str, str], int | None] = {}
+    # Positions whose labels are fully rewritten, so their index is exact
+    full_positions = set()
+    with open_dataset(zarr_path, mode="a") as dataset:
+        for key, image_shape, chunks in zip(
+            loader.positions,
+            loader.dataset_shapes,
+            loader.dataset_chunksizes,
+            strict=True,
+        ):
+            pos = dataset["/".join(key)]
+            shape = list(image_shape)
+            shape[1] = 1  # single-channel for output
+            covered = selection.covers(image_shape[0], image_shape[2])
+            if covered:
+                full_positions.add(key)
+            if (
+                covered
+                or LABEL_NAME not in pos
+                or pos[LABEL_NAME].shape != tuple(shape)
+            ):
+                create_label_array(
+                    pos,
+                    LABEL_NAME,
                     shape=tuple(shape),
-                    dtype="uint32",
-                    chunks=loader.dataset_chunksizes[i],
+                    chunks=chunks,
+                    dtype=initial_dtype,
+                    compressor=compressor,
+                    shards=layout == "sharded",
+                )
+            dataset_scales[key] = pos.scale
+
+            # Z planes per slab, None when the frame fits in the budget
+            z_slice = selection.z_slice(image_shape[2])
+            n_planes = z_slice.stop - z_slice.start
+            plane_bytes = segmentation_plane_bytes(
+                image_shape[-2:], 1, loader.array(*key).dtype.itemsize
+            )
+            planes = slab_planes(plane_bytes, n_planes)
+            slab_sizes[key] = None
+            if planes < n_planes and model_type != "otsu":
+                print(
+                    f"⚠️ A frame of {'/'.join(key)} needs "
+                    f"{plane_bytes * n_planes / 1024**2:.0f} MB, over the "
+                    f"memory budget, but {model_type} needs whole volumes."
+                )
+            elif planes < n_planes:
+                print(
+                    f"🧩 Segmenting {'/'.join(key)} in slabs of {planes} "
+                    "Z planes to stay within the memory budget."
                 )
-                dataset_scales.append(pos.scale)
+                slab_sizes[key] = planes
 
     previous_labels = None
+    previous_table = None
+    previous_key = None
+    scratch = None
+    # Per position bounding boxes of the final (tracked) labels
+    index_rows: dict[tuple[str, str], list[np.ndarray]] = {}
 
     for i in tqdm(range(len(loader)), desc="Segmenting"):
+        well_name, pos_name, time_idx = loader.entries[i]
+        array = loader.array(well_name, pos_name)
+        z_slice = selection.z_slice(array.shape[2])
+        planes = slab_sizes[(well_name, pos_name)]
+
+        # Tracks never continue across positions. A selection starting past
+        # t=0 continues from the stored labels of the previous timepoint.
+        if (well_name, pos_name) != previous_key:
+            previous_key = (well_name, pos_name)
+            previous_labels = previous_table = None
+            if planes is not None:
+                scratch = zarr.zeros(
+                    (z_slice.stop - z_slice.start, *array.shape[-2:]),
+                    chunks=(planes, *array.shape[-2:]),
+                    dtype=np.uint32,
+                    store=zarr.TempStore(),
+                )
+            if track and time_idx > 0:
+                with open_dataset(zarr_path, mode="r") as dataset:
+                    stored = sharded(dataset[well_name][pos_name][LABEL_NAME])
+                    if planes is None:
+                        previous_labels = stored[time_idx - 1, 0, z_slice]
+                    else:
+                        previous_table = filter_small(
+                            *centroid_table(
+                                da.from_zarr(stored)[time_idx - 1, 0, z_slice],
+                                None,
+                                planes,
+                            )
+                        )
+
+        if planes is not None:
+            lut, previous_table = segment_otsu_in_slabs(
+                array,
+                time_idx,
+                channel_index,
+                z_slice,
+                planes,
+                scratch,
+                previous_table if track else None,
+                dataset_scales[previous_key][2:],
+                max_dist_um=max_dist_um,
+            )
+            with open_dataset(zarr_path, mode="a") as dataset:
+                labels = ensure_label_capacity(
+                    dataset[well_name][pos_name],
+                    LABEL_NAME,
+                    max_label=int(lut.max(initial=0)),
+                    promote=label_dtype == "auto",
+                )
+                with writing(labels) as out:
+                    write_with_lut(
+                        scratch, lut, out, time_idx, z_slice, planes
+                    )
+            # No bounding boxes without the whole frame, the index is
+            # rebuilt when it is loaded
+            full_positions.discard(previous_key)
+            continue
+
         sample = loader[i]
         image = sample["image"]  # (C, Z, Y, X)
-        time_idx = sample["time"]
-        pos_name = sample["position"]
-        well_name = sample["well"]
 
         # Chat gpt
         # --- Inference --- #
@@ -64,23 +251,79 @@ def segment_and_track_3d_over_time(
             img = np.squeeze(image[0])  # (Z, Y, X)
             thresh = threshold_otsu(img)
             masks, _ = ndi_label(img > thresh)
+        elif model_type == "watershed":
+            masks = watershed_segment(
+                np.squeeze(image[0]), sampling=dataset_scales[previous_key][2:]
+            )
         else:
             raise ValueError(f"Unknown model_type '{model_type}'")
 
         # --- Tracking --- #
-        if previous_labels is not None:
-            scale = dataset_scales[0][2:]  # Z, Y, X
-            masks = track_labels(previous_labels, masks, scale)
+        if track and previous_labels is not None:
+            scale = dataset_scales[previous_key][2:]  # Z, Y, X
+            masks = track_labels(
+                previous_labels, masks, scale, max_dist_um=max_dist_um
+            )
 
         # --- Save --- #
-        with open_ome_zarr(zarr_path, mode="a") as dataset:
-            dataset[well_name][pos_name]["Nuclei_Segmentation"][time_idx] = (
-                masks[np.newaxis, ...]
+        with open_dataset(zarr_path, mode="a") as dataset:
+            pos = dataset[well_name][pos_name]
+            labels = ensure_label_capacity(
+                pos,
+                LABEL_NAME,
+                max_label=int(masks.max(initial=0)),
+                promote=label_dtype == "auto",
+            )
+
+            start = perf_counter()
+            with writing(labels) as out:
+                out[time_idx, 0, z_slice] = masks.astype(labels.dtype)
+            elapsed = perf_counter() - start
+            frame_bytes = masks.size * labels.dtype.itemsize
+            tqdm.write(
+                f"💾 {well_name}/{pos_name} t={time_idx}: "
+                f"{stored_size(labels, timepoint=time_idx) / 1024:.1f} kB on "
+                f"disk ({labels.dtype}), "
+                f"{frame_bytes / 1024**2 / max(elapsed, 1e-9):.0f} MB/s"
             )
 
+            # Projections need every Z plane
+            n_planes = array.shape[2]
+            if projections and len(range(*z_slice.indices(n_planes))) == (
+                n_planes
+            ):
+                write_projections(
+                    pos.zgroup,
+                    "0",
+                    time_idx,
+                    sample["raw"][0],
+                    timepoint_signatures(pos["0"], timepoint=time_idx),
+                    channel=channel_index,
+                )
+                write_projections(
+                    pos.zgroup,
+                    LABEL_NAME,
+                    time_idx,
+                    masks,
+                    timepoint_signatures(labels, timepoint=time_idx),
+                )
+
+        if previous_key in full_positions:
+            index_rows.setdefault(previous_key, []).append(
+                frame_bounding_boxes(masks, time_idx)
+            )
         previous_labels = masks
         del image, sample, masks
 
+    with open_dataset(zarr_path, mode="a") as dataset:
+        # Partial runs leave the index stale, it is rebuilt when loaded
+        for (well_name, pos_name), rows in index_rows.items():
+            write_cell_index(
+                dataset[well_name][pos_name].zgroup,
+                np.concatenate(rows),
+                LABEL_NAME,
+            )
+
 
 # Chat gpt
 def get_centroids(mask, filter_small: bool = True):
@@ -120,42 +363,15 @@ def track_labels(
     prev_centroids, prev_labels = get_centroids(prev_mask)
     curr_centroids, curr_labels = get_centroids(curr_mask)
 
-    if len(prev_centroids) == 0 or len(curr_centroids) == 0:
-        return curr_mask
-
-    # Scale centroids by physical spacing
-    scale_arr = np.array(spatial_scales)
-    prev_scaled = prev_centroids * scale_arr
-    curr_scaled = curr_centroids * scale_arr
-
-    # Compute cost matrix with scaled distances
-    cost_matrix = cdist(prev_scaled, curr_scaled)
-    cost_matrix[cost_matrix > max_dist_um] = np.inf
-
-    if np.all(np.isinf(cost_matrix)):
-        return curr_mask
-
-    try:
-        row_ind, col_ind = linear_sum_assignment(cost_matrix)
-    except ValueError:
+    lut = tracking_lut(
+        prev_centroids,
+        prev_labels,
+        curr_centroids,
+        curr_labels,
+        spatial_scales,
+        max_dist_um=max_dist_um,
+        max_label=int(curr_mask.max()),
+    )
+    if lut is None:
         return curr_mask
-
-    relabeled = np.zeros_like(curr_mask, dtype=np.uint32)
-    used_labels = set()
-
-    for i, j in zip(row_ind, col_ind, strict=True):
-        if cost_matrix[i, j] != np.inf:
-            target_label = prev_labels[i]
-            current_label = curr_labels[j]
-            relabeled[curr_mask == current_label] = target_label
-            used_labels.add(target_label)
-
-    new_label = max(used_labels, default=0) + 1
-    for label in curr_labels:
-        if label == 0:
-            continue
-        if np.all(relabeled[curr_mask == label] == 0):
-            relabeled[curr_mask == label] = new_label
-            new_label += 1
-
-    return relabeled
+    return lut[curr_mask]
@@ -0,0 +1,532 @@
+import math
+from pathlib import Path
+
+import dask.array as da
+import numpy as np
+import pandas as pd
+import zarr
+from iohub.ngff import Position
+from scipy.optimize import linear_sum_assignment
+from scipy.spatial.distance import cdist
+from tqdm import tqdm
+
+from chanzuck.segment.chunked import centroid_table
+from chanzuck.utils.cell_index import (
+    INDEX_COLUMNS,
+    INDEX_GROUP,
+    INDEX_ORDER,
+    label_signature,
+    load_label_table,
+    stale_table_timepoints,
+    write_label_table,
+)
+from chanzuck.utils.image_pyramider import timepoint_signatures
+from chanzuck.utils.label_storage import LABEL_NAME, ensure_label_capacity
+from chanzuck.utils.memory import limit_workers, slab_planes
+from chanzuck.utils.projections import (
+    projection_names,
+    record_projections,
+    stale_projections,
+)
+from chanzuck.utils.remote import open_dataset
+from chanzuck.utils.selection import Selection
+from chanzuck.utils.sharding import sharded, writing
+
+# Subgroup of a position holding one object table per label array
+OBJECT_GROUP = "objects"
+OBJECT_COLUMNS = ("label", "t", "z", "y", "x", "area")
+OBJECT_ORDER = ("t", "label")
+# Cost standing in for impossible matches, keeps assignments feasible
+_FORBIDDEN = 1e12
+
+
+def frame_objects(labels: zarr.Array, t: int, planes: int | None = None):
+    """
+    Centroid and area of every label of one timepoint, read in slabs of Z.
+
+    Args:
+        labels (zarr.Array): (T, 1, Z, Y, X) label array.
+        t (int): Timepoint.
+        planes (int | None): Z planes read at once, as many as the memory
+            budget allows when None.
+
+    Returns:
+        np.ndarray: (N, 6) float64 rows of ``OBJECT_COLUMNS``, voxel
+        coordinates.
+    """
+    frame = da.from_zarr(labels)[t, 0]
+    if planes is None:
+        planes = slab_planes(_plane_bytes(labels), frame.shape[0])
+    centroids, ids, areas = centroid_table(frame, None, planes)
+    return np.column_stack(
+        [ids, np.full(len(ids), t), centroids, areas]
+    ).astype(np.float64)
+
+
+def write_object_table(
+    position: zarr.Group,
+    rows: np.ndarray,
+    name: str = LABEL_NAME,
+    signature: dict[str, int] | None = None,
+) -> zarr.Array:
+    """
+    Stores object rows as ``objects/<name>`` in a position, sorted by time
+    then label, like the cell index (see ``write_label_table``).
+
+    Args:
+        position (zarr.Group): Position group holding the label array.
+        rows (np.ndarray): (N, 6) rows from ``frame_objects``.
+        name (str): Name of the label array.
+        signature (dict | None): Label signature the rows were computed
+            from, the current one when None.
+
+    Returns:
+        zarr.Array: The table array.
+    """
+    return write_label_table(
+        position,
+        OBJECT_GROUP,
+        name,
+        rows,
+        OBJECT_COLUMNS,
+        OBJECT_ORDER,
+        signature,
+    )
+
+
+def load_object_table(
+    position: zarr.Group, name: str = LABEL_NAME, max_workers: int = 8
+) -> pd.DataFrame:
+    """
+    Loads the object table of a label array. Only timepoints whose labels
+    changed since the table was stored are measured again, concurrently,
+    and the updated table is stored unless the position is read-only.
+
+    Args:
+        position (zarr.Group): Position group holding the label array.
+        name (str): Name of the label array.
+        max_workers (int): Threads measuring timepoints.
+
+    Returns:
+        pd.DataFrame: One row per label and timepoint, ``OBJECT_COLUMNS``.
+    """
+    labels = sharded(position[name])
+    planes = slab_planes(_plane_bytes(labels), labels.shape[2])
+    table = load_label_table(
+        position,
+        OBJECT_GROUP,
+        name,
+        OBJECT_COLUMNS,
+        OBJECT_ORDER,
+        lambda t: frame_objects(labels, t, planes),
+        planes * _plane_bytes(labels),
+        max_workers,
+        dtype=np.float64,
+    )
+    return table.astype({"label": np.int64, "t": np.int64})
+
+
+def link_tracks(
+    objects: pd.DataFrame,
+    spatial_scales: tuple[float, float, float],
+    max_dist_um: float = 50,
+    max_gap: int = 2,
+    split_dist_um: float | None = None,
+    split_area_ratio: tuple[float, float] = (0.6, 1.6),
+) -> tuple[dict[int, np.ndarray], list[dict]]:
+    """
+    Links objects into tracks from their centroids and areas only.
+
+    Objects of consecutive timepoints are matched by the Hungarian
+    assignment of their scaled centroid distances up to ``max_dist_um``.
+    Tracks ending early are then joined to tracks starting up to
+    ``max_gap`` timepoints later, closing the gaps left by cells missed in
+    some frames. A track starting next to an object of the previous frame
+    whose track continues is a division when the two daughters together
+    have about the area of the mother; the mother's track then ends and
+    both daughters get new tracks.
+
+    Args:
+        objects (pd.DataFrame): Rows of ``OBJECT_COLUMNS``.
+        spatial_scales (tuple[float, float, float]): Z, Y, X microns.
+        max_dist_um (float): Max distance (in microns) between linked
+            objects, also across gaps.
+        max_gap (int): Missing timepoints a track may skip, 0 disables gap
+            closing.
+        split_dist_um (float | None): Max distance between a mother and a
+            new daughter, half of ``max_dist_um`` when None. 0 disables
+            division detection.
+        split_area_ratio (tuple[float, float]): Accepted range of the
+            daughters' summed area over the mother's.
+
+    Returns:
+        tuple: Timepoint -> lookup table from stored to tracked labels,
+        and the divisions as ``{"t", "parent", "daughters"}`` dicts of
+        tracked labels.
+    """
+    objects = objects.sort_values(["t", "label"]).reset_index(drop=True)
+    if objects.empty:
+        return {}, []
+    split_dist_um = max_dist_um / 2 if split_dist_um is None else split_dist_um
+    coords = objects[["z", "y", "x"]].to_numpy() * np.asarray(spatial_scales)
+    times = objects["t"].to_numpy()
+    areas = objects["area"].to_numpy()
+    first_t, last_t = int(times.min()), int(times.max())
+    rows_at = {
+        t: np.flatnonzero(times == t) for t in range(first_t, last_t + 1)
+    }
+
+    # Frame to frame links
+    track = np.full(len(objects), -1)
+    n_tracks = 0
+    previous = np.empty(0, dtype=np.intp)
+    for t in range(first_t, last_t + 1):
+        rows = rows_at[t]
+        i, j = _match(cdist(coords[previous], coords[rows]), max_dist_um)
+        track[rows[j]] = track[previous[i]]
+        new = rows[track[rows] < 0]
+        track[new] = np.arange(n_tracks, n_tracks + len(new))
+        n_tracks += len(new)
+        previous = rows
+
+    # Gap closing, track ends to track starts a few frames later
+    starts = _first_rows(track)
+    ends = _last_rows(track)
+    root = np.arange(n_tracks)
+    if max_gap > 0:
+        end_tracks = np.flatnonzero(times[ends] < last_t)
+        start_tracks = np.flatnonzero(times[starts] > first_t)
+        cost = cdist(coords[ends[end_tracks]], coords[starts[start_tracks]])
+        gap = (
+            times[starts[start_tracks]][None]
+            - times[ends[end_tracks]][:, None]
+        )
+        cost[(gap < 2) | (gap > max_gap + 1)] = np.inf
+        i, j = _match(cost, max_dist_um)
+        root[start_tracks[j]] = end_tracks[i]
+        # Chains of closed gaps point at their first track
+        while not np.array_equal(root, root[root]):
+            root = root[root]
+    track = root[track]
+
+    # Divisions, new tracks starting next to a mother that goes on
+    divisions = []
+    if split_dist_um > 0:
+        track, divisions = _split_tracks(
+            track,
+            times,
+            coords,
+            areas,
+            rows_at,
+            split_dist_um,
+            split_area_ratio,
+        )
+
+    # Tracked labels numbered by first appearance
+    order = np.unique(track, return_index=True)
+    ids = np.empty(track.max() + 1, dtype=np.int64)
+    ids[order[0][np.argsort(order[1])]] = np.arange(1, len(order[0]) + 1)
+    tracked = ids[track]
+
+    labels = objects["label"].to_numpy()
+    luts = {}
+    for t, rows in rows_at.items():
+        if len(rows):
+            lut = np.zeros(int(labels[rows].max()) + 1, dtype=np.uint32)
+            lut[labels[rows]] = tracked[rows]
+            luts[t] = lut
+    divisions = [
+        {
+            "t": t,
+            "parent": int(ids[parent]),
+            "daughters": [int(ids[d]) for d in daughters],
+        }
+        for t, parent, daughters in divisions
+    ]
+    return luts, divisions
+
+
+def relabel(
+    position: Position,
+    luts: dict[int, np.ndarray],
+    name: str = LABEL_NAME,
+    promote: bool = True,
+    max_workers: int = 8,
+) -> list[int]:
+    """
+    Rewrites label timepoints through their lookup tables in one parallel
+    pass over the chunks, then updates the object table, the cell index
+    and the projected outlines of the position instead of measuring the
+    labels again.
+    Timepoints whose table is the identity are left untouched.
+
+    Args:
+        position (Position): Position holding the label array.
+        luts (dict[int, np.ndarray]): Timepoint -> stored to new label.
+        name (str): Name of the label array.
+        promote (bool): Promote the labels to ``uint32`` when the new IDs
+            do not fit, like ``--label-dtype auto``.
+        max_workers (int): Threads rewriting chunks.
+
+    Returns:
+        list[int]: Rewritten timepoints.
+    """
+    group = position.zgroup
+    changed = {
+        t: lut
+        for t, lut in luts.items()
+        # Labels missing from a timepoint map to 0 in its table
+        if np.any((lut != 0) & (lut != np.arange(len(lut))))
+    }
+    if not changed:
+        return []
+
+    signature = label_signature(group[name])
+    # Only tables up to date with the labels are remapped, stale ones are
+    # measured again when loaded
+    fresh_tables = [
+        (table_group, columns, order)
+        for table_group, columns, order in (
+            (OBJECT_GROUP, OBJECT_COLUMNS, OBJECT_ORDER),
+            (INDEX_GROUP, INDEX_COLUMNS, INDEX_ORDER),
+        )
+        if f"{table_group}/{name}" in group
+        and not stale_table_timepoints(
+            group[f"{table_group}/{name}"], signature, group[name].shape[0]
+        )
+    ]
+    outline_key = projection_names(name)[0]
+    fresh_outlines = []
+    if outline_key in group:
+        stale = stale_projections(
+            group[outline_key],
+            {int(t): m for t, m in signature.items()},
+            changed,
+        )
+        fresh_outlines = [t for t in changed if t not in stale]
+
+    max_label = max(int(lut.max(initial=0)) for lut in changed.values())
+    labels = ensure_label_capacity(position, name, max_label, promote=promote)
+    chunk_bytes = math.prod(labels.chunks) * (labels.dtype.itemsize + 8)
+    with writing(labels) as out:
+        source = da.from_zarr(out)
+        da.store(
+            [
+                source[t : t + 1].map_blocks(
+                    _apply_lut, lut=lut, dtype=labels.dtype
+                )
+                for t, lut in changed.items()
+            ],
+            [out] * len(changed),
+            regions=[(slice(t, t + 1),) for t in changed],
+            lock=False,
+            scheduler="threads",
+            num_workers=limit_workers(3 * chunk_bytes, max_workers),
+        )
+
+    for table_group, columns, order in fresh_tables:
+        rows = group[f"{table_group}/{name}"][:]
+        label_col = columns.index("label")
+        rows[:, label_col] = _remap_rows(
+            rows[:, label_col], rows[:, columns.index("t")], changed
+        )
+        write_label_table(group, table_group, name, rows, columns, order)
+    outlines = group.get(outline_key)
+    # Promoted labels get new outlines on the next projection
+    if fresh_outlines and outlines.dtype == labels.dtype:
+        for t in fresh_outlines:
+            outlines[t] = _apply_lut(outlines[t], changed[t])
+        record_projections(
+            outlines, timepoint_signatures(labels), fresh_outlines
+        )
+    return sorted(changed)
+
+
+def track_position(
+    position: Position,
+    name: str = LABEL_NAME,
+    max_dist_um: float = 50,
+    max_gap: int = 2,
+    split_dist_um: float | None = None,
+    promote: bool = True,
+    max_workers: int = 8,
+) -> dict:
+    """
+    Tracks the labels of one position from its object table and relabels
+    them once. Tracking parameters and divisions are recorded under
+    ``chanzuck/tracks`` of the label array.
+
+    Args:
+        position (Position): Position holding the label array.
+        name (str): Name of the label array.
+        max_dist_um (float): Max distance (in microns) of a link.
+        max_gap (int): Missing timepoints a track may skip.
+        split_dist_um (float | None): Max mother to daughter distance,
+            half of ``max_dist_um`` when None, 0 to ignore divisions.
+        promote (bool): Promote the labels to ``uint32`` when needed.
+        max_workers (int): Threads reading and writing labels.
+
+    Returns:
+        dict: ``{"tracks", "divisions", "relabeled"}``, the number of
+        tracks, the divisions and the rewritten timepoints.
+    """
+    objects = load_object_table(position.zgroup, name, max_workers)
+    luts, divisions = link_tracks(
+        objects,
+        tuple(position.scale[2:]),
+        max_dist_um=max_dist_um,
+        max_gap=max_gap,
+        split_dist_um=split_dist_um,
+    )
+    relabeled = relabel(position, luts, name, promote, max_workers)
+
+    labels = position.zgroup[name]
+    chanzuck_attrs = dict(labels.attrs.get("chanzuck", {}))
+    chanzuck_attrs["tracks"] = {
+        "max_dist_um": max_dist_um,
+        "max_gap": max_gap,
+        "split_dist_um": split_dist_um,
+        "divisions": divisions,
+    }
+    labels.attrs["chanzuck"] = chanzuck_attrs
+    n_tracks = max(
+        (int(lut.max(initial=0)) for lut in luts.values()), default=0
+    )
+    return {"tracks": n_tracks, "divisions": divisions, "relabeled": relabeled}
+
+
+def track_dataset(
+    dataset_path: str | Path,
+    name: str = LABEL_NAME,
+    selection: Selection | None = None,
+    max_dist_um: float = 50,
+    max_gap: int = 2,
+    split_dist_um: float | None = None,
+    promote: bool = True,
+    max_workers: int = 8,
+) -> dict[str, dict]:
+    """
+    Runs ``track_position`` on every selected position holding labels.
+
+    Tracks need every timepoint, so only the wells and positions of the
+    selection are used.
+
+    Args:
+        dataset_path (str | Path): Path to the OME-Zarr plate.
+        name (str): Name of the label array.
+        selection (Selection | None): Wells and positions to track, all
+            when None.
+        max_dist_um (float): Max distance (in microns) of a link.
+        max_gap (int): Missing timepoints a track may skip.
+        split_dist_um (float | None): Max mother to daughter distance.
+        promote (bool): Promote the labels to ``uint32`` when needed.
+        max_workers (int): Threads reading and writing labels.
+
+    Returns:
+        dict[str, dict]: ``"well/position"`` -> ``track_position`` summary.
+    """
+    selection = selection or Selection()
+    results = {}
+    with open_dataset(dataset_path, mode="a") as dataset:
+        for pos_path, position in dataset.positions():
+            well_id, pos_id = pos_path.rsplit("/", 1)
+            if not selection.includes(well_id, pos_id):
+                continue
+            if name not in position.zgroup:
+                tqdm.write(f"⚠️ {pos_path}: no {name} labels, skipping.")
+                continue
+            summary = track_position(
+                position,
+                name,
+                max_dist_um=max_dist_um,
+                max_gap=max_gap,
+                split_dist_um=split_dist_um,
+                promote=promote,
+                max_workers=max_workers,
+            )
+            tqdm.write(
+                f"🧬 {pos_path}: {summary['tracks']} tracks, "
+                f"{len(summary['divisions'])} divisions, "
+                f"{len(summary['relabeled'])} timepoints relabeled"
+            )
+            results[pos_path] = summary
+    return results
+
+
+def _plane_bytes(labels: zarr.Array) -> int:
+    # A plane of labels, its intp copy and the bincount weights
+    return math.prod(labels.shape[-2:]) * (labels.dtype.itemsize + 16)
+
+
+def _match(cost: np.ndarray, max_cost: float) -> tuple[np.ndarray, np.ndarray]:
+    # Hungarian assignment keeping only pairs within max_cost. Forbidden
+    # pairs get a large finite cost so the problem is always feasible.
+    if cost.size == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    allowed = cost <= max_cost
+    rows, cols = linear_sum_assignment(np.where(allowed, cost, _FORBIDDEN))
+    keep = allowed[rows, cols]
+    return rows[keep], cols[keep]
+
+
+def _first_rows(track: np.ndarray) -> np.ndarray:
+    # Rows are sorted by time, the first occurrence is the track start
+    _, first = np.unique(track, return_index=True)
+    return first
+
+
+def _last_rows(track: np.ndarray) -> np.ndarray:
+    _, last = np.unique(track[::-1], return_index=True)
+    return len(track) - 1 - last
+
+
+def _split_tracks(
+    track, times, coords, areas, rows_at, max_dist_um, area_ratio
+) -> tuple[np.ndarray, list[tuple[int, int, list[int]]]]:
+    track = track.copy()
+    next_track = track.max() + 1
+    starts = _first_rows(track)
+    divisions = []
+    used = set()
+    for child in sorted(starts, key=lambda row: times[row]):
+        t = int(times[child])
+        if t - 1 not in rows_at or track[child] in used:
+            continue
+        mothers = rows_at[t - 1]
+        # The mother's track continues into the sibling
+        siblings = {track[row]: row for row in rows_at[t] if row != child}
+        candidates = [
+            (np.linalg.norm(coords[child] - coords[m]), m)
+            for m in mothers
+            if track[m] in siblings and track[m] not in used
+        ]
+        for distance, mother in sorted(candidates):
+            if distance > max_dist_um:
+                break
+            sibling = siblings[track[mother]]
+            ratio = (areas[child] + areas[sibling]) / areas[mother]
+            if not area_ratio[0] <= ratio <= area_ratio[1]:
+                continue
+            parent = track[mother]
+            # The sibling's part of the mother's track becomes its own track
+            after = (track == parent) & (times >= t)
+            track[after] = next_track
+            used.update((parent, next_track, track[child]))
+            divisions.append((t, parent, [next_track, track[child]]))
+            next_track += 1
+            break
+    return track, divisions
+
+
+def _apply_lut(block: np.ndarray, lut: np.ndarray) -> np.ndarray:
+    return lut[block].astype(block.dtype)
+
+
+def _remap_rows(
+    labels: np.ndarray, times: np.ndarray, luts: dict
+) -> np.ndarray:
+    labels = labels.copy()
+    for t, lut in luts.items():
+        at = times == t
+        labels[at] = lut[labels[at].astype(np.intp)]
+    return labels
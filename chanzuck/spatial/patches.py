@@ -0,0 +1,207 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from chanzuck.spatial.stats import load_infection
+from chanzuck.utils.cell_index import load_cell_index
+from chanzuck.utils.describe import describe_dataset_fast
+from chanzuck.utils.label_storage import LABEL_NAME
+from chanzuck.utils.memory import limit_workers
+from chanzuck.utils.remote import open_group
+from chanzuck.utils.sharding import sharded
+
+PATCHES_FILE = "patches.npy"
+MASKS_FILE = "masks.npy"
+METADATA_FILE = "metadata.csv"
+
+
+def export_patches(
+    dataset_path: str | Path,
+    out_dir: str | Path,
+    patch_size: tuple[int, int, int] = (8, 64, 64),
+    channels: list[int] | None = None,
+    stats_dir: str | Path | None = None,
+    seg_name: str = LABEL_NAME,
+    max_workers: int = 8,
+) -> pd.DataFrame:
+    """
+    Exports a fixed-size patch around every cell at every timepoint of every
+    position into contiguous ``.npy`` files that can be memory-mapped.
+
+    Writes to ``out_dir``:
+        - ``patches.npy``: (N, C, Z, Y, X) image patches in the image dtype.
+        - ``masks.npy``: (N, Z, Y, X) uint8 masks of the patch's own cell.
+        - ``metadata.csv``: row ``i`` describes patch ``i`` (well, position,
+          t, label, infected and the patch origin).
+
+    Patches are centred on the cell's bounding box from the cell index and
+    zero-padded at the image border. Each (position, timepoint) is handled
+    by one task that reads the region covering all of its patches once and
+    cuts every cell from memory, tasks run on a thread pool and write
+    straight into the memory-mapped outputs.
+
+    Args:
+        dataset_path (str | Path): Path to the segmented OME-Zarr plate.
+        out_dir (str | Path): Directory for the exported files.
+        patch_size (tuple[int, int, int]): Patch shape in Z, Y, X.
+        channels (list[int] | None): Channel indices, all when None.
+        stats_dir (str | Path | None): Output of ``generate-stats``, used
+            to label patches as infected. Without it ``infected`` is -1.
+        seg_name (str): Name of the segmentation array.
+        max_workers (int): Threads extracting patches.
+
+    Returns:
+        pd.DataFrame: The metadata table.
+    """
+    dataset_path = Path(dataset_path)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    patch_size = tuple(int(s) for s in patch_size)
+
+    metadata = describe_dataset_fast(dataset_path)
+    infection = load_infection(stats_dir) if stats_dir else {}
+
+    # Plan every patch up front so each task knows where to write
+    tables = []
+    positions = {}
+    for well_id, well in metadata["Wells"].items():
+        for pos_id in well:
+            position = open_group(dataset_path / well_id / pos_id, mode="a")
+            if seg_name not in position:
+                print(f"⚠️ Skipping {well_id}/{pos_id}: no {seg_name}.")
+                continue
+            index = load_cell_index(position, seg_name)
+            index.insert(0, "position", pos_id)
+            index.insert(0, "well", well_id)
+            tables.append(index)
+            positions[(well_id, pos_id)] = position
+
+    if not tables:
+        raise ValueError(f"No position of {dataset_path} has {seg_name}.")
+    table = pd.concat(tables, ignore_index=True)
+    centres = (
+        table[["z0", "y0", "x0"]].to_numpy()
+        + table[["z1", "y1", "x1"]].to_numpy()
+    ) // 2
+    origins = centres - np.array(patch_size) // 2
+    table[["origin_z", "origin_y", "origin_x"]] = origins
+    table["infected"] = [
+        infection.get((f"{w}_{p}", t, label), -1)
+        for w, p, t, label in zip(
+            table["well"],
+            table["position"],
+            table["t"],
+            table["label"],
+            strict=True,
+        )
+    ]
+    table["infected"] = table["infected"].astype(np.int8)
+
+    first = next(iter(positions.values()))["0"]
+    n_channels = first.shape[1] if channels is None else len(channels)
+    channel_selection = slice(None) if channels is None else list(channels)
+    patches = np.lib.format.open_memmap(
+        out_dir / PATCHES_FILE,
+        mode="w+",
+        dtype=first.dtype,
+        shape=(len(table), n_channels, *patch_size),
+    )
+    masks = np.lib.format.open_memmap(
+        out_dir / MASKS_FILE,
+        mode="w+",
+        dtype=np.uint8,
+        shape=(len(table), *patch_size),
+    )
+
+    def extract(task) -> int:
+        (well_id, pos_id, t), rows = task
+        position = positions[(well_id, pos_id)]
+        image = sharded(position["0"])
+        labels = sharded(position[seg_name])
+        shape = np.array(labels.shape[-3:])
+
+        row_origins = rows[["origin_z", "origin_y", "origin_x"]].to_numpy()
+        lo = np.clip(row_origins.min(axis=0), 0, shape)
+        hi = np.clip(row_origins.max(axis=0) + patch_size, 0, shape)
+        region = tuple(slice(a, b) for a, b in zip(lo, hi, strict=True))
+        image_region = image.get_orthogonal_selection(
+            (int(t), channel_selection, *region)
+        )
+        label_region = labels[(int(t), 0, *region)]
+
+        for i, origin, label in zip(
+            rows.index, row_origins, rows["label"], strict=True
+        ):
+            # Patch and region coordinates of the part inside the image
+            start = np.maximum(origin, lo)
+            stop = np.minimum(origin + patch_size, hi)
+            src = tuple(
+                slice(a - r, b - r)
+                for a, b, r in zip(start, stop, lo, strict=True)
+            )
+            dst = tuple(
+                slice(a - o, b - o)
+                for a, b, o in zip(start, stop, origin, strict=True)
+            )
+            patches[i] = 0
+            masks[i] = 0
+            patches[(i, slice(None), *dst)] = image_region[(slice(None), *src)]
+            masks[(i, *dst)] = label_region[src] == label
+        return len(rows)
+
+    tasks = list(table.groupby(["well", "position", "t"], sort=False))
+    start = perf_counter()
+    # The region read for a timepoint can reach a whole frame
+    frame_bytes = math.prod(first.shape[1:]) * first.dtype.itemsize
+    with ThreadPoolExecutor(
+        max_workers=limit_workers(frame_bytes, max_workers)
+    ) as executor:
+        for _ in tqdm(
+            executor.map(extract, tasks),
+            total=len(tasks),
+            desc="✂️ Exporting patches",
+        ):
+            pass
+    patches.flush()
+    masks.flush()
+    elapsed = perf_counter() - start
+
+    table = table.drop(columns=["z0", "y0", "x0", "z1", "y1", "x1"])
+    table.to_csv(out_dir / METADATA_FILE, index_label="index")
+    print(
+        f"✅ Exported {len(table)} patches of shape "
+        f"{(n_channels, *patch_size)} in {elapsed:.2f}s "
+        f"({len(table) / max(elapsed, 1e-9):.0f} patches/s, "
+        f"{patches.nbytes / 1024**2:.1f} MB)."
+    )
+    return table
+
+
+def load_patches(
+    out_dir: str | Path,
+) -> tuple[np.ndarray, np.ndarray, pd.DataFrame]:
+    """
+    Opens an export from ``export_patches`` without reading it into memory.
+
+    Args:
+        out_dir (str | Path): Directory written by ``export_patches``.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, pd.DataFrame]: Read-only memory-mapped
+        patches and masks, and the metadata table.
+    """
+    out_dir = Path(out_dir)
+    return (
+        np.load(out_dir / PATCHES_FILE, mmap_mode="r"),
+        np.load(out_dir / MASKS_FILE, mmap_mode="r"),
+        pd.read_csv(
+            out_dir / METADATA_FILE,
+            index_col="index",
+            dtype={"well": str, "position": str},
+        ),
+    )
@@ -1,91 +1,254 @@
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import cast
 
 import numpy as np
 import pandas as pd
-from iohub import open_ome_zarr
-from iohub.reader import Position
+from scipy import ndimage as ndi
 from skimage.filters import threshold_otsu
 from skimage.measure import regionprops_table
 from tqdm import tqdm
 
+from chanzuck.utils.memory import slab_planes, stats_plane_bytes
+from chanzuck.utils.remote import channel_names, open_plate, plate_positions
+from chanzuck.utils.selection import Selection
+
+# Properties measured per cell, in the column order of regionprops_table
+CELL_PROPERTIES = [
+    "label",
+    "area",
+    "centroid",
+    "mean_intensity",
+    "max_intensity",
+    "min_intensity",
+    "extent",
+]
+
 
 # Gpt
 def extract_cell_stats(
     dataset_path: str | Path,
     seg_name: str = "Nuclei_Segmentation",
     save_dir: str | Path | None = None,
+    selection: Selection | None = None,
 ) -> dict[str, dict[str, pd.DataFrame]]:
     """
     Extracts cell statistics from a segmented 3D time-series OME-Zarr dataset.
 
+    With a ``selection`` only the chunks of the selected positions,
+    timepoints and Z planes are read. Centroids stay in full volume
+    coordinates, and when the timepoints are restricted the rows of those
+    timepoints replace the ones in an existing CSV instead of overwriting
+    the whole file.
+
+    Frames larger than the memory budget (``--max-memory``) are measured
+    in slabs of Z planes by ``frame_stats_in_slabs`` instead of
+    ``regionprops_table``.
+
     Args:
-        dataset_path: Path to the OME-Zarr dataset.
+        dataset_path: Path or fsspec URL of the OME-Zarr dataset.
         seg_name: Name of the segmentation array within each position.
         save_dir: Optional path to save extracted DataFrames as CSVs.
+        selection: Optional part of the plate to process.
 
     Returns:
-        A nested dictionary: {well_id: {pos_id: DataFrame}}.
+        A nested dictionary: {well_id: {pos_id: DataFrame}} holding the
+        selected timepoints.
     """
-    dataset_path = Path(dataset_path)
     save_dir = Path(save_dir) if save_dir else None
     if save_dir:
         save_dir.mkdir(parents=True, exist_ok=True)
+    selection = selection or Selection()
 
+    plate = open_plate(dataset_path)
     combined_statistics = {}
-    with open_ome_zarr(dataset_path, mode="r") as dataset:
-        for well_id, well in dataset.wells():
-            for pos_id, pos in tqdm(
-                well.positions(), desc="Collecting Statistics"
-            ):
-                pos = cast(Position, pos)
-                sample_stats = []
-                seg = pos[seg_name]  # shape: (T, Z, Y, X)
-                img = pos["0"]  # shape: (T, C, Z, Y, X)
-
-                for t in range(seg.shape[0]):
-                    labels_t = seg[t][0]
-                    image_t = img[t]
-
-                    # Move channel to last axis: (Z, Y, X, C)
-                    intensity_image = np.moveaxis(image_t, 0, -1)
-
-                    props = regionprops_table(
-                        labels_t,
-                        intensity_image=intensity_image,
-                        properties=[
-                            "label",
-                            "area",
-                            "centroid",
-                            "mean_intensity",
-                            "max_intensity",
-                            "min_intensity",
-                            "extent",
-                        ],
+    for well_id, pos_id in tqdm(
+        plate_positions(plate), desc="Collecting Statistics"
+    ):
+        if not selection.includes(well_id, pos_id):
+            continue
+        pos = plate[f"{well_id}/{pos_id}"]
+        sample_stats = []
+        seg = pos[seg_name]  # shape: (T, 1, Z, Y, X)
+        img = pos["0"]  # shape: (T, C, Z, Y, X)
+        z_slice = selection.z_slice(seg.shape[2])
+        timepoints = selection.timepoints(seg.shape[0])
+
+        n_planes = z_slice.stop - z_slice.start
+        plane_bytes = stats_plane_bytes(
+            seg.shape[-2:],
+            img.shape[1],
+            img.dtype.itemsize,
+            seg.dtype.itemsize,
+        )
+        planes = slab_planes(plane_bytes, n_planes)
+        # The next frame is read while this one is measured when both fit
+        read_ahead = slab_planes(2 * plane_bytes, n_planes) == n_planes
+
+        reader = ThreadPoolExecutor(max_workers=1)
+        upcoming = None
+        for i, t in enumerate(timepoints):
+            if planes < n_planes:
+                df = frame_stats_in_slabs(seg, img, t, z_slice, planes)
+            else:
+                if upcoming is None:
+                    upcoming = reader.submit(_read_frame, seg, img, t, z_slice)
+                labels_t, image_t = upcoming.result()
+                upcoming = None
+                if read_ahead and i + 1 < len(timepoints):
+                    upcoming = reader.submit(
+                        _read_frame, seg, img, timepoints[i + 1], z_slice
                     )
-                    df = pd.DataFrame(props)
-                    df["time"] = t
-
-                    # Rename channel index suffixes with actual names
-                    df = rename_channel_columns(df, pos.channel_names)
-                    sample_stats.append(df)
-
-                well_pos_df = pd.concat(sample_stats, ignore_index=True)
-                if well_id not in combined_statistics:
-                    combined_statistics[well_id] = {}
-                combined_statistics[well_id][pos_id] = well_pos_df
-
-                if save_dir:
-                    out_path = Path(save_dir) / well_id
-                    out_path.mkdir(
-                        parents=True, exist_ok=True
-                    )  # Ensure well-specific folder exists
-                    file_path = out_path / f"{pos_id}_stats.csv"
-                    well_pos_df.to_csv(file_path, index=False)
+
+                # Move channel to last axis: (Z, Y, X, C)
+                intensity_image = np.moveaxis(image_t, 0, -1)
+
+                props = regionprops_table(
+                    labels_t,
+                    intensity_image=intensity_image,
+                    properties=CELL_PROPERTIES,
+                )
+                df = pd.DataFrame(props)
+            df["centroid-0"] += z_slice.start
+            df["time"] = t
+
+            # Rename channel index suffixes with actual names
+            df = rename_channel_columns(df, channel_names(pos))
+            sample_stats.append(df)
+        reader.shutdown()
+
+        if not sample_stats:
+            continue
+        well_pos_df = pd.concat(sample_stats, ignore_index=True)
+        if well_id not in combined_statistics:
+            combined_statistics[well_id] = {}
+        combined_statistics[well_id][pos_id] = well_pos_df
+
+        if save_dir:
+            out_path = Path(save_dir) / well_id
+            out_path.mkdir(
+                parents=True, exist_ok=True
+            )  # Ensure well-specific folder exists
+            file_path = out_path / f"{pos_id}_stats.csv"
+            out_df = well_pos_df
+            if len(timepoints) < seg.shape[0] and file_path.exists():
+                out_df = merge_timepoints(pd.read_csv(file_path), well_pos_df)
+            out_df.to_csv(file_path, index=False)
 
     return combined_statistics
 
 
+def _read_frame(seg, img, t: int, z_slice: slice):
+    return seg[t, 0, z_slice], img[t, :, z_slice]
+
+
+def frame_stats_in_slabs(
+    seg, img, t: int, z_slice: slice, planes: int
+) -> pd.DataFrame:
+    """
+    The ``regionprops_table`` columns of one frame, reading ``planes`` Z
+    planes at a time.
+
+    Counts, coordinate sums, intensity sums, extrema and bounding boxes are
+    reduced per slab and combined, so cells spanning several slabs get the
+    same values as when the frame is measured at once.
+
+    Args:
+        seg: (T, 1, Z, Y, X) labels.
+        img: (T, C, Z, Y, X) image.
+        t: Timepoint.
+        z_slice: Z planes to measure, centroids are relative to its start.
+        planes: Z planes read at once.
+
+    Returns:
+        One row per label, channel columns still numbered.
+    """
+    n_channels = img.shape[1]
+    parts = []
+    for start in range(z_slice.start, z_slice.stop, planes):
+        z = slice(start, min(start + planes, z_slice.stop))
+        labels = np.asarray(seg[t, 0, z])
+        ids = np.unique(labels)
+        ids = ids[ids > 0]
+        if len(ids) == 0:
+            continue
+        image = np.asarray(img[t, :, z])
+        offset = z.start - z_slice.start
+
+        part = {"label": ids, "count": np.bincount(labels.ravel())[ids]}
+        for axis, coords in enumerate(np.indices(labels.shape, sparse=True)):
+            coords = np.broadcast_to(
+                coords + (offset if axis == 0 else 0), labels.shape
+            )
+            part[f"sum-{axis}"] = ndi.sum_labels(coords, labels, ids)
+        for c in range(n_channels):
+            part[f"sum_intensity-{c}"] = ndi.sum_labels(image[c], labels, ids)
+            part[f"max_intensity-{c}"] = ndi.maximum(image[c], labels, ids)
+            part[f"min_intensity-{c}"] = ndi.minimum(image[c], labels, ids)
+        boxes = ndi.find_objects(labels)
+        for axis in range(3):
+            part[f"bbox_lo-{axis}"] = [
+                boxes[i - 1][axis].start + (offset if axis == 0 else 0)
+                for i in ids
+            ]
+            part[f"bbox_hi-{axis}"] = [
+                boxes[i - 1][axis].stop + (offset if axis == 0 else 0)
+                for i in ids
+            ]
+        parts.append(pd.DataFrame(part))
+
+    columns = [f"centroid-{axis}" for axis in range(3)]
+    for name in ("mean_intensity", "max_intensity", "min_intensity"):
+        columns += [f"{name}-{c}" for c in range(n_channels)]
+    if not parts:
+        return pd.DataFrame(columns=["label", "area", *columns, "extent"])
+
+    combined = pd.concat(parts).groupby("label", sort=True)
+    agg = combined.sum()
+    for c in range(n_channels):
+        agg[f"max_intensity-{c}"] = combined[f"max_intensity-{c}"].max()
+        agg[f"min_intensity-{c}"] = combined[f"min_intensity-{c}"].min()
+    for axis in range(3):
+        agg[f"bbox_lo-{axis}"] = combined[f"bbox_lo-{axis}"].min()
+        agg[f"bbox_hi-{axis}"] = combined[f"bbox_hi-{axis}"].max()
+
+    area = agg["count"].astype(np.float64)
+    df = pd.DataFrame({"label": agg.index.to_numpy(), "area": area.to_numpy()})
+    for axis in range(3):
+        df[f"centroid-{axis}"] = (agg[f"sum-{axis}"] / area).to_numpy()
+    for c in range(n_channels):
+        df[f"mean_intensity-{c}"] = (
+            agg[f"sum_intensity-{c}"] / area
+        ).to_numpy()
+    for name in ("max_intensity", "min_intensity"):
+        for c in range(n_channels):
+            df[f"{name}-{c}"] = agg[f"{name}-{c}"].to_numpy()
+    box_volume = np.prod(
+        [agg[f"bbox_hi-{axis}"] - agg[f"bbox_lo-{axis}"] for axis in range(3)],
+        axis=0,
+    )
+    df["extent"] = (area / box_volume).to_numpy()
+    return df
+
+
+def merge_timepoints(
+    existing: pd.DataFrame, update: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Replaces the rows of ``existing`` whose time is present in ``update``.
+
+    Args:
+        existing: Stats previously written for a position.
+        update: Freshly extracted stats of some timepoints.
+
+    Returns:
+        The merged stats sorted by time.
+    """
+    kept = existing[~existing["time"].isin(update["time"].unique())]
+    return pd.concat([kept, update], ignore_index=True).sort_values(
+        "time", kind="stable", ignore_index=True
+    )
+
+
 def rename_channel_columns(
     df: pd.DataFrame, channel_names: list[str]
 ) -> pd.DataFrame:
@@ -103,6 +266,71 @@ def rename_channel_columns(
     return df.rename(columns=renamed_columns)
 
 
+def find_stats_files(stats_dir: str | Path) -> list[Path]:
+    """
+    Recursively finds stats CSVs below ``stats_dir``.
+
+    ``extract_cell_stats`` writes ``<well_id>/<pos_id>_stats.csv`` where the
+    well id itself contains a slash (e.g. ``C/2``), so files can sit several
+    directories deep.
+
+    Args:
+        stats_dir: Root directory of the stats output.
+
+    Returns:
+        Sorted list of CSV paths.
+    """
+    return sorted(Path(stats_dir).rglob("*.csv"))
+
+
+def stats_file_name(file_path: Path, stats_dir: str | Path) -> str:
+    """
+    Builds the ``<well_id>_<pos_id>`` name used in plot legends from a stats
+    file path, e.g. ``C/2/000001_stats.csv`` -> ``C/2_000001``.
+    """
+    relative = Path(file_path).relative_to(stats_dir)
+    stem = relative.stem.removesuffix("_stats")
+    well_id = relative.parent.as_posix()
+    return stem if well_id == "." else f"{well_id}_{stem}"
+
+
+def load_stats_files(
+    file_paths: list[Path],
+    stats_dir: str | Path,
+    dtypes: dict[str, str] | None = None,
+    max_workers: int | None = None,
+) -> tuple[list[str], list[pd.DataFrame]]:
+    """
+    Reads stats CSVs concurrently on a thread pool.
+
+    Args:
+        file_paths: CSVs to read, usually from ``find_stats_files``.
+        stats_dir: Root directory the names are made relative to.
+        dtypes: Optional column -> dtype mapping. When given only these
+            columns are parsed, columns missing from a file are skipped.
+        max_workers: Size of the thread pool, defaults to the executor's.
+
+    Returns:
+        Position names and DataFrames, in the order of ``file_paths``.
+    """
+    read_kwargs = {}
+    if dtypes is not None:
+        read_kwargs = {
+            "usecols": lambda column: column in dtypes,
+            "dtype": dtypes,
+        }
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        dfs = list(
+            executor.map(
+                lambda path: pd.read_csv(path, **read_kwargs), file_paths
+            )
+        )
+
+    names = [stats_file_name(path, stats_dir) for path in file_paths]
+    return names, dfs
+
+
 def predict_infection(df: pd.DataFrame) -> pd.DataFrame:
     # Heuristic infection label
     threshold = threshold_otsu(df["mean_intensity-virus_mCherry"].values)
@@ -113,6 +341,36 @@ def predict_infection(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+def load_infection(stats_dir: str | Path) -> dict[tuple[str, int, int], int]:
+    """
+    Infection state of every cell in the stats CSVs below ``stats_dir``,
+    from ``predict_infection``. Positions without a virus channel are
+    skipped.
+
+    Args:
+        stats_dir: Root directory of the stats output.
+
+    Returns:
+        dict: ``(position name, time, label)`` -> 1 when infected, else 0,
+        with names as in ``stats_file_name`` (e.g. ``C/2_000001``).
+    """
+    names, dfs = load_stats_files(find_stats_files(stats_dir), stats_dir)
+    infection = {}
+    for name, df in zip(names, dfs, strict=True):
+        if "mean_intensity-virus_mCherry" not in df.columns:
+            continue
+        df = predict_infection(df)
+        infection.update(
+            {
+                (name, t, label): infected
+                for t, label, infected in zip(
+                    df["time"], df["label"], df["infected"], strict=True
+                )
+            }
+        )
+    return infection
+
+
 # Example usage for manual runs
 if __name__ == "__main__":
     dfs = extract_cell_stats(
@@ -1,13 +1,34 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import seaborn as sns
+from matplotlib.colors import LogNorm, Normalize
 
 from .stats import predict_infection
 
 
+def _finish_figure(save_path: str | Path | None):
+    """
+    Shows the current figure, or writes it to ``save_path`` and closes it
+    so batch rendering never blocks on an interactive window.
+    """
+    if save_path is None:
+        plt.show()
+        return
+
+    plt.savefig(save_path, dpi=150, bbox_inches="tight")
+    plt.close()
+
+
 # Gpt
 def plot_viral_intensity_over_time(
-    pos_ids: list[str], list_of_dataframes: list[pd.DataFrame]
+    pos_ids: list[str],
+    list_of_dataframes: list[pd.DataFrame],
+    save_path: str | Path | None = None,
 ):
     """
     Plots the mean and confidence interval of virus_mCherry intensity over time for each position.
@@ -15,6 +36,7 @@ def plot_viral_intensity_over_time(
     Args:
         pos_ids (list[str]): Position IDs.
         list_of_dataframes (list[pd.DataFrame]): Corresponding stats dataframes.
+        save_path (str | Path | None): Write the figure here instead of showing it.
     """
     combined_df = []
     for pos_id, df in zip(pos_ids, list_of_dataframes, strict=True):
@@ -41,12 +63,14 @@ def plot_viral_intensity_over_time(
     plt.legend(title="Position", bbox_to_anchor=(1.05, 1), loc="upper left")
     plt.grid(True)
     plt.tight_layout()
-    plt.show()
+    _finish_figure(save_path)
 
 
 # Gpt
 def plot_cell_count_over_time(
-    pos_ids: list[str], list_of_dataframes: list[pd.DataFrame]
+    pos_ids: list[str],
+    list_of_dataframes: list[pd.DataFrame],
+    save_path: str | Path | None = None,
 ):
     plt.figure(figsize=(12, 6))
     for pos_id, df in zip(pos_ids, list_of_dataframes, strict=True):
@@ -58,13 +82,44 @@ def plot_cell_count_over_time(
     plt.legend(title="Position")
     plt.grid(True)
     plt.tight_layout()
-    plt.show()
+    _finish_figure(save_path)
 
 
 # Modified previous from gpt
 def plot_mean_dapi_vs_virus(
-    pos_ids: list[str], list_of_dataframes: list[pd.DataFrame]
+    pos_ids: list[str],
+    list_of_dataframes: list[pd.DataFrame],
+    save_path: str | Path | None = None,
+    mode: str = "auto",
+    bins: int = 200,
+    log_scale: bool = True,
+    max_scatter_points: int = 50_000,
 ):
+    """
+    Plots mean DAPI against mean mCherry intensity for every cell.
+
+    Args:
+        pos_ids (list[str]): Position IDs.
+        list_of_dataframes (list[pd.DataFrame]): Corresponding stats dataframes.
+        save_path (str | Path | None): Write the figure here instead of showing it.
+        mode (str): "scatter", "density" or "auto". "auto" switches to the
+            binned density view once the total row count exceeds
+            ``max_scatter_points``.
+        bins (int): Number of bins per axis in density mode.
+        log_scale (bool): Color density bins on a log scale.
+        max_scatter_points (int): Row count above which "auto" stops scattering.
+    """
+    if mode not in ("auto", "scatter", "density"):
+        raise ValueError(f"Unknown mode '{mode}'")
+
+    n_rows = sum(len(df) for df in list_of_dataframes)
+    if mode == "density" or (mode == "auto" and n_rows > max_scatter_points):
+        _plot_dapi_vs_virus_density(
+            pos_ids, list_of_dataframes, bins=bins, log_scale=log_scale
+        )
+        _finish_figure(save_path)
+        return
+
     plt.figure(figsize=(12, 6))
     for pos_id, df in zip(pos_ids, list_of_dataframes, strict=True):
         plt.scatter(
@@ -79,12 +134,110 @@ def plot_mean_dapi_vs_virus(
     plt.legend(title="Position")
     plt.grid(True)
     plt.tight_layout()
-    plt.show()
+    _finish_figure(save_path)
+
+
+def density_histogram(
+    x: np.ndarray,
+    y: np.ndarray,
+    bins: int,
+    extent: tuple[float, float, float, float],
+) -> np.ndarray:
+    """
+    Bins points into a ``(bins, bins)`` count grid covering ``extent``.
+
+    Args:
+        x (np.ndarray): X coordinates.
+        y (np.ndarray): Y coordinates.
+        bins (int): Number of bins per axis.
+        extent (tuple): (x_min, x_max, y_min, y_max) of the grid.
+
+    Returns:
+        np.ndarray: Counts indexed as ``[y_bin, x_bin]`` so the grid can be
+        passed to ``imshow`` with ``origin="lower"``.
+    """
+    x_min, x_max, y_min, y_max = extent
+    counts, _, _ = np.histogram2d(
+        y, x, bins=bins, range=((y_min, y_max), (x_min, x_max))
+    )
+    return counts
+
+
+def _plot_dapi_vs_virus_density(
+    pos_ids: list[str],
+    list_of_dataframes: list[pd.DataFrame],
+    bins: int,
+    log_scale: bool,
+):
+    columns = ["mean_intensity-nuclei_DAPI", "mean_intensity-virus_mCherry"]
+    points = [
+        df[columns].to_numpy(dtype=np.float64) for df in list_of_dataframes
+    ]
+    points = [p[np.isfinite(p).all(axis=1)] for p in points]
+
+    # Share the grid between positions so the panels are comparable
+    stacked = np.concatenate(points) if points else np.empty((0, 2))
+    if len(stacked):
+        x_min, y_min = stacked.min(axis=0)
+        x_max, y_max = stacked.max(axis=0)
+    else:
+        x_min = y_min = 0.0
+        x_max = y_max = 1.0
+    extent = (x_min, max(x_max, x_min + 1e-8), y_min, max(y_max, y_min + 1e-8))
+
+    grids = [density_histogram(p[:, 0], p[:, 1], bins, extent) for p in points]
+    vmax = max((g.max() for g in grids), default=1) or 1
+    norm = (
+        LogNorm(vmin=1, vmax=vmax)
+        if log_scale
+        else Normalize(vmin=0, vmax=vmax)
+    )
+
+    n_cols = min(len(grids), 3) or 1
+    n_rows = max(1, int(np.ceil(len(grids) / n_cols)))
+    fig, axes = plt.subplots(
+        n_rows,
+        n_cols,
+        figsize=(4.5 * n_cols + 1, 4 * n_rows),
+        sharex=True,
+        sharey=True,
+        squeeze=False,
+    )
+    image = None
+    for ax, pos_id, grid in zip(axes.flat, pos_ids, grids, strict=False):
+        # Empty bins stay transparent instead of saturating the low end
+        image = ax.imshow(
+            np.ma.masked_equal(grid, 0),
+            origin="lower",
+            extent=extent,
+            aspect="auto",
+            cmap="viridis",
+            norm=norm,
+            interpolation="nearest",
+        )
+        ax.set_title(pos_id)
+        ax.grid(True)
+    for ax in axes.flat[len(grids) :]:
+        ax.set_visible(False)
+    # Label the lowest visible panel of each column
+    for idx, ax in enumerate(axes.flat[: len(grids)]):
+        if idx + n_cols >= len(grids):
+            ax.tick_params(labelbottom=True)
+            ax.set_xlabel("Mean DAPI Intensity")
+    for ax in axes[:, 0]:
+        ax.set_ylabel("Mean mCherry Intensity")
+
+    fig.suptitle("Mean DAPI vs mCherry Intensity (cell density)")
+    fig.tight_layout()
+    if image is not None:
+        fig.colorbar(image, ax=axes, label="Cells per bin", shrink=0.8)
 
 
 # Modified previous from gpt
 def plot_phase_intensity_over_time(
-    pos_ids: list[str], list_of_dataframes: list[pd.DataFrame]
+    pos_ids: list[str],
+    list_of_dataframes: list[pd.DataFrame],
+    save_path: str | Path | None = None,
 ):
     plt.figure(figsize=(12, 6))
     for pos_id, df in zip(pos_ids, list_of_dataframes, strict=True):
@@ -96,12 +249,14 @@ def plot_phase_intensity_over_time(
     plt.legend(title="Position")
     plt.grid(True)
     plt.tight_layout()
-    plt.show()
+    _finish_figure(save_path)
 
 
 # Modified previous from gpt
 def plot_predicted_infection_over_time(
-    pos_ids: list[str], dfs: list[pd.DataFrame]
+    pos_ids: list[str],
+    dfs: list[pd.DataFrame],
+    save_path: str | Path | None = None,
 ):
     plt.figure(figsize=(12, 6))
     for pos_id, df in zip(pos_ids, dfs, strict=True):
@@ -116,12 +271,14 @@ def plot_predicted_infection_over_time(
     plt.grid(True)
     plt.legend(title="Position")
     plt.tight_layout()
-    plt.show()
+    _finish_figure(save_path)
 
 
 # Modified previous from gpt
 def plot_infection_rate_change_over_time(
-    pos_ids: list[str], dfs: list[pd.DataFrame]
+    pos_ids: list[str],
+    dfs: list[pd.DataFrame],
+    save_path: str | Path | None = None,
 ):
     plt.figure(figsize=(12, 6))
 
@@ -141,4 +298,86 @@ def plot_infection_rate_change_over_time(
     plt.grid(True)
     plt.legend(title="Position")
     plt.tight_layout()
-    plt.show()
+    _finish_figure(save_path)
+
+
+# Columns read by the plots, everything else in the stats CSVs is skipped
+PLOT_COLUMN_DTYPES = {
+    "label": "int64",
+    "time": "int32",
+    "mean_intensity-Phase3D": "float32",
+    "mean_intensity-nuclei_DAPI": "float32",
+    "mean_intensity-virus_mCherry": "float32",
+    "infected": "int8",
+}
+
+# Output file stem -> plotting function, in the order plots are shown
+PLOTS = {
+    "mean_viral_wrt_time": plot_viral_intensity_over_time,
+    "estimated_infection_rate_over_time": plot_predicted_infection_over_time,
+    "infection_rate_change_over_time": plot_infection_rate_change_over_time,
+    "cell_count_over_time": plot_cell_count_over_time,
+    "dapi_vs_viral_intensity": plot_mean_dapi_vs_virus,
+    "mean_phase_intensity_over_time": plot_phase_intensity_over_time,
+}
+
+
+def plot_all(pos_ids: list[str], dfs: list[pd.DataFrame]):
+    """
+    Shows every plot in ``PLOTS`` one after the other in interactive windows.
+    """
+    for plot_fn in PLOTS.values():
+        plot_fn(pos_ids, dfs)
+
+
+def _render_plot(
+    plot_name: str,
+    pos_ids: list[str],
+    dfs: list[pd.DataFrame],
+    save_path: Path,
+) -> Path:
+    # Runs in a worker process, never touch a display from here
+    plt.switch_backend("agg")
+    PLOTS[plot_name](pos_ids, dfs, save_path=save_path)
+    return save_path
+
+
+def render_plots_to_dir(
+    pos_ids: list[str],
+    dfs: list[pd.DataFrame],
+    out_dir: str | Path,
+    fmt: str = "png",
+    max_workers: int | None = None,
+) -> list[Path]:
+    """
+    Renders every plot in ``PLOTS`` to ``out_dir`` with a non-interactive
+    backend, one figure per worker process.
+
+    Args:
+        pos_ids (list[str]): Position IDs.
+        dfs (list[pd.DataFrame]): Corresponding stats dataframes.
+        out_dir (str | Path): Directory to write the figures into.
+        fmt (str): File format understood by matplotlib (png, pdf, svg, ...).
+        max_workers (int | None): Number of worker processes, defaults to one
+            per plot capped at the CPU count.
+
+    Returns:
+        list[Path]: Paths of the written figures.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if max_workers is None:
+        max_workers = min(len(PLOTS), os.cpu_count() or 1)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                _render_plot,
+                plot_name,
+                pos_ids,
+                dfs,
+                out_dir / f"{plot_name}.{fmt}",
+            )
+            for plot_name in PLOTS
+        ]
+        return [future.result() for future in futures]
@@ -0,0 +1,298 @@
+import math
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import zarr
+from scipy.ndimage import find_objects
+
+from chanzuck.utils.image_pyramider import timepoint_signatures
+from chanzuck.utils.label_storage import LABEL_NAME
+from chanzuck.utils.memory import limit_workers
+from chanzuck.utils.sharding import sharded
+
+# Subgroup of a position holding one index array per label array
+INDEX_GROUP = "cell_index"
+INDEX_COLUMNS = ("label", "t", "z0", "y0", "x0", "z1", "y1", "x1")
+# By label then time, so each track is a contiguous run of rows
+INDEX_ORDER = ("label", "t")
+
+
+def frame_bounding_boxes(labels: np.ndarray, t: int) -> np.ndarray:
+    """
+    Bounding boxes of every label of one (Z, Y, X) frame.
+
+    Args:
+        labels (np.ndarray): Label frame, leading singleton axes (e.g. the
+            channel axis) are ignored.
+        t (int): Timepoint of the frame.
+
+    Returns:
+        np.ndarray: (N, 8) rows of ``INDEX_COLUMNS``, stops are exclusive.
+    """
+    frame = labels.reshape(labels.shape[-3:])
+    rows = [
+        (
+            label,
+            t,
+            *(s.start for s in slices),
+            *(s.stop for s in slices),
+        )
+        for label, slices in enumerate(find_objects(frame), start=1)
+        if slices is not None
+    ]
+    return np.array(rows, dtype=np.int64).reshape(-1, len(INDEX_COLUMNS))
+
+
+def label_signature(labels: zarr.Array) -> dict[str, int]:
+    """
+    Per timepoint signature of a label array (see ``timepoint_signatures``)
+    as recorded by the tables measured from it.
+    """
+    return {str(t): m for t, m in timepoint_signatures(labels).items()}
+
+
+def stale_table_timepoints(
+    table: zarr.Array | None, signature: dict[str, int], n_timepoints: int
+) -> list[int]:
+    """
+    Timepoints of a label table (``write_label_table``) measured from other
+    labels than the current ones, or never measured. Without a signature
+    every timepoint is stale.
+    """
+    stored = {} if table is None else table.attrs.get("signature", {})
+    return [
+        t
+        for t in range(n_timepoints)
+        if not signature.get(str(t)) or stored.get(str(t)) != signature[str(t)]
+    ]
+
+
+def write_label_table(
+    position: zarr.Group,
+    group: str,
+    name: str,
+    rows: np.ndarray,
+    columns: tuple[str, ...],
+    sort_by: tuple[str, ...],
+    signature: dict[str, int] | None = None,
+) -> zarr.Array:
+    """
+    Stores per timepoint rows measured from a label array as
+    ``<group>/<name>`` in a position, with the label signature they were
+    measured from so stale timepoints can be detected after the labels are
+    rewritten. The cell index and the object table of tracking are stored
+    this way.
+
+    Args:
+        position (zarr.Group): Position group holding the label array.
+        group (str): Subgroup of the table.
+        name (str): Name of the label array.
+        rows (np.ndarray): (N, len(columns)) rows with a ``t`` column.
+        columns (tuple[str, ...]): Column names.
+        sort_by (tuple[str, ...]): Columns the rows are sorted by.
+        signature (dict | None): Label signature the rows were measured
+            from, the current one when None.
+
+    Returns:
+        zarr.Array: The table array.
+    """
+    table = position.require_group(group).array(
+        name,
+        _sort_rows(rows, columns, sort_by),
+        chunks=(65_536, len(columns)),
+        overwrite=True,
+        # Same chunk keys whether the store was opened by iohub or not
+        dimension_separator="/",
+    )
+    table.attrs.update(
+        columns=list(columns),
+        signature=(
+            label_signature(position[name]) if signature is None else signature
+        ),
+    )
+    return table
+
+
+def load_label_table(
+    position: zarr.Group,
+    group: str,
+    name: str,
+    columns: tuple[str, ...],
+    sort_by: tuple[str, ...],
+    measure: Callable[[int], np.ndarray],
+    task_bytes: int,
+    max_workers: int = 8,
+    dtype=np.int64,
+) -> pd.DataFrame:
+    """
+    Loads a table stored by ``write_label_table``. Only timepoints whose
+    labels changed since it was stored are measured again, concurrently,
+    and the updated table is stored unless the position is read-only.
+
+    Args:
+        position (zarr.Group): Position group holding the label array.
+        group (str): Subgroup of the table.
+        name (str): Name of the label array.
+        columns (tuple[str, ...]): Column names.
+        sort_by (tuple[str, ...]): Columns the rows are sorted by.
+        measure (Callable[[int], np.ndarray]): Rows of one timepoint.
+        task_bytes (int): Memory one ``measure`` call needs.
+        max_workers (int): Threads measuring timepoints.
+        dtype: Dtype of the rows.
+
+    Returns:
+        pd.DataFrame: The rows as ``columns``.
+    """
+    key = f"{group}/{name}"
+    table = position[key] if key in position else None
+    signature = label_signature(position[name])
+    stale = stale_table_timepoints(table, signature, position[name].shape[0])
+    rows = np.empty((0, len(columns)), dtype=dtype)
+    if table is not None:
+        rows = table[:].astype(dtype, copy=False)
+    if stale:
+        with ThreadPoolExecutor(
+            max_workers=limit_workers(task_bytes, max_workers)
+        ) as executor:
+            fresh = list(executor.map(measure, stale))
+        time_column = rows[:, columns.index("t")]
+        rows = np.concatenate(
+            [rows[~np.isin(time_column, stale)], *fresh]
+        ).astype(dtype, copy=False)
+        if not position.read_only:
+            write_label_table(
+                position, group, name, rows, columns, sort_by, signature
+            )
+    return pd.DataFrame(
+        _sort_rows(rows, columns, sort_by), columns=list(columns)
+    )
+
+
+def write_cell_index(
+    position: zarr.Group, rows: np.ndarray, name: str = LABEL_NAME
+) -> zarr.Array:
+    """
+    Stores bounding box rows as ``cell_index/<name>`` in a position, sorted
+    by label then time, see ``write_label_table``.
+
+    Args:
+        position (zarr.Group): Position group holding the label array.
+        rows (np.ndarray): (N, 8) rows from ``frame_bounding_boxes``.
+        name (str): Name of the label array.
+
+    Returns:
+        zarr.Array: The index array.
+    """
+    return write_label_table(
+        position, INDEX_GROUP, name, rows, INDEX_COLUMNS, INDEX_ORDER
+    )
+
+
+def load_cell_index(
+    position: zarr.Group, name: str = LABEL_NAME, max_workers: int = 8
+) -> pd.DataFrame:
+    """
+    Loads the bounding box index of a label array, measuring again the
+    timepoints whose labels changed since it was stored (see
+    ``load_label_table``).
+
+    Args:
+        position (zarr.Group): Position group holding the label array.
+        name (str): Name of the label array.
+        max_workers (int): Threads reading timepoints.
+
+    Returns:
+        pd.DataFrame: One row per label and timepoint, ``INDEX_COLUMNS``,
+        sorted by label then time.
+    """
+    labels = sharded(position[name])
+    # A frame and the masks find_objects works on
+    frame_bytes = 2 * math.prod(labels.shape[1:]) * labels.dtype.itemsize
+    return load_label_table(
+        position,
+        INDEX_GROUP,
+        name,
+        INDEX_COLUMNS,
+        INDEX_ORDER,
+        lambda t: frame_bounding_boxes(labels[t], t),
+        frame_bytes,
+        max_workers,
+    )
+
+
+def crop_track(
+    position: zarr.Group,
+    label: int,
+    name: str = LABEL_NAME,
+    image_name: str = "0",
+    channels: list[int] | None = None,
+    padding: tuple[int, int, int] = (0, 0, 0),
+    max_workers: int = 8,
+) -> list[dict]:
+    """
+    Cuts out one cell at every timepoint it appears in.
+
+    Only the chunks intersecting the cell's bounding boxes are read, so a
+    track can be pulled out of a plate without loading whole frames.
+
+    Args:
+        position (zarr.Group): Position group holding image and labels.
+        label (int): Label ID of the track.
+        name (str): Name of the label array.
+        image_name (str): Image array cropped alongside the mask.
+        channels (list[int] | None): Channel indices, all when None.
+        padding (tuple[int, int, int]): Voxels added around the box in Z,
+            Y and X, clipped to the array.
+        max_workers (int): Threads reading timepoints.
+
+    Returns:
+        list[dict]: Per timepoint ``{"t", "origin", "image", "mask"}`` where
+        ``image`` is (C, Z, Y, X), ``mask`` is a boolean (Z, Y, X) array of
+        the cell and ``origin`` the (Z, Y, X) offset of the crop.
+    """
+    index = load_cell_index(position, name)
+    boxes = index[index["label"] == label]
+    image = sharded(position[image_name])
+    labels = sharded(position[name])
+    spatial_shape = labels.shape[-3:]
+    channel_selection = slice(None) if channels is None else list(channels)
+
+    def read(row) -> dict:
+        start = [
+            max(0, row[f"{axis}0"] - pad)
+            for axis, pad in zip("zyx", padding, strict=True)
+        ]
+        stop = [
+            min(size, row[f"{axis}1"] + pad)
+            for axis, size, pad in zip(
+                "zyx", spatial_shape, padding, strict=True
+            )
+        ]
+        box = tuple(
+            slice(int(lo), int(hi)) for lo, hi in zip(start, stop, strict=True)
+        )
+        t = int(row["t"])
+        return {
+            "t": t,
+            "origin": tuple(int(lo) for lo in start),
+            "image": image.get_orthogonal_selection(
+                (t, channel_selection, *box)
+            ),
+            "mask": labels[(t, 0, *box)] == label,
+        }
+
+    # Worst case every crop is a whole frame
+    frame_bytes = math.prod(image.shape[1:]) * image.dtype.itemsize
+    with ThreadPoolExecutor(
+        max_workers=limit_workers(frame_bytes, max_workers)
+    ) as executor:
+        return list(executor.map(read, (row for _, row in boxes.iterrows())))
+
+
+def _sort_rows(
+    rows: np.ndarray, columns: tuple[str, ...], sort_by: tuple[str, ...]
+) -> np.ndarray:
+    keys = [rows[:, columns.index(column)] for column in reversed(sort_by)]
+    return rows[np.lexsort(keys)]
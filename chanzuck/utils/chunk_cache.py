@@ -0,0 +1,316 @@
+import itertools
+import json
+import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import dask.array as da
+import numcodecs
+import numpy as np
+import zarr
+from zarr.storage import Store
+
+from chanzuck.utils.remote import open_store
+
+# Default memory budget of the shared chunk cache
+DEFAULT_CACHE_MB = 2048
+
+
+class DecodedChunkCache(Store):
+    """
+    Read-only zarr store wrapper keeping recently used chunks *decoded* in
+    an LRU cache with a fixed memory budget.
+
+    Array metadata is served without its compressor and filters, and chunks
+    are decoded here with the original codecs before being cached, so a
+    cache hit costs a memory copy instead of a disk read plus decompression.
+    Chunks larger than the whole budget are decoded but not cached.
+    """
+
+    def __init__(self, store, max_size: int):
+        self._store = store
+        self.max_size = max_size
+        self.current_size = 0
+        self.hits = 0
+        self.misses = 0
+        self._chunks: OrderedDict[str, np.ndarray] = OrderedDict()
+        # Array path -> (compressor, filters) of the stored chunks
+        self._codecs: dict[str, tuple] = {}
+        self._mutex = threading.Lock()
+
+    @property
+    def path(self) -> str | None:
+        # Lets chunk files of local stores be inspected through the cache
+        return getattr(self._store, "path", None)
+
+    def __getitem__(self, key: str):
+        if key.endswith(".zarray"):
+            return self._strip_codecs(key)
+
+        array_path = self._array_path(key)
+        if array_path is None:
+            return self._store[key]
+
+        with self._mutex:
+            chunk = self._chunks.get(key)
+            if chunk is not None:
+                self._chunks.move_to_end(key)
+                self.hits += 1
+                return chunk
+            self.misses += 1
+
+        chunk = self._decode(self._store[key], *self._codecs[array_path])
+        self._cache(key, chunk)
+        return chunk
+
+    def getitems(self, keys, *, contexts=None) -> dict:
+        """
+        Serves cached chunks and reads the missing ones in a single batch
+        from the wrapped store, concurrently when it is a
+        ``ConcurrentStore``.
+        """
+        found, missing = {}, []
+        for key in keys:
+            if self._array_path(key) is None:
+                try:
+                    found[key] = self[key]
+                except KeyError:
+                    pass
+                continue
+            with self._mutex:
+                chunk = self._chunks.get(key)
+                if chunk is not None:
+                    self._chunks.move_to_end(key)
+                    self.hits += 1
+                    found[key] = chunk
+                    continue
+                self.misses += 1
+            missing.append(key)
+
+        if missing:
+            fetched = self._store.getitems(missing, contexts=contexts or {})
+            for key, data in fetched.items():
+                chunk = self._decode(
+                    data, *self._codecs[self._array_path(key)]
+                )
+                self._cache(key, chunk)
+                found[key] = chunk
+        return found
+
+    def _strip_codecs(self, key: str) -> bytes:
+        meta = json.loads(self._store[key])
+        array_path = key[: -len(".zarray")].rstrip("/")
+        self._codecs[array_path] = (
+            (
+                numcodecs.get_codec(meta["compressor"])
+                if meta.get("compressor")
+                else None
+            ),
+            [numcodecs.get_codec(f) for f in meta.get("filters") or []],
+        )
+        meta["compressor"] = None
+        meta["filters"] = None
+        return json.dumps(meta).encode()
+
+    def _array_path(self, key: str) -> str | None:
+        # Chunk keys are "<array path>/<indices>" where nested layouts split
+        # the indices into further directories
+        parts = key.split("/")
+        for i in range(len(parts) - 1, -1, -1):
+            if not parts[i].replace(".", "").isdigit():
+                return None
+            prefix = "/".join(parts[:i])
+            if prefix in self._codecs:
+                return prefix
+        return None
+
+    @staticmethod
+    def _decode(data, compressor, filters) -> np.ndarray:
+        if compressor is not None:
+            data = compressor.decode(data)
+        for codec in reversed(filters):
+            data = codec.decode(data)
+        chunk = np.frombuffer(data, dtype=np.uint8)
+        chunk.flags.writeable = False
+        return chunk
+
+    def _cache(self, key: str, chunk: np.ndarray):
+        if chunk.nbytes > self.max_size:
+            return
+        with self._mutex:
+            if key in self._chunks:
+                return
+            while self.current_size + chunk.nbytes > self.max_size:
+                _, evicted = self._chunks.popitem(last=False)
+                self.current_size -= evicted.nbytes
+            self._chunks[key] = chunk
+            self.current_size += chunk.nbytes
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._chunks or key in self._store
+
+    def __setitem__(self, key, value):
+        raise PermissionError("DecodedChunkCache is read-only.")
+
+    def __delitem__(self, key):
+        raise PermissionError("DecodedChunkCache is read-only.")
+
+    def __iter__(self):
+        return iter(self._store)
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def listdir(self, path: str = "") -> list[str]:
+        return self._store.listdir(path)
+
+    def close(self):
+        with self._mutex:
+            self._chunks.clear()
+            self.current_size = 0
+
+
+def open_cached_plate(
+    dataset_path: str | Path, max_mb: int = DEFAULT_CACHE_MB
+) -> tuple[zarr.Group, DecodedChunkCache]:
+    """
+    Opens an OME-Zarr plate read-only behind a single decoded chunk cache.
+
+    Every array opened from the returned group shares the cache, so chunks
+    read for one position stay in memory while browsing others until the
+    budget is exhausted and the least recently used chunks are evicted.
+
+    Args:
+        dataset_path (str | Path): Path or fsspec URL of the OME-Zarr plate.
+        max_mb (int): Memory budget of the cache in megabytes.
+
+    Returns:
+        tuple[zarr.Group, DecodedChunkCache]: Root group and its cache.
+    """
+    # Cache misses of a selection are read concurrently
+    store = open_store(dataset_path)
+    cache = DecodedChunkCache(store, max_size=max_mb * 1024**2)
+    return zarr.open_group(store=cache, mode="r"), cache
+
+
+def open_position_arrays(
+    position: zarr.Group, plane_chunks: bool = True
+) -> dict[str, da.Array]:
+    """
+    Wraps every array of a position in a dask array, opening each one once.
+
+    Dask chunks never straddle storage chunks. With ``plane_chunks`` they
+    are further split into single (Y, X) planes, which is what napari asks
+    for when slicing in 2D: dask does not fuse a plane selection into the
+    chunk read, so storage sized chunks would copy the whole chunk for
+    every plane. Combined with ``DecodedChunkCache`` the chunk is then only
+    decoded once and each plane is a small copy.
+
+    Args:
+        position (zarr.Group): Position group holding (T, C, Z, Y, X) arrays.
+        plane_chunks (bool): Split chunks into single planes.
+
+    Returns:
+        dict[str, da.Array]: Array name -> dask array.
+    """
+    arrays = {}
+    for name, array in position.arrays():
+        chunks = array.chunks
+        if plane_chunks:
+            chunks = (1,) * (array.ndim - 2) + chunks[-2:]
+        arrays[name] = da.from_zarr(array, chunks=chunks)
+    return arrays
+
+
+def timepoint_chunk_keys(array: zarr.Array, t: int) -> list[str]:
+    """
+    Store keys of every chunk holding timepoint ``t`` of a (T, ...) array.
+
+    Args:
+        array (zarr.Array): Array with time as its first axis.
+        t (int): Timepoint.
+
+    Returns:
+        list[str]: Chunk keys, empty when ``t`` is out of range.
+    """
+    if not 0 <= t < array.shape[0]:
+        return []
+    chunk_grid = [
+        range(math.ceil(n / c))
+        for n, c in zip(array.shape[1:], array.chunks[1:], strict=True)
+    ]
+    separator = array._dimension_separator or "."
+    prefix = f"{array.path}/" if array.path else ""
+    t_chunk = t // array.chunks[0]
+    return [
+        prefix + separator.join(str(i) for i in (t_chunk, *index))
+        for index in itertools.product(*chunk_grid)
+    ]
+
+
+class ChunkPrefetcher:
+    """
+    Warms a ``DecodedChunkCache`` in the background.
+
+    Each call to ``prefetch`` starts a new generation: requests queued by
+    earlier calls that have not started yet are dropped, so rapidly
+    scrubbing through time or positions only reads what is still wanted.
+    A generation queues at most half the cache's capacity so warming never
+    evicts what is on screen.
+    """
+
+    def __init__(self, cache: DecodedChunkCache, max_workers: int = 4):
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="chanzuck-prefetch"
+        )
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def prefetch(self, requests: list[tuple[zarr.Array, int]]) -> list:
+        """
+        Queues the chunks of the requested timepoints for reading, in order
+        until half the cache capacity is queued.
+
+        Args:
+            requests (list[tuple[zarr.Array, int]]): ``(array, timepoint)``
+                pairs by priority, arrays must be opened from the cached
+                store and out of range timepoints are skipped.
+
+        Returns:
+            list: Futures of the queued reads.
+        """
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+
+        keys = {}
+        queued_bytes = 0
+        for array, t in requests:
+            chunk_bytes = math.prod(array.chunks) * array.dtype.itemsize
+            for key in timepoint_chunk_keys(array, t):
+                if queued_bytes + chunk_bytes > self.cache.max_size // 2:
+                    break
+                if key not in keys:
+                    keys[key] = None
+                    queued_bytes += chunk_bytes
+            else:
+                continue
+            break
+        return [
+            self._executor.submit(self._fetch, key, generation) for key in keys
+        ]
+
+    def _fetch(self, key: str, generation: int):
+        if generation != self._generation:
+            return
+        try:
+            # Reading through the cache is what stores the chunk in it
+            self.cache[key]
+        except KeyError:
+            pass  # Chunk was never written (fill value)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,256 @@
+import itertools
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import zarr
+from tqdm import tqdm
+
+from chanzuck.utils.describe import read_sidecar, write_sidecar
+from chanzuck.utils.image_pyramider import timepoint_signatures
+from chanzuck.utils.memory import memory_gate
+from chanzuck.utils.remote import is_url, open_plate
+
+# Sidecar written next to the describe index by profile_dataset
+PROFILE_FILE_NAME = ".chanzuck_profile.json"
+PROFILE_VERSION = 1
+PERCENTILES = (1, 50, 99)
+# Values kept from each chunk to estimate percentiles
+SAMPLES_PER_CHUNK = 65_536
+
+
+def profile_dataset(
+    dataset_path: str | Path,
+    metadata: dict,
+    use_cache: bool = True,
+    max_workers: int = 8,
+) -> dict:
+    """
+    Adds a ``"profile"`` entry to every position of ``metadata`` describing
+    the data of its full resolution array (see ``profile_array``).
+
+    Profiles are cached in a sidecar (``PROFILE_FILE_NAME``) next to the
+    metadata index of ``describe_dataset_fast``, together with a signature
+    of the chunk files of each position, so repeat calls only read the
+    arrays that changed. The plate itself is only read. Remote and
+    read-only plates are profiled without a cache.
+
+    Args:
+        dataset_path (str | Path): Path or fsspec URL of the OME-Zarr plate.
+        metadata (dict): Output of ``describe_dataset_fast``, updated in place.
+        use_cache (bool): Reuse and store cached profiles.
+        max_workers (int): Threads used to read chunks.
+
+    Returns:
+        dict: The updated metadata.
+    """
+    positions = [
+        (well_id, pos_id, pos_info)
+        for well_id, well in metadata["Wells"].items()
+        for pos_id, pos_info in well.items()
+    ]
+    plate = open_plate(dataset_path)
+    use_cache = use_cache and not is_url(dataset_path)
+    cache_path = Path(dataset_path) / PROFILE_FILE_NAME
+    cache = read_sidecar(cache_path) if use_cache else {}
+    if cache.get("version") != PROFILE_VERSION:
+        cache = {"version": PROFILE_VERSION, "positions": {}}
+    updated = False
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for well_id, pos_id, pos_info in tqdm(
+            positions, desc="📊 Profiling positions"
+        ):
+            key = f"{well_id}/{pos_id}"
+            array = plate[f"{key}/0"]
+            signature = {
+                str(t): mtime
+                for t, mtime in timepoint_signatures(array).items()
+            }
+
+            cached = cache["positions"].get(key)
+            if (
+                use_cache
+                and cached
+                and signature
+                and cached.get("signature") == signature
+            ):
+                pos_info["profile"] = cached["result"]
+                continue
+
+            result = profile_array(array, pos_info["channels"], executor)
+            pos_info["profile"] = result
+            if signature:
+                cache["positions"][key] = {
+                    "signature": signature,
+                    "result": result,
+                }
+                updated = True
+
+    if use_cache and updated:
+        write_sidecar(cache_path, cache)
+    return metadata
+
+
+def profile_array(
+    array: zarr.Array,
+    channel_names: list[str] | str,
+    executor: ThreadPoolExecutor,
+) -> dict:
+    """
+    Streams a (T, C, Z, Y, X) array chunk by chunk and summarizes each
+    channel: min, max, mean, approximate percentiles, non-zero fraction,
+    timepoints that are entirely zero and, for integer data, the fraction of
+    saturated voxels. Also reports the in-memory and on-disk size.
+
+    Chunks are reduced independently on ``executor`` and merged, so memory
+    use stays at a few chunks regardless of the array size. Percentiles are
+    estimated from an evenly strided sample of every chunk.
+
+    Args:
+        array (zarr.Array): Array to profile.
+        channel_names (list[str] | str): Names for the channel axis, channel
+            indices are used when names are unavailable.
+        executor (ThreadPoolExecutor): Pool used to read chunks.
+
+    Returns:
+        dict: Size information and per-channel statistics.
+    """
+    n_channels = array.shape[1]
+    if not isinstance(channel_names, list) or len(channel_names) != n_channels:
+        channel_names = [str(c) for c in range(n_channels)]
+
+    chunk_grid = [
+        range(math.ceil(n / c))
+        for n, c in zip(array.shape, array.chunks, strict=True)
+    ]
+    saturation = (
+        np.iinfo(array.dtype).max
+        if np.issubdtype(array.dtype, np.integer)
+        else None
+    )
+
+    # A chunk and its reductions, at most this many are read at once
+    gate = memory_gate(2 * math.prod(array.chunks) * array.dtype.itemsize)
+
+    def reduce_chunk(index: tuple[int, ...]) -> list[tuple[int, int, dict]]:
+        selection = tuple(
+            slice(i * c, (i + 1) * c)
+            for i, c in zip(index, array.chunks, strict=True)
+        )
+        with gate:
+            block = array[selection]
+
+            # One entry per (timepoint, channel) slab of the chunk
+            reduced = []
+            for dt, dc in np.ndindex(block.shape[:2]):
+                values = block[dt, dc]
+                flat = values.ravel()
+                step = max(1, flat.size // SAMPLES_PER_CHUNK)
+                stats = {
+                    "min": values.min(),
+                    "max": values.max(),
+                    "sum": values.sum(dtype=np.float64),
+                    "count": values.size,
+                    "nonzero": np.count_nonzero(values),
+                    "saturated": (
+                        np.count_nonzero(values == saturation)
+                        if saturation is not None
+                        else 0
+                    ),
+                    "sample": flat[::step],
+                }
+                reduced.append(
+                    (selection[0].start + dt, selection[1].start + dc, stats)
+                )
+            return reduced
+
+    merged = [
+        {
+            "min": np.inf,
+            "max": -np.inf,
+            "sum": 0.0,
+            "count": 0,
+            "nonzero": 0,
+            "saturated": 0,
+            "samples": [],
+            "nonzero_per_t": np.zeros(array.shape[0], dtype=np.int64),
+        }
+        for _ in range(n_channels)
+    ]
+    for reduced in executor.map(reduce_chunk, itertools.product(*chunk_grid)):
+        for t, c, stats in reduced:
+            m = merged[c]
+            m["min"] = min(m["min"], stats["min"])
+            m["max"] = max(m["max"], stats["max"])
+            m["sum"] += stats["sum"]
+            m["count"] += stats["count"]
+            m["nonzero"] += stats["nonzero"]
+            m["saturated"] += stats["saturated"]
+            m["samples"].append(stats["sample"])
+            m["nonzero_per_t"][t] += stats["nonzero"]
+
+    channels = {}
+    for name, m in zip(channel_names, merged, strict=True):
+        count = max(m["count"], 1)
+        sample = np.concatenate(m["samples"]) if m["samples"] else np.zeros(1)
+        percentiles = np.percentile(sample, PERCENTILES)
+        channels[name] = {
+            "min": float(m["min"]),
+            "max": float(m["max"]),
+            "mean": m["sum"] / count,
+            **{
+                f"p{p}": float(v)
+                for p, v in zip(PERCENTILES, percentiles, strict=True)
+            },
+            "nonzero_fraction": m["nonzero"] / count,
+            "empty_timepoints": np.flatnonzero(m["nonzero_per_t"] == 0)
+            .astype(int)
+            .tolist(),
+            "saturated_fraction": (
+                m["saturated"] / count if saturation is not None else None
+            ),
+        }
+
+    nbytes_stored = stored_size(array)
+    return {
+        "nbytes": int(array.nbytes),
+        "nbytes_stored": nbytes_stored,
+        "compression_ratio": array.nbytes / max(nbytes_stored, 1),
+        "channels": channels,
+    }
+
+
+def stored_size(array: zarr.Array, timepoint: int | None = None) -> int:
+    """
+    Bytes an array occupies in its store, metadata included.
+
+    zarr's ``nbytes_stored`` does not descend into the nested chunk
+    directories iohub writes, so local arrays are measured by walking their
+    directory instead.
+
+    Args:
+        array (zarr.Array): Array to measure.
+        timepoint (int | None): Only measure the chunks of this timepoint,
+            supported for nested local arrays chunked by single timepoints.
+
+    Returns:
+        int: Size on disk in bytes.
+    """
+    store_path = getattr(array.store, "path", None)
+    if store_path is None:
+        return int(array.nbytes_stored)
+    root = Path(store_path) / array.path
+    if timepoint is not None:
+        if array._dimension_separator != "/" or array.chunks[0] != 1:
+            raise ValueError(
+                "Per timepoint sizes need nested chunks of one timepoint."
+            )
+        root = root / str(timepoint)
+    return sum(
+        os.path.getsize(os.path.join(directory, name))
+        for directory, _, names in os.walk(root)
+        for name in names
+    )
@@ -1,56 +1,84 @@
 from pathlib import Path
 
-import dask.array as da
 import numpy as np
-from iohub import open_ome_zarr
+import zarr
+
+from chanzuck.utils.remote import open_plate, plate_positions
+from chanzuck.utils.selection import Selection
 
 
 # Modified gpt
 class CellposeZarrLoader:
     def __init__(
-        self, zarr_path: str | Path, channel_indices: list[int] | None = None
+        self,
+        zarr_path: str | Path,
+        channel_indices: list[int] | None = None,
+        selection: Selection | None = None,
+        fetch_workers: int | None = None,
     ):
-        self.zarr_path = Path(zarr_path)
+        """
+        Args:
+            zarr_path (str | Path): Path or fsspec URL of the plate.
+            channel_indices (list[int] | None): Channels returned, [0] when
+                None.
+            selection (Selection | None): Part of the plate to load.
+            fetch_workers (int | None): Chunks read concurrently, the
+                ``--fetch-workers`` setting when None.
+        """
+        self.zarr_path = zarr_path
+        self.plate = open_plate(zarr_path, max_workers=fetch_workers)
+        self._arrays: dict[tuple[str, str], zarr.Array] = {}
         self.channel_indices = channel_indices or [0]
+        self.selection = selection or Selection()
+        self.positions = None
         self.dataset_shapes = None
         self.dataset_chunksizes = None
-        self.entries: list[tuple[str, str, int, da.Array]] = (
+        self.entries: list[tuple[str, str, int]] = (
             self._gather_timepoint_entries()
         )
 
     def _gather_timepoint_entries(self):
         """
-        Returns a flat list of (well_name, pos_name, time_index, image) tuples.
-        Each entry corresponds to one timepoint slice.
+        Returns a flat list of (well_name, pos_name, time_index) tuples for
+        the selected positions and timepoints. Each entry corresponds to one
+        timepoint slice, read when the item is requested.
         """
         timepoint_entries = []
+        self.positions = []
         self.dataset_shapes = []
         self.dataset_chunksizes = []
-        with open_ome_zarr(self.zarr_path, mode="r") as dataset:
-            for well_name, well in dataset.wells():
-                for pos_name, pos in well.positions():
-                    image = pos.data  # shape: (T, C, Z, Y, X)
-                    num_timepoints = image.shape[0]
-                    self.dataset_shapes.append(image.shape)
-                    self.dataset_chunksizes.append(image.chunks)
+        for well_name, pos_name in plate_positions(self.plate):
+            if not self.selection.includes(well_name, pos_name):
+                continue
+            image = self.array(well_name, pos_name)  # (T, C, Z, Y, X)
+            self.positions.append((well_name, pos_name))
+            self.dataset_shapes.append(image.shape)
+            self.dataset_chunksizes.append(image.chunks)
 
-                    for t in range(num_timepoints):
-                        timepoint_entries.append(
-                            (well_name, pos_name, t, image[t])
-                        )
+            for t in self.selection.timepoints(image.shape[0]):
+                timepoint_entries.append((well_name, pos_name, t))
         return timepoint_entries
 
+    def array(self, well_name: str, pos_name: str) -> zarr.Array:
+        """The (T, C, Z, Y, X) image of a position, opened once."""
+        key = (well_name, pos_name)
+        if key not in self._arrays:
+            self._arrays[key] = self.plate[f"{well_name}/{pos_name}/0"]
+        return self._arrays[key]
+
     def __len__(self):
         return len(self.entries)
 
     def __getitem__(self, idx):
-        well_name, pos_name, t_idx, image_t = self.entries[idx]
-
-        # image_t is (C, Z, Y, X)
-        if hasattr(image_t, "as_numpy"):
-            image_t = image_t.as_numpy()
+        well_name, pos_name, t_idx = self.entries[idx]
+        array = self.array(well_name, pos_name)
+        z_slice = self.selection.z_slice(array.shape[2])
 
-        image_t = image_t[self.channel_indices]
+        # Only the chunks of the selected channels and planes are read, all
+        # of them at once
+        image_t = array.get_orthogonal_selection(
+            (t_idx, self.channel_indices, z_slice)
+        )  # (C, Z, Y, X)
 
         # Normalize each channel independently
         norm = np.array(
@@ -63,8 +91,10 @@ class CellposeZarrLoader:
 
         return {
             "image": norm,  # shape: (C, Z, Y, X)
+            "raw": image_t,  # stored values, same shape
             "well": well_name,
             "position": pos_name,
             "time": t_idx,
-            "path": str(image_t.path) if hasattr(image_t, "path") else "N/A",
+            "z_slice": z_slice,
+            "path": f"{self.zarr_path}/{well_name}/{pos_name}/0",
         }
@@ -1,12 +1,25 @@
+import json
 import logging
+import os
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
+from types import SimpleNamespace
 from typing import cast
 
-from iohub import open_ome_zarr
+import numpy as np
 from iohub.reader import Position
 
+from chanzuck.utils.remote import is_url, open_dataset, open_store
+
 logger = logging.getLogger(__name__)
 
+# Sidecar written inside the store by describe_dataset_fast
+INDEX_FILE_NAME = ".chanzuck_index.json"
+INDEX_VERSION = 1
+PLATE_TYPE = "<class 'iohub.ngff.nodes.Plate'>"
+
 
 def describe_dataset(dataset_path: str | Path) -> dict:
     """
@@ -26,7 +39,7 @@ def describe_dataset(dataset_path: str | Path) -> dict:
 
     try:
         # Open dataset using iohub
-        dataset = open_ome_zarr(dataset_path, mode="r")
+        dataset = open_dataset(dataset_path, mode="r")
 
         # Base metadata info
         metadata["dataset_type"] = str(type(dataset))
@@ -96,6 +109,243 @@ def describe_dataset(dataset_path: str | Path) -> dict:
         ) from e
 
 
+def describe_dataset_fast(
+    dataset_path: str | Path, use_cache: bool = True, max_workers: int = 32
+) -> dict:
+    """
+    Builds the same metadata as ``describe_dataset`` from the ``.zattrs`` and
+    ``.zarray`` JSON files alone, without opening any node through iohub.
+
+    Files are read concurrently and the result is cached as a sidecar index
+    (``INDEX_FILE_NAME``) in the dataset root. The cache is reused as long as
+    the modification times of every metadata file and position directory it
+    was built from are unchanged, so adding wells, positions or arrays
+    invalidates it.
+
+    Datasets given as an fsspec URL are read through ``open_store`` and
+    never cached, as remote stores have no modification times to validate
+    the index with.
+
+    Args:
+        dataset_path (str | Path): Path or fsspec URL of the OME-Zarr plate.
+        use_cache (bool): Read and write the sidecar index.
+        max_workers (int): Threads used to read and stat metadata files.
+
+    Returns:
+        dict: Metadata structured by well and position.
+    """
+    if is_url(dataset_path):
+        store = open_store(dataset_path, max_workers=max_workers)
+        read_json = partial(_read_store_json, store)
+        list_arrays = partial(_list_store_arrays, store)
+        use_cache = False
+    else:
+        root = Path(dataset_path)
+
+        def read_json(p: str) -> dict:
+            return _read_json(root / p)
+
+        def list_arrays(p: str) -> list[str]:
+            return _list_arrays(root / p)
+
+    index_path = Path(dataset_path) / INDEX_FILE_NAME
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            if use_cache:
+                cached = read_sidecar(index_path)
+                if cached.get("version") == INDEX_VERSION and _index_is_fresh(
+                    root, cached.get("mtimes", {}), executor
+                ):
+                    return cached["metadata"]
+
+            metadata, sources = _scan_plate_metadata(
+                read_json, list_arrays, executor
+            )
+            if use_cache:
+                mtimes = dict(
+                    zip(
+                        sources,
+                        executor.map(lambda p: _mtime_ns(root / p), sources),
+                        strict=True,
+                    )
+                )
+    except Exception as e:
+        raise ValueError(
+            f"Could not parse metadata for dataset {dataset_path}: {e}"
+        ) from e
+
+    if use_cache:
+        write_sidecar(
+            index_path,
+            {"version": INDEX_VERSION, "mtimes": mtimes, "metadata": metadata},
+        )
+    return metadata
+
+
+def _read_json(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _mtime_ns(path: Path) -> int | None:
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _index_is_fresh(
+    root: Path, mtimes: dict[str, int], executor: ThreadPoolExecutor
+) -> bool:
+    if not mtimes:
+        return False
+    current = executor.map(lambda p: _mtime_ns(root / p), mtimes)
+    return all(
+        now == then for now, then in zip(current, mtimes.values(), strict=True)
+    )
+
+
+def read_sidecar(path: Path) -> dict:
+    """Content of a JSON cache file, empty when missing or unreadable."""
+    return _read_json(path)
+
+
+def write_sidecar(path: Path, content: dict):
+    """
+    Writes a JSON cache file next to the data. Read-only stores only log a
+    warning, the cache is simply not kept.
+    """
+    # Write then rename so concurrent readers never see a partial file
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        tmp_path.write_text(json.dumps(content))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write cache {path}: {e}")
+        tmp_path.unlink(missing_ok=True)
+
+
+def _read_store_json(store, key: str) -> dict:
+    try:
+        return json.loads(store[key])
+    except (KeyError, json.JSONDecodeError):
+        return {}
+
+
+def _list_store_arrays(store, pos_dir: str) -> list[str]:
+    return [
+        name
+        for name in store.listdir(pos_dir)
+        if f"{pos_dir}/{name}/.zarray" in store
+    ]
+
+
+def _list_arrays(pos_dir: Path) -> list[str]:
+    return [
+        entry.name
+        for entry in os.scandir(pos_dir)
+        if entry.is_dir() and os.path.exists(os.path.join(entry, ".zarray"))
+    ]
+
+
+def _scan_plate_metadata(
+    read_json: Callable[[str], dict],
+    list_arrays: Callable[[str], list[str]],
+    executor: ThreadPoolExecutor,
+) -> tuple[dict, list[str]]:
+    """
+    Reads the plate hierarchy level by level, each level concurrently.
+
+    Args:
+        read_json: Parses a JSON file given its path relative to the root,
+            ``{}`` when it is missing.
+        list_arrays: Names of the arrays in a position directory.
+        executor: Pool the reads of a level run on.
+
+    Returns:
+        The metadata dict and the relative paths of every file and directory
+        it depends on, used to validate the cached index.
+    """
+    plate = read_json(".zattrs").get("plate")
+    if not plate:
+        raise ValueError("no plate metadata found in .zattrs")
+
+    well_ids = [well["path"] for well in plate.get("wells", [])]
+    well_attrs = executor.map(lambda w: read_json(f"{w}/.zattrs"), well_ids)
+    positions = [
+        (well_id, image["path"])
+        for well_id, attrs in zip(well_ids, well_attrs, strict=True)
+        for image in attrs.get("well", {}).get("images", [])
+    ]
+
+    pos_dirs = [f"{well_id}/{pos_id}" for well_id, pos_id in positions]
+    pos_attrs = list(
+        executor.map(lambda p: read_json(f"{p}/.zattrs"), pos_dirs)
+    )
+    pos_arrays = list(executor.map(list_arrays, pos_dirs))
+
+    level_paths = [
+        f"{pos_dir}/{key}"
+        for pos_dir, keys in zip(pos_dirs, pos_arrays, strict=True)
+        for key in sorted((k for k in keys if k.isdigit()), key=int)
+    ]
+    zarrays = dict(
+        zip(
+            level_paths,
+            executor.map(lambda p: read_json(f"{p}/.zarray"), level_paths),
+            strict=True,
+        )
+    )
+
+    metadata: dict = {
+        "dataset_type": PLATE_TYPE,
+        "Plate Format": True,
+        "Wells": {well_id: {} for well_id in well_ids},
+    }
+    for (well_id, pos_id), attrs, keys in zip(
+        positions, pos_attrs, pos_arrays, strict=True
+    ):
+        pos_dir = f"{well_id}/{pos_id}"
+        level_keys = sorted((k for k in keys if k.isdigit()), key=int)
+        multiscales = attrs.get("multiscales") or [{}]
+        channels = attrs.get("omero", {}).get("channels")
+
+        metadata["Wells"][well_id][pos_id] = {
+            "multiscale": len(level_keys) > 1,
+            "levels": [
+                {
+                    "level": int(key),
+                    "shape": zarrays[f"{pos_dir}/{key}"]["shape"],
+                    "chunks": zarrays[f"{pos_dir}/{key}"]["chunks"],
+                    "dtype": str(
+                        np.dtype(zarrays[f"{pos_dir}/{key}"]["dtype"])
+                    ),
+                }
+                for key in level_keys
+            ],
+            "axes": format_axes(
+                [
+                    SimpleNamespace(**axis)
+                    for axis in multiscales[0].get("axes", [])
+                ]
+            ),
+            "channels": (
+                [c.get("label") for c in channels] if channels else "N/A"
+            ),
+            "path": f"{pos_dir}/0",
+        }
+
+    sources = [".zattrs"]
+    sources += [f"{well_id}/.zattrs" for well_id in well_ids]
+    sources += pos_dirs
+    sources += [f"{pos_dir}/.zattrs" for pos_dir in pos_dirs]
+    sources += [f"{path}/.zarray" for path in level_paths]
+    return metadata, sources
+
+
 # Gpt
 def format_pretty_output(metadata: dict) -> str:
     """
@@ -143,10 +393,54 @@ def format_pretty_output(metadata: dict) -> str:
             lines.append(
                 f"  │   • Path        : {pos_data.get('path', 'N/A')}"
             )
+            profile = pos_data.get("profile")
+            if profile:
+                lines.extend(format_profile(profile))
 
     return "\n".join(lines)
 
 
+def format_profile(profile: dict) -> list[str]:
+    """
+    Formats the data profile of a position (see ``profile_array``) as lines
+    that continue the position block of ``format_pretty_output``.
+
+    Args:
+        profile (dict): Size information and per-channel statistics.
+
+    Returns:
+        list[str]: Lines ready to be joined into the CLI output.
+    """
+    mb = 1024**2
+    lines = [
+        f"  │   • Size        : {profile['nbytes'] / mb:.1f} MB in memory, "
+        f"{profile['nbytes_stored'] / mb:.1f} MB on disk "
+        f"({profile['compression_ratio']:.2f}x)"
+    ]
+    for name, stats in profile["channels"].items():
+        lines.append(f"  │     📊 {name}")
+        lines.append(
+            f"  │        • Range    : {stats['min']:.4g} – {stats['max']:.4g}"
+            f" (mean {stats['mean']:.4g})"
+        )
+        lines.append(
+            f"  │        • p1/50/99 : {stats['p1']:.4g} / {stats['p50']:.4g}"
+            f" / {stats['p99']:.4g}"
+        )
+        lines.append(
+            f"  │        • Non-zero : {stats['nonzero_fraction']:.1%}"
+        )
+        if stats["empty_timepoints"]:
+            lines.append(
+                f"  │        • ⚠️ Empty timepoints : {stats['empty_timepoints']}"
+            )
+        if stats["saturated_fraction"]:
+            lines.append(
+                f"  │        • ⚠️ Saturated : {stats['saturated_fraction']:.2%}"
+            )
+    return lines
+
+
 # Gpt
 def format_axes(axes_meta: str | list) -> str:
     """
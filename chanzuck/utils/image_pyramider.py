@@ -1,87 +1,778 @@
+import math
+import os
+from collections.abc import Callable, Iterable, Sequence
+from copy import deepcopy
+from functools import partial
 from pathlib import Path
 from typing import cast
 
 import dask.array as da
 import numpy as np
-from iohub import open_ome_zarr
 from iohub.reader import Position
 from tqdm import tqdm
 
+from chanzuck.utils.memory import limit_workers
+from chanzuck.utils.projections import (
+    projection_graph,
+    record_projections,
+    require_projections,
+    stale_projections,
+)
+from chanzuck.utils.remote import open_dataset
+from chanzuck.utils.selection import Selection
+from chanzuck.utils.sharding import (
+    ShardedStore,
+    array_shards,
+    enable_sharding,
+    sharded,
+)
+
+LABEL_METHODS = ("mode", "nearest")
+
 
 # gpt
 def create_downsample_pyramid_for_dataset(
-    dataset_path: str | Path, levels: int = 3
+    dataset_path: str | Path,
+    levels: int = 3,
+    scheduler: str = "threads",
+    isotropic: bool = True,
+    factors: Sequence[tuple[int, int, int]] | None = None,
+    label_names: Sequence[str] = ("Nuclei_Segmentation",),
+    label_method: str = "mode",
+    incremental: bool = False,
+    selection: Selection | None = None,
+    layout: str = "chunked",
+    projections: bool = True,
 ):
     """
     Initializes and populates a downsample pyramid for each position in an OME-Zarr dataset.
-    Uses Dask for memory-efficient downsampling and tqdm for progress display.
+
+    Label arrays listed in ``label_names`` that exist in a position get a
+    matching pyramid (``<name>_1``, ``<name>_2``, ...) built in the same
+    compute with a reduction that never invents label IDs.
+
+    Each level is coarsened from the previous one and all levels of a
+    position are written by a single Dask compute, so the base data is read
+    from disk exactly once.
 
     Args:
         dataset_path (Path or str): Path to OME-Zarr dataset.
         levels (int): Number of pyramid levels to generate. Must be >= 2.
+        scheduler (str): Dask scheduler used for the compute, "threads",
+            "processes" or "synchronous".
+        isotropic (bool): Pick per-axis factors from each position's physical
+            scale so coarse axes (usually Z) are only reduced once voxels are
+            isotropic. When False every axis is halved at every level.
+        factors (Sequence[tuple[int, int, int]] | None): Explicit (Z, Y, X)
+            factor of each level relative to the previous one. Overrides
+            ``isotropic`` and must hold ``levels - 1`` entries.
+        label_names (Sequence[str]): Label arrays to build pyramids for.
+        label_method (str): "mode" keeps the most frequent label of each
+            block, "nearest" keeps the first voxel of each block.
+        incremental (bool): Keep existing levels and only recompute the
+            timepoints whose source chunks changed since the last build
+            (see ``stale_timepoints``). Appended timepoints grow the level
+            arrays. Falls back to a full build for arrays without a record
+            or when the level factors changed.
+        selection (Selection | None): Only build the selected wells,
+            positions and timepoints. With a time range, existing levels
+            are kept and only the selected timepoints are (re)built (those
+            that changed when ``incremental``). Z ranges are not supported
+            since every level spans the whole volume.
+        layout (str): "chunked" writes one file per level chunk, "sharded"
+            packs the chunks of each timepoint into a few shard files, each
+            written whole by one task. Levels stored with the other layout
+            are rebuilt.
+        projections (bool): Also keep the Z projections of every channel
+            and the projected label outlines up to date (see
+            ``chanzuck.utils.projections``). They are computed in the same
+            compute as the levels, from the same reads, and only for
+            selected timepoints whose source changed since they were built.
     """
     dataset_path = Path(dataset_path)
     if levels < 2:
         raise ValueError(
             "Pyramid must have at least 2 levels (base + 1 downsample)."
         )
+    if label_method not in LABEL_METHODS:
+        raise ValueError(f"Unknown label_method '{label_method}'")
+    if factors is not None and len(factors) != levels - 1:
+        raise ValueError(
+            f"Expected {levels - 1} per-level factors, got {len(factors)}."
+        )
+    selection = selection or Selection()
+    if selection.z_range is not None:
+        raise ValueError("Pyramids cannot be restricted to a Z range.")
 
     print(f"📂 Creating downsample pyramid at: {dataset_path}")
-    with open_ome_zarr(dataset_path, mode="a") as dataset:
+    n_updated = 0
+    with open_dataset(dataset_path, mode="a") as dataset:
         for well_id, well in tqdm(dataset.wells(), desc="🔹 Wells"):
             for pos_id, pos_node in tqdm(
                 well.positions(),
                 desc=f"  📍 Positions in {well_id}",
                 leave=False,
             ):
+                if not selection.includes(well_id, pos_id):
+                    continue
                 pos = cast(Position, pos_node)
+                n_timepoints = pos.data.shape[0]
+                # Building a time range must not wipe the other timepoints
+                partial_time = (
+                    len(selection.timepoints(n_timepoints)) < n_timepoints
+                )
 
                 try:
+                    level_factors = factors or compute_level_factors(
+                        pos.scale[-3:],
+                        pos.data.shape[-3:],
+                        levels,
+                        isotropic=isotropic,
+                    )
                     pos._overwrite = True
-                    pos.initialize_pyramid(levels)
+                    pos_labels = [name for name in label_names if name in pos]
+                    stale = prepare_pyramid_levels(
+                        pos,
+                        level_factors,
+                        ["0", *pos_labels],
+                        incremental=incremental or partial_time,
+                        shard_levels=layout == "sharded",
+                    )
+                    if partial_time:
+                        stale = select_timepoints(
+                            stale,
+                            selection.timepoints(n_timepoints),
+                            changed_only=incremental,
+                        )
                 except Exception as e:
                     print(
                         f"⚠️ Skipping {well_id}/{pos_id} due to pyramid init failure: {e}"
                     )
                     continue
 
-                base = da.from_array(pos.data)  # shape: (T, C, Z, Y, X)
-                n_timepoints = base.shape[0]
-
-                for t in tqdm(
-                    range(n_timepoints), desc="    ⏱ Timepoints", leave=False
-                ):
-                    try:
-                        original = base[t]  # shape: (C, Z, Y, X)
-
-                        for level in range(1, levels):
-                            factor = 2**level
-                            downsampled = da.coarsen(
-                                np.mean,
-                                original,
-                                axes={1: factor, 2: factor, 3: factor},
-                                trim_excess=True,
+                try:
+                    sources, targets, regions = [], [], []
+                    projected = []
+                    for name, (timepoints, _) in stale.items():
+                        reduction = (
+                            coarsen_mean
+                            if name == "0"
+                            else partial(coarsen_labels, method=label_method)
+                        )
+                        base_array = sharded(pos[name])
+                        # Levels and projections share the base reads
+                        base = da.from_array(
+                            base_array, chunks=base_array.chunks
+                        )
+                        for time_range in _contiguous_runs(timepoints):
+                            graph = build_pyramid_graph(
+                                pos,
+                                level_factors,
+                                name=name,
+                                reduction=reduction,
+                                time_range=time_range,
+                                base=base,
                             )
+                            sources += graph[0]
+                            targets += graph[1]
+                            regions += graph[2]
+                        if not projections:
+                            continue
 
-                            da.store(
-                                downsampled[None],  # (1, C, Z, Y, X)
-                                pos[str(level)],
-                                regions=(
-                                    slice(t, t + 1),
-                                    slice(0, downsampled.shape[0]),
-                                    slice(0, downsampled.shape[1]),
-                                    slice(0, downsampled.shape[2]),
-                                    slice(0, downsampled.shape[3]),
-                                ),
-                                compute=True,
+                        projection_targets = require_projections(
+                            pos.zgroup, name, base_array
+                        )
+                        signatures = timepoint_signatures(pos[name])
+                        for target in projection_targets:
+                            built = stale_projections(
+                                target,
+                                signatures,
+                                selection.timepoints(n_timepoints),
                             )
+                            for time_range in _contiguous_runs(built):
+                                graph = projection_graph(
+                                    base,
+                                    [target],
+                                    time_range,
+                                    labels=name != "0",
+                                )
+                                sources += graph[0]
+                                targets += graph[1]
+                                regions += graph[2]
+                            projected.append((target, signatures, built))
 
-                    except Exception as e:
-                        print(
-                            f"❌ Failed to downsample {well_id}/{pos_id}/t{t}: {e}"
+                    if sources:
+                        # A base chunk, its float64 copy while averaging
+                        # and the rechunked output, a whole shard of them
+                        # when sharded
+                        task_bytes = 4 * max(
+                            math.prod(pos[name].chunks)
+                            * pos[name].dtype.itemsize
+                            * math.prod(
+                                array_shards(pos[pyramid_level_name(name, 1)])
+                                or (1,)
+                            )
+                            for name in stale
                         )
+                        da.store(
+                            sources,
+                            targets,
+                            regions=regions,
+                            lock=False,
+                            scheduler=scheduler,
+                            num_workers=limit_workers(
+                                task_bytes, os.cpu_count() or 1
+                            ),
+                        )
+                        for store in {
+                            id(t.store): t.store for t in targets
+                        }.values():
+                            if isinstance(store, ShardedStore):
+                                store.flush()
+                    for target, signatures, built in projected:
+                        record_projections(target, signatures, built)
+                    _write_pyramid_record(pos, level_factors, stale)
+                    n_updated += sum(len(t) for t, _ in stale.values())
+                except Exception as e:
+                    print(f"❌ Failed to downsample {well_id}/{pos_id}: {e}")
+
+    print(
+        f"🎉 Pyramid creation complete ({n_updated} array timepoints built)."
+    )
+
+
+def compute_level_factors(
+    scale_zyx: Sequence[float],
+    shape_zyx: Sequence[int],
+    levels: int,
+    isotropic: bool = True,
+) -> list[tuple[int, int, int]]:
+    """
+    Chooses the (Z, Y, X) downsampling factor of each pyramid level.
+
+    With ``isotropic`` an axis is halved only if that brings its voxel size
+    closer to the coarsest axis, so a (2.0, 0.325, 0.325) um volume is
+    reduced in Y and X only until they catch up with Z. Once voxels are
+    close to isotropic every axis is halved together. Axes are never reduced
+    below a single voxel.
+
+    Args:
+        scale_zyx (Sequence[float]): Physical voxel size of the base level.
+        shape_zyx (Sequence[int]): Shape of the base level.
+        levels (int): Number of pyramid levels including the base.
+        isotropic (bool): When False every axis is halved at every level.
+
+    Returns:
+        list[tuple[int, int, int]]: ``levels - 1`` factors, each relative to
+        the previous level.
+    """
+    spacing = [float(s) for s in scale_zyx]
+    shape = [int(n) for n in shape_zyx]
+
+    level_factors = []
+    for _ in range(1, levels):
+        reducible = [n > 1 for n in shape]
+        if isotropic:
+            coarsest = max(
+                (s for s, r in zip(spacing, reducible, strict=True) if r),
+                default=0.0,
+            )
+            halve = [
+                r and 2 * s <= coarsest * math.sqrt(2)
+                for s, r in zip(spacing, reducible, strict=True)
+            ]
+            if not any(halve):
+                halve = reducible
+        else:
+            halve = reducible
+
+        factor = tuple(2 if h else 1 for h in halve)
+        level_factors.append(factor)
+        spacing = [s * f for s, f in zip(spacing, factor, strict=True)]
+        shape = [math.ceil(n / f) for n, f in zip(shape, factor, strict=True)]
+
+    return level_factors
+
+
+def initialize_pyramid_levels(
+    pos: Position,
+    level_factors: Sequence[tuple[int, int, int]],
+    name: str = "0",
+    shard_levels: bool = False,
+):
+    """
+    Creates the empty level arrays of a pyramid with per-axis factors,
+    mirroring ``Position.initialize_pyramid``: shapes and chunks are
+    ceil-divided by the cumulative factor and the scale transform of the
+    base level is multiplied by it.
 
-    print("🎉 Pyramid creation complete.")
+    Only image levels are registered in the position's multiscales, which
+    list the image resolutions ``0..N``. Label levels are plain arrays
+    next to them with the compressor of their base, like the base labels
+    (see ``label_storage.create_label_array``). Levels beyond the new
+    count, left by a deeper earlier build, are deleted.
+
+    Args:
+        pos (Position): Position holding the base array.
+        level_factors (Sequence[tuple[int, int, int]]): Per-level (Z, Y, X)
+            factors relative to the previous level.
+        name (str): Base array, see ``pyramid_level_name`` for level names.
+        shard_levels (bool): Store the level chunks in shards.
+    """
+    array = pos[name]
+    level_names = [
+        pyramid_level_name(name, level)
+        for level in range(1, len(level_factors) + 1)
+    ]
+    # Deeper levels of an earlier build follow other factors
+    extra_levels = list_pyramid_levels(pos.array_keys(), name)[
+        len(level_names) + 1 :
+    ]
+    if name != "0":
+        # Labels registered by earlier versions or by create_zeros
+        unregister_arrays(pos, [name, *level_names, *extra_levels])
+    else:
+        unregister_arrays(pos, extra_levels)
+    for level_name in extra_levels:
+        del pos.zgroup[level_name]
+    cumulative = np.ones(3, dtype=int)
+    for level_name, factor in zip(level_names, level_factors, strict=True):
+        cumulative *= factor
+
+        shape = array.shape[:-3] + tuple(
+            math.ceil(n / f)
+            for n, f in zip(array.shape[-3:], cumulative, strict=True)
+        )
+        chunks = array.chunks[:-3] + tuple(
+            min(math.ceil(c / f), n)
+            for c, f, n in zip(
+                array.chunks[-3:], cumulative, shape[-3:], strict=True
+            )
+        )
+
+        if name != "0":
+            level = pos.zgroup.zeros(
+                level_name,
+                shape=shape,
+                chunks=chunks,
+                dtype=array.dtype,
+                compressor=array.compressor,
+                dimension_separator="/",
+                overwrite=True,
+            )
+        else:
+            transforms = deepcopy(
+                pos.metadata.multiscales[0]
+                .datasets[0]
+                .coordinate_transformations
+            )
+            for tr in transforms:
+                if tr.type == "scale":
+                    for i, f in zip(
+                        range(len(tr.scale))[-3:], cumulative, strict=True
+                    ):
+                        tr.scale[i] *= int(f)
+            level = pos.create_zeros(
+                name=level_name,
+                shape=shape,
+                dtype=array.dtype,
+                chunks=chunks,
+                transform=transforms,
+            )
+        if shard_levels:
+            enable_sharding(level)
+
+
+def unregister_arrays(pos: Position, names: Iterable[str]):
+    """Removes arrays from the datasets of a position's multiscales."""
+    names = set(names)
+    multiscales = pos.metadata.multiscales[0]
+    kept = [d for d in multiscales.datasets if d.path not in names]
+    if len(kept) != len(multiscales.datasets):
+        multiscales.datasets = kept
+        pos.dump_meta()
+
+
+def coarsen_mean(array: da.Array, factor: tuple[int, int, int]) -> da.Array:
+    """
+    Mean-coarsens the last three axes of ``array`` by ``factor``.
+
+    Odd-sized axes are edge padded rather than trimmed so the last slice is
+    kept and the output shape is ceil-divided, matching the level arrays.
+    """
+    if factor == (1, 1, 1):
+        return array
+
+    offset = array.ndim - 3
+    pad = [(0, 0)] * array.ndim
+    for i, f in enumerate(factor):
+        pad[offset + i] = (0, -array.shape[offset + i] % f)
+    if any(after for _, after in pad):
+        array = da.pad(array, pad, mode="edge")
+
+    return da.coarsen(
+        np.mean,
+        array,
+        axes={offset + i: f for i, f in enumerate(factor)},
+    ).astype(array.dtype)
+
+
+def _label_mode(
+    block: np.ndarray, axis: tuple[int, ...] | None = None
+) -> np.ndarray:
+    # Reduction used by da.coarsen: most frequent label over ``axis``, ties
+    # go to foreground so thin objects survive. Only existing IDs are kept.
+    if axis is None:
+        # da.coarsen probes the output meta without an axis
+        return block
+    kept = [i for i in range(block.ndim) if i not in axis]
+    values = np.transpose(block, kept + list(axis))
+    values = values.reshape(values.shape[: len(kept)] + (-1,))
+
+    # Most blocks are a single label (usually background), only vote on
+    # the mixed ones
+    best = values[..., 0].copy()
+    mixed = (values != best[..., None]).any(axis=-1)
+    candidates = values[mixed]
+
+    best_mixed = candidates[:, 0]
+    best_score = np.full(len(candidates), -1, dtype=np.int64)
+    for j in range(candidates.shape[-1]):
+        candidate = candidates[:, j]
+        count = (candidates == candidate[:, None]).sum(axis=-1)
+        score = 2 * count + (candidate != 0)
+        better = score > best_score
+        best_mixed = np.where(better, candidate, best_mixed)
+        best_score = np.where(better, score, best_score)
+
+    best[mixed] = best_mixed
+    return best
+
+
+def coarsen_labels(
+    array: da.Array, factor: tuple[int, int, int], method: str = "mode"
+) -> da.Array:
+    """
+    Downsamples the last three axes of a label array by ``factor`` without
+    mixing IDs: "mode" keeps the most frequent label of each block and
+    "nearest" keeps its first voxel. The output shape is ceil-divided,
+    matching the level arrays.
+    """
+    if factor == (1, 1, 1):
+        return array
+
+    offset = array.ndim - 3
+    if method == "nearest":
+        step = (slice(None),) * offset + tuple(
+            slice(None, None, f) for f in factor
+        )
+        return array[step]
+
+    pad = [(0, 0)] * array.ndim
+    for i, f in enumerate(factor):
+        pad[offset + i] = (0, -array.shape[offset + i] % f)
+    if any(after for _, after in pad):
+        array = da.pad(array, pad, mode="edge")
+
+    return da.coarsen(
+        _label_mode,
+        array,
+        axes={offset + i: f for i, f in enumerate(factor)},
+    )
+
+
+def pyramid_level_name(name: str, level: int) -> str:
+    """
+    Array name of pyramid ``level`` for base array ``name``: image levels
+    follow the OME-Zarr ``"0"``, ``"1"``, ... convention and label levels are
+    suffixed, e.g. ``Nuclei_Segmentation_2``.
+    """
+    if level == 0:
+        return name
+    if name == "0":
+        return str(level)
+    return f"{name}_{level}"
+
+
+def list_pyramid_levels(array_names: Iterable[str], name: str) -> list[str]:
+    """
+    Returns ``name`` followed by its consecutive pyramid levels that exist in
+    ``array_names``.
+    """
+    array_names = set(array_names)
+    levels = [name]
+    while (level_name := pyramid_level_name(name, len(levels))) in array_names:
+        levels.append(level_name)
+    return levels
+
+
+def build_pyramid_graph(
+    pos: Position,
+    level_factors: Sequence[tuple[int, int, int]],
+    name: str = "0",
+    reduction: Callable[[da.Array, tuple[int, int, int]], da.Array] = (
+        coarsen_mean
+    ),
+    time_range: tuple[int, int] | None = None,
+    base: da.Array | None = None,
+) -> tuple[list[da.Array], list, list[tuple[slice, ...]]]:
+    """
+    Builds the lazy downsampling graph for every pyramid level of an array.
+
+    Level ``n`` is the coarsening of level ``n - 1``, so a single compute of
+    all sources reads each base chunk once. Sources are rechunked to the
+    target chunk grid so every task writes whole zarr chunks and no write
+    lock is needed, even with the process scheduler.
+
+    Args:
+        pos (Position): Position whose pyramid arrays are already initialized.
+        level_factors (Sequence[tuple[int, int, int]]): Per-level (Z, Y, X)
+            factors relative to the previous level.
+        name (str): Base array to downsample.
+        reduction (Callable): Coarsens a dask array by a (Z, Y, X) factor,
+            ``coarsen_mean`` for images and ``coarsen_labels`` for labels.
+        time_range (tuple[int, int] | None): Half-open range of timepoints to
+            build, all timepoints by default.
+        base (da.Array | None): Dask array of the whole base array, pass the
+            same one to graphs computed together so chunks are read once.
+
+    Returns:
+        Sources, targets and regions ready to be passed to ``da.store``.
+    """
+    if base is None:
+        base_array = sharded(pos[name])
+        base = da.from_array(base_array, chunks=base_array.chunks)
+    t_start, t_stop = time_range or (0, base.shape[0])
+    base = base[t_start:t_stop]
+
+    sources, targets, regions = [], [], []
+    previous = base
+    for level, factor in enumerate(level_factors, start=1):
+        downsampled = reduction(previous, tuple(factor))
+        previous = downsampled
+
+        target = sharded(pos[pyramid_level_name(name, level)])
+        # Sharded levels are written a whole shard per task
+        shards = array_shards(target) or (1,) * target.ndim
+        sources.append(
+            downsampled.rechunk(
+                tuple(
+                    c * s for c, s in zip(target.chunks, shards, strict=True)
+                )
+            )
+        )
+        targets.append(target)
+        regions.append(
+            (slice(t_start, t_stop),)
+            + tuple(slice(0, n) for n in downsampled.shape[1:])
+        )
+
+    return sources, targets, regions
+
+
+def timepoint_signatures(
+    array, timepoint: int | None = None
+) -> dict[int, int]:
+    """
+    Fingerprints each timepoint of a zarr array by the newest modification
+    time (ns) of its chunk files.
+
+    Only local directory stores can be fingerprinted, other stores return an
+    empty dict so every timepoint is treated as changed. Timepoints without
+    any chunk on disk are omitted.
+
+    Args:
+        array: Zarr array with time as its first axis.
+        timepoint (int | None): Only fingerprint this timepoint.
+
+    Returns:
+        dict[int, int]: Timepoint -> newest chunk mtime.
+    """
+    store_path = getattr(array.store, "path", None)
+    if store_path is None:
+        return {}
+    array_dir = Path(store_path) / array.path
+    if not array_dir.is_dir():
+        return {}
+
+    signatures: dict[int, int] = {}
+    separator = getattr(array, "_dimension_separator", None) or "."
+    for entry in os.scandir(array_dir):
+        key = entry.name.split(separator)[0]
+        if not key.isdigit() or (
+            timepoint is not None and int(key) != timepoint
+        ):
+            continue
+        if entry.is_dir():
+            mtime = _newest_mtime(entry.path)
+        else:
+            mtime = entry.stat().st_mtime_ns
+        t = int(key)
+        signatures[t] = max(signatures.get(t, 0), mtime)
+    return signatures
+
+
+def _newest_mtime(directory: str) -> int:
+    newest = 0
+    for entry in os.scandir(directory):
+        if entry.is_dir():
+            newest = max(newest, _newest_mtime(entry.path))
+        else:
+            newest = max(newest, entry.stat().st_mtime_ns)
+    return newest
+
+
+def _contiguous_runs(timepoints: Sequence[int]) -> list[tuple[int, int]]:
+    """Groups sorted timepoints into half-open ``(start, stop)`` runs."""
+    runs: list[tuple[int, int]] = []
+    for t in timepoints:
+        if runs and runs[-1][1] == t:
+            runs[-1] = (runs[-1][0], t + 1)
+        else:
+            runs.append((t, t + 1))
+    return runs
+
+
+def _read_pyramid_record(pos: Position) -> dict:
+    return dict(pos.zattrs.get("chanzuck", {}).get("pyramid", {}))
+
+
+def _write_pyramid_record(
+    pos: Position,
+    level_factors: Sequence[tuple[int, int, int]],
+    stale: dict[str, tuple[list[int], dict[int, int]]],
+):
+    """
+    Stores the level factors and the source signature of every array in the
+    position attributes, merged with the previous record so arrays and
+    timepoints that were not rebuilt keep their entry. Entries built with
+    other factors are dropped.
+    """
+    factors = [list(f) for f in level_factors]
+    record = _read_pyramid_record(pos)
+    arrays = {}
+    if record.get("factors") == factors:
+        arrays = dict(record.get("arrays", {}))
+    for name, (_, signatures) in stale.items():
+        arrays[name] = {
+            **arrays.get(name, {}),
+            **{str(t): mtime for t, mtime in signatures.items()},
+        }
+
+    chanzuck_attrs = dict(pos.zattrs.get("chanzuck", {}))
+    chanzuck_attrs["pyramid"] = {"factors": factors, "arrays": arrays}
+    pos.zattrs["chanzuck"] = chanzuck_attrs
+
+
+def stale_timepoints(
+    recorded: dict[str, int], signatures: dict[int, int], n_timepoints: int
+) -> list[int]:
+    """
+    Timepoints whose current chunk signature differs from the one recorded
+    at the last pyramid build, including timepoints never built.
+    """
+    if not signatures:
+        return list(range(n_timepoints))
+    return [
+        t
+        for t in range(n_timepoints)
+        if recorded.get(str(t)) != signatures.get(t, 0)
+    ]
+
+
+def prepare_pyramid_levels(
+    pos: Position,
+    level_factors: Sequence[tuple[int, int, int]],
+    names: Sequence[str],
+    incremental: bool = False,
+    shard_levels: bool = False,
+) -> dict[str, tuple[list[int], dict[int, int]]]:
+    """
+    Makes sure the level arrays of ``names`` exist and decides which
+    timepoints of each need to be (re)built.
+
+    A full build (re)creates the level arrays. An incremental build reuses
+    them when the recorded level factors and the layout (``shard_levels``)
+    still match, growing them along time when timepoints were appended to
+    the base array.
+
+    Returns:
+        Array name -> (timepoints to build, current source signatures).
+    """
+    record = _read_pyramid_record(pos) if incremental else {}
+    factors_match = record.get("factors") == [list(f) for f in level_factors]
+    array_names = set(pos.array_keys())
+
+    stale = {}
+    for name in names:
+        base = pos[name]
+        signatures = timepoint_signatures(base)
+        recorded = record.get("arrays", {}).get(name)
+        level_names = [
+            pyramid_level_name(name, level)
+            for level in range(1, len(level_factors) + 1)
+        ]
+
+        if (
+            recorded is None
+            or not factors_match
+            or not set(level_names) <= array_names
+            or any(
+                (array_shards(pos[level]) is not None) != shard_levels
+                for level in level_names
+            )
+        ):
+            initialize_pyramid_levels(
+                pos, level_factors, name=name, shard_levels=shard_levels
+            )
+            stale[name] = (list(range(base.shape[0])), signatures)
+            continue
+
+        for level_name in level_names:
+            level = pos[level_name]
+            if level.shape[0] != base.shape[0]:
+                level.resize((base.shape[0],) + level.shape[1:])
+        stale[name] = (
+            stale_timepoints(recorded, signatures, base.shape[0]),
+            signatures,
+        )
+
+    return stale
+
+
+def select_timepoints(
+    stale: dict[str, tuple[list[int], dict[int, int]]],
+    timepoints: Sequence[int],
+    changed_only: bool = False,
+) -> dict[str, tuple[list[int], dict[int, int]]]:
+    """
+    Restricts the output of ``prepare_pyramid_levels`` to ``timepoints``.
+
+    Only the signatures of the kept timepoints are returned, so recording
+    them leaves the entries of the other timepoints untouched.
+
+    Args:
+        stale: Array name -> (timepoints to build, source signatures).
+        timepoints: Selected timepoints.
+        changed_only: Keep only selected timepoints that are stale, instead
+            of rebuilding every selected timepoint.
+
+    Returns:
+        The restricted mapping.
+    """
+    selected = set(timepoints)
+    restricted = {}
+    for name, (stale_tps, signatures) in stale.items():
+        build = (
+            [t for t in stale_tps if t in selected]
+            if changed_only
+            else sorted(selected)
+        )
+        restricted[name] = (
+            build,
+            {t: signatures[t] for t in build if t in signatures},
+        )
+    return restricted
 
 
 if __name__ == "__main__":
@@ -0,0 +1,153 @@
+import numpy as np
+from iohub.ngff.nodes import Position
+from numcodecs import Blosc
+from tqdm import tqdm
+
+from chanzuck.utils.image_pyramider import (
+    timepoint_signatures,
+    unregister_arrays,
+)
+from chanzuck.utils.sharding import (
+    array_shards,
+    enable_sharding,
+    sharded,
+    writing,
+)
+
+LABEL_NAME = "Nuclei_Segmentation"
+LABEL_CODECS = ("zstd", "lz4", "zlib", "blosclz", "none")
+LABEL_DTYPES = ("auto", "uint16", "uint32")
+SHUFFLES = {
+    "none": Blosc.NOSHUFFLE,
+    "byte": Blosc.SHUFFLE,
+    "bit": Blosc.BITSHUFFLE,
+}
+
+
+def label_compressor(
+    codec: str = "zstd", clevel: int = 5, shuffle: str = "byte"
+) -> Blosc | None:
+    """
+    Builds the compressor used for label arrays.
+
+    Args:
+        codec (str): Blosc codec name or "none" for no compression.
+        clevel (int): Compression level (0-9).
+        shuffle (str): "none", "byte" or "bit".
+
+    Returns:
+        Blosc | None: Compressor, ``None`` when compression is disabled.
+    """
+    if codec not in LABEL_CODECS:
+        raise ValueError(
+            f"Unknown codec '{codec}', expected one of {LABEL_CODECS}."
+        )
+    if codec == "none":
+        return None
+    return Blosc(cname=codec, clevel=clevel, shuffle=SHUFFLES[shuffle])
+
+
+def create_label_array(
+    pos: Position,
+    name: str,
+    shape: tuple[int, ...],
+    chunks: tuple[int, ...],
+    dtype: str,
+    compressor: Blosc | None,
+    shards: tuple[int, ...] | bool | None = None,
+):
+    """
+    Creates (or overwrites) a zero-filled label array in a position with
+    its own compressor, unlike ``Position.create_zeros`` which always uses
+    the image compressor. The array is not registered in the position's
+    multiscales, which only list the image levels. Sharded arrays must be
+    written through ``sharding.writing``.
+
+    Args:
+        pos (Position): Position to create the array in.
+        name (str): Array name.
+        shape (tuple[int, ...]): Array shape.
+        chunks (tuple[int, ...]): Chunk shape.
+        dtype (str): Label dtype.
+        compressor (Blosc | None): Compressor of the chunks.
+        shards (tuple[int, ...] | bool | None): Store chunks in shards of
+            this shape (in chunks), True picks it with ``shard_shape``.
+
+    Returns:
+        zarr.Array: The new array.
+    """
+    array = pos.zgroup.zeros(
+        name,
+        shape=shape,
+        chunks=chunks,
+        dtype=dtype,
+        compressor=compressor,
+        overwrite=True,
+    )
+    unregister_arrays(pos, [name])
+    if shards:
+        enable_sharding(array, None if shards is True else shards)
+    return array
+
+
+def promote_label_array(pos: Position, name: str, dtype: str):
+    """
+    Recreates a label array with a wider dtype, keeping its chunks,
+    compressor and every timepoint written so far.
+
+    Args:
+        pos (Position): Position holding the array.
+        name (str): Array name.
+        dtype (str): New dtype.
+
+    Returns:
+        zarr.Array: The promoted array.
+    """
+    old = pos.zgroup[name]
+    reader = sharded(old)
+    written = {t: reader[t] for t in sorted(timepoint_signatures(old))}
+    array = create_label_array(
+        pos,
+        name,
+        shape=old.shape,
+        chunks=old.chunks,
+        dtype=dtype,
+        compressor=old.compressor,
+        shards=array_shards(old),
+    )
+    with writing(array) as out:
+        for t, frame in written.items():
+            out[t] = frame
+    return array
+
+
+def ensure_label_capacity(
+    pos: Position, name: str, max_label: int, promote: bool = True
+):
+    """
+    Returns a label array able to hold ``max_label``, promoting it to
+    ``uint32`` when it is narrower.
+
+    Args:
+        pos (Position): Position holding the array.
+        name (str): Array name.
+        max_label (int): Largest label ID about to be written.
+        promote (bool): Promote instead of raising when the dtype is too
+            narrow.
+
+    Returns:
+        zarr.Array: The label array.
+    """
+    array = pos.zgroup[name]
+    if max_label <= np.iinfo(array.dtype).max:
+        return array
+    if not promote:
+        raise ValueError(
+            f"Label ID {max_label} does not fit in {array.dtype}, use "
+            "--label-dtype auto or uint32."
+        )
+    tqdm.write(
+        f"⚠️ {pos.zgroup.path}: label IDs exceed {array.dtype}, promoting "
+        "to uint32."
+    )
+    return promote_label_array(pos, name, "uint32")
@@ -0,0 +1,125 @@
+import contextlib
+import math
+import os
+import threading
+
+# Holds the budget so worker processes and threads of every command see it
+MEMORY_ENV = "CHANZUCK_MAX_MEMORY"
+UNITS = {"": 1, "B": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def parse_memory(text: str) -> int:
+    """
+    Parses sizes like ``"512MB"``, ``"8G"``, ``"1.5GiB"`` or plain bytes.
+
+    Args:
+        text (str): Size with an optional binary unit.
+
+    Returns:
+        int: Size in bytes.
+    """
+    cleaned = text.strip().upper().removesuffix("IB").removesuffix("B")
+    number = cleaned.rstrip("KMGT")
+    unit = cleaned[len(number) :]
+    try:
+        value = float(number)
+    except ValueError as e:
+        raise ValueError(f"'{text}' is not a size like '8GB'.") from e
+    if unit not in UNITS or value <= 0:
+        raise ValueError(f"'{text}' is not a size like '8GB'.")
+    return int(value * UNITS[unit])
+
+
+def set_memory_budget(text: str | None):
+    """Sets (or clears with None) the budget of this process and its
+    children."""
+    if text is None:
+        os.environ.pop(MEMORY_ENV, None)
+        return
+    parse_memory(text)
+    os.environ[MEMORY_ENV] = text
+
+
+def get_memory_budget() -> int | None:
+    """The budget in bytes, None when unlimited."""
+    text = os.environ.get(MEMORY_ENV)
+    return parse_memory(text) if text else None
+
+
+def limit_workers(
+    task_bytes: int, requested: int, budget: int | None = None
+) -> int:
+    """
+    Number of concurrent tasks of ``task_bytes`` each that fit the budget.
+
+    Args:
+        task_bytes (int): Peak memory of one task.
+        requested (int): Workers asked for, never exceeded.
+        budget (int | None): Bytes available, the global budget when None.
+
+    Returns:
+        int: Between 1 and ``requested``.
+    """
+    budget = get_memory_budget() if budget is None else budget
+    if budget is None:
+        return requested
+    return max(1, min(requested, budget // max(task_bytes, 1)))
+
+
+def memory_gate(task_bytes: int, budget: int | None = None):
+    """
+    Context manager admitting only as many concurrent tasks of
+    ``task_bytes`` as fit the budget, for pools shared by tasks of
+    different sizes. Does nothing without a budget.
+    """
+    budget = get_memory_budget() if budget is None else budget
+    if budget is None:
+        return contextlib.nullcontext()
+    return threading.BoundedSemaphore(max(1, budget // max(task_bytes, 1)))
+
+
+def slab_planes(
+    plane_bytes: int, n_planes: int, budget: int | None = None
+) -> int:
+    """
+    Z planes per slab so that a slab of ``plane_bytes`` per plane fits the
+    budget, all of them when there is no budget.
+
+    Args:
+        plane_bytes (int): Peak memory per Z plane.
+        n_planes (int): Planes in the volume.
+        budget (int | None): Bytes available, the global budget when None.
+
+    Returns:
+        int: Between 1 and ``n_planes``.
+    """
+    budget = get_memory_budget() if budget is None else budget
+    if budget is None:
+        return n_planes
+    return max(1, min(n_planes, budget // max(plane_bytes, 1)))
+
+
+def segmentation_plane_bytes(
+    plane_shape: tuple[int, int], n_channels: int, itemsize: int
+) -> int:
+    """
+    Peak bytes per Z plane when segmenting a frame: the raw channels, their
+    float32 normalized copy, the int32 masks, the uint32 relabel buffer and
+    the previous frame's labels.
+    """
+    return math.prod(plane_shape) * (n_channels * (itemsize + 4) + 3 * 4)
+
+
+def stats_plane_bytes(
+    plane_shape: tuple[int, int],
+    n_channels: int,
+    itemsize: int,
+    label_itemsize: int,
+) -> int:
+    """
+    Peak bytes per Z plane when measuring a frame: every channel, the
+    labels and the per-region copies regionprops makes.
+    """
+    return (
+        math.prod(plane_shape) * 2 * (n_channels * itemsize + label_itemsize)
+    )
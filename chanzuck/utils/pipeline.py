@@ -0,0 +1,474 @@
+import hashlib
+import json
+import tomllib
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+
+import zarr
+
+from chanzuck.utils.image_pyramider import timepoint_signatures
+from chanzuck.utils.label_storage import LABEL_NAME
+from chanzuck.utils.remote import open_plate
+from chanzuck.utils.selection import Selection, parse_range
+from chanzuck.utils.stages import STAGE_SECTIONS
+from chanzuck.utils.work_queue import list_positions
+
+# Config keys, a stage runs when its section is present
+CONFIG_KEYS = {
+    "dataset",
+    "stats_dir",
+    "plots_dir",
+    "workers",
+    "selection",
+    "tracker",
+    *STAGE_SECTIONS,
+}
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One step of a pipeline.
+
+    Attributes:
+        name (str): Unique stage name.
+        deps (tuple[str, ...]): Stages that must finish first.
+        fingerprint (Callable[[], str]): Hash of the stage's parameters and
+            current inputs, evaluated right before the stage would run.
+        run (Callable[[], object]): Does the work.
+        complete (Callable[[], bool]): Whether the outputs exist.
+        rewrites_inputs (bool): The stage writes to its own inputs, its
+            fingerprint is recorded after it ran.
+    """
+
+    name: str
+    deps: tuple[str, ...]
+    fingerprint: Callable[[], str]
+    run: Callable[[], object]
+    complete: Callable[[], bool]
+    rewrites_inputs: bool = False
+
+
+def fingerprint(*parts) -> str:
+    """Stable hash of JSON serializable parts."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def run_stages(
+    stages: list[Stage],
+    record: dict[str, str],
+    save_record: Callable[[dict[str, str]], None] | None = None,
+    force: tuple[str, ...] = (),
+    max_workers: int = 2,
+) -> dict[str, str]:
+    """
+    Runs a DAG of stages, skipping those whose fingerprint matches the
+    record of the last successful run and whose outputs still exist.
+
+    A stage is started as soon as all of its dependencies finished, so
+    independent stages run concurrently. A failed stage blocks everything
+    downstream of it but not unrelated branches.
+
+    Args:
+        stages (list[Stage]): Stages in any order.
+        record (dict[str, str]): Stage name -> fingerprint of its last
+            successful run, updated in place.
+        save_record (Callable | None): Called with ``record`` after every
+            stage that ran, so an interrupted run keeps finished stages.
+        force (tuple[str, ...]): Stages to rerun regardless of the record.
+        max_workers (int): Stages run at the same time.
+
+    Returns:
+        dict[str, str]: Stage name -> "ran", "skipped", "failed" or
+        "blocked".
+    """
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        missing = set(stage.deps) - set(by_name)
+        if missing:
+            raise ValueError(
+                f"Stage {stage.name} depends on unknown {missing}"
+            )
+    _check_acyclic(by_name)
+
+    def execute(stage: Stage) -> tuple[str, str]:
+        current = stage.fingerprint()
+        if (
+            stage.name not in force
+            and record.get(stage.name) == current
+            and stage.complete()
+        ):
+            return "skipped", current
+        print(f"▶️ Running stage '{stage.name}'")
+        stage.run()
+        if stage.rewrites_inputs:
+            current = stage.fingerprint()
+        return "ran", current
+
+    status: dict[str, str] = {}
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while len(status) < len(stages):
+            for stage in stages:
+                if stage.name in status or stage.name in running.values():
+                    continue
+                dep_status = [status.get(d) for d in stage.deps]
+                if any(s in ("failed", "blocked") for s in dep_status):
+                    status[stage.name] = "blocked"
+                elif all(s in ("ran", "skipped") for s in dep_status):
+                    running[executor.submit(execute, stage)] = stage.name
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    status[name], current = future.result()
+                except Exception as e:
+                    print(f"❌ Stage '{name}' failed: {e}")
+                    status[name] = "failed"
+                    record.pop(name, None)
+                    continue
+                print(
+                    f"✅ Stage '{name}' "
+                    f"{'is up to date' if status[name] == 'skipped' else 'done'}"
+                )
+                if status[name] == "ran":
+                    record[name] = current
+                    if save_record is not None:
+                        save_record(record)
+    return status
+
+
+def _check_acyclic(by_name: dict[str, Stage]):
+    visiting, visited = set(), set()
+
+    def visit(name: str):
+        if name in visited:
+            return
+        if name in visiting:
+            raise ValueError(f"Stage {name} is part of a cycle.")
+        visiting.add(name)
+        for dep in by_name[name].deps:
+            visit(dep)
+        visiting.discard(name)
+        visited.add(name)
+
+    for name in by_name:
+        visit(name)
+
+
+def load_config(config_path: str | Path) -> dict:
+    """
+    Reads a TOML or JSON pipeline config. Relative paths are resolved
+    against the config's directory.
+
+    Args:
+        config_path (str | Path): ``.toml`` or ``.json`` file.
+
+    Returns:
+        dict: The config.
+    """
+    config_path = Path(config_path)
+    if config_path.suffix == ".json":
+        config = json.loads(config_path.read_text())
+    else:
+        config = tomllib.loads(config_path.read_text())
+
+    unknown = set(config) - CONFIG_KEYS
+    if unknown:
+        raise ValueError(f"Unknown config keys: {sorted(unknown)}")
+    if "dataset" not in config:
+        raise ValueError("The config needs a 'dataset' path.")
+    for key in ("dataset", "stats_dir", "plots_dir"):
+        if key in config:
+            config[key] = str(config_path.parent / config[key])
+    return config
+
+
+def build_pipeline(config: dict) -> list[Stage]:
+    """
+    Turns a config from ``load_config`` into stages:
+    ``segment -> track -> (pyramid, stats) -> plots``, where only stages
+    with a config section are included. With a ``track`` stage,
+    segmentation leaves tracking to it.
+
+    Args:
+        config (dict): Pipeline config.
+
+    Returns:
+        list[Stage]: Stages for ``run_stages``.
+    """
+    dataset = Path(config["dataset"])
+    selection = _config_selection(config.get("selection", {}))
+    positions = list_positions(dataset, selection)
+    if not positions:
+        raise ValueError(f"The selection matches nothing in {dataset}.")
+    stages = []
+
+    def signatures(*names) -> dict:
+        # Through the shards, plain zarr cannot open sharded arrays
+        root = open_plate(dataset)
+        return {
+            f"{w}/{p}/{name}": timepoint_signatures(root[f"{w}/{p}/{name}"])
+            for w, p in positions
+            for name in names
+            if f"{w}/{p}/{name}" in root
+        }
+
+    def have(*names) -> bool:
+        root = zarr.open_group(str(dataset), mode="r")
+        return all(f"{w}/{p}/{n}" in root for w, p in positions for n in names)
+
+    if "segment" in config:
+        seg_params = {
+            "model": "cellpose",
+            "gpu": False,
+            "label_dtype": "auto",
+            "codec": "zstd",
+            "clevel": 5,
+            "shuffle": "byte",
+            "layout": "chunked",
+            "projections": True,
+            **config["segment"],
+        }
+        if "channel" not in seg_params:
+            raise ValueError("[segment] needs a 'channel' index or name.")
+        channel = _channel_index(dataset, positions[0], seg_params["channel"])
+        tracker = {"max_dist_um": 50, **config.get("tracker", {})}
+
+        def run_segment():
+            from chanzuck.segment.nuclei_segmentation import (
+                segment_and_track_3d_over_time,
+            )
+
+            segment_and_track_3d_over_time(
+                dataset,
+                channel_index=channel,
+                model_type=seg_params["model"],
+                use_gpu=seg_params["gpu"],
+                label_dtype=seg_params["label_dtype"],
+                codec=seg_params["codec"],
+                clevel=seg_params["clevel"],
+                shuffle=seg_params["shuffle"],
+                selection=selection,
+                max_dist_um=tracker["max_dist_um"],
+                track="track" not in config,
+                layout=seg_params["layout"],
+                projections=seg_params["projections"],
+            )
+
+        stages.append(
+            Stage(
+                "segment",
+                (),
+                lambda: fingerprint(
+                    seg_params, channel, tracker, selection, signatures("0")
+                ),
+                run_segment,
+                lambda: have(LABEL_NAME),
+            )
+        )
+    label_deps = ("segment",) if "segment" in config else ()
+
+    if "track" in config:
+        track_params = {"max_dist_um": 50, "max_gap": 2, **config["track"]}
+
+        def run_track():
+            from chanzuck.segment.tracking import track_dataset
+
+            track_dataset(
+                dataset,
+                selection=Selection(
+                    wells=selection.wells, positions=selection.positions
+                ),
+                max_dist_um=track_params["max_dist_um"],
+                max_gap=track_params["max_gap"],
+                split_dist_um=track_params.get("split_dist_um"),
+            )
+
+        # Tracking relabels its own input, the labels it leaves behind are
+        # what the next run compares against
+        stages.append(
+            Stage(
+                "track",
+                label_deps,
+                lambda: fingerprint(
+                    track_params, selection, signatures(LABEL_NAME)
+                ),
+                run_track,
+                lambda: have(f"objects/{LABEL_NAME}"),
+                rewrites_inputs=True,
+            )
+        )
+        label_deps = ("track",)
+
+    if "pyramid" in config:
+        pyramid_params = {
+            "levels": 3,
+            "isotropic": True,
+            "labels": True,
+            "label_method": "mode",
+            "layout": "chunked",
+            "projections": True,
+            **config["pyramid"],
+        }
+        sources = ("0", LABEL_NAME) if pyramid_params["labels"] else ("0",)
+
+        def run_pyramid():
+            from chanzuck.utils.image_pyramider import (
+                create_downsample_pyramid_for_dataset,
+            )
+
+            create_downsample_pyramid_for_dataset(
+                dataset,
+                levels=pyramid_params["levels"],
+                isotropic=pyramid_params["isotropic"],
+                label_names=(LABEL_NAME,) if pyramid_params["labels"] else (),
+                label_method=pyramid_params["label_method"],
+                layout=pyramid_params["layout"],
+                projections=pyramid_params["projections"],
+                incremental=True,
+                selection=Selection(
+                    wells=selection.wells, positions=selection.positions
+                ),
+            )
+
+        stages.append(
+            Stage(
+                "pyramid",
+                label_deps if pyramid_params["labels"] else (),
+                lambda: fingerprint(
+                    pyramid_params, selection, signatures(*sources)
+                ),
+                run_pyramid,
+                lambda: have("1"),
+            )
+        )
+
+    if "stats" in config:
+        if "stats_dir" not in config:
+            raise ValueError("The stats stage needs 'stats_dir'.")
+        stats_dir = Path(config["stats_dir"])
+
+        def run_stats():
+            from chanzuck.spatial.stats import extract_cell_stats
+
+            extract_cell_stats(
+                dataset, save_dir=stats_dir, selection=selection
+            )
+
+        stages.append(
+            Stage(
+                "stats",
+                label_deps,
+                lambda: fingerprint(
+                    config["stats"],
+                    selection,
+                    str(stats_dir),
+                    signatures("0", LABEL_NAME),
+                ),
+                run_stats,
+                lambda: all(
+                    (stats_dir / w / f"{p}_stats.csv").exists()
+                    for w, p in positions
+                ),
+            )
+        )
+
+    if "plots" in config:
+        if "stats_dir" not in config or "plots_dir" not in config:
+            raise ValueError(
+                "The plots stage needs 'stats_dir' and 'plots_dir'."
+            )
+        stats_dir = Path(config["stats_dir"])
+        plots_dir = Path(config["plots_dir"])
+        fmt = config["plots"].get("format", "png")
+
+        def csv_signatures() -> dict:
+            from chanzuck.spatial.stats import find_stats_files
+
+            return {
+                str(path): path.stat().st_mtime_ns
+                for path in find_stats_files(stats_dir)
+            }
+
+        def run_plots():
+            from chanzuck.spatial.stats import (
+                find_stats_files,
+                load_stats_files,
+            )
+            from chanzuck.spatial.visualize import render_plots_to_dir
+
+            names, dfs = load_stats_files(
+                find_stats_files(stats_dir), stats_dir
+            )
+            render_plots_to_dir(names, dfs, plots_dir, fmt=fmt)
+
+        def plots_exist() -> bool:
+            from chanzuck.spatial.visualize import PLOTS
+
+            return all(
+                (plots_dir / f"{name}.{fmt}").exists() for name in PLOTS
+            )
+
+        stages.append(
+            Stage(
+                "plots",
+                ("stats",) if "stats" in config else (),
+                lambda: fingerprint(config["plots"], csv_signatures()),
+                run_plots,
+                plots_exist,
+            )
+        )
+
+    return stages
+
+
+def read_run_record(dataset_path: str | Path) -> dict[str, str]:
+    """Stage fingerprints of the last run, from the plate attributes."""
+    root = zarr.open_group(str(dataset_path), mode="r")
+    return dict(root.attrs.get("chanzuck", {}).get("run", {}))
+
+
+def write_run_record(dataset_path: str | Path, record: dict[str, str]):
+    """Stores stage fingerprints under ``chanzuck/run`` of the plate."""
+    root = zarr.open_group(str(dataset_path), mode="a")
+    chanzuck_attrs = dict(root.attrs.get("chanzuck", {}))
+    chanzuck_attrs["run"] = dict(record)
+    root.attrs["chanzuck"] = chanzuck_attrs
+
+
+def _config_selection(section: dict) -> Selection:
+    def ids(key):
+        value = section.get(key)
+        return tuple(value) if value else None
+
+    def bounds(key):
+        value = section.get(key)
+        return parse_range(str(value)) if value is not None else None
+
+    return Selection(
+        wells=ids("wells"),
+        positions=ids("positions"),
+        time_range=bounds("time_range"),
+        z_range=bounds("z_range"),
+    )
+
+
+def _channel_index(
+    dataset: Path, position: tuple[str, str], channel: int | str
+) -> int:
+    # Channels can be given by index or by name
+    if isinstance(channel, int):
+        return channel
+    root = zarr.open_group(str(dataset), mode="r")
+    omero = root["/".join(position)].attrs.get("omero", {})
+    names = [c.get("label") for c in omero.get("channels", [])]
+    if channel not in names:
+        raise ValueError(f"Unknown channel '{channel}', have {names}.")
+    return names.index(channel)
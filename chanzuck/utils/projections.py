@@ -0,0 +1,241 @@
+import dask.array as da
+import numpy as np
+import zarr
+
+# Subgroup of a position holding the Z projections of its arrays
+PROJECTION_GROUP = "projections"
+PROJECTION_METHODS = ("max", "mean")
+
+
+def projection_names(name: str) -> list[str]:
+    """
+    Arrays holding the projections of ``name`` inside a position: one per
+    method for the image (``projections/max``, ``projections/mean``) and
+    the projected outlines of a label array (``projections/<name>``).
+    """
+    if name == "0":
+        return [
+            f"{PROJECTION_GROUP}/{method}" for method in PROJECTION_METHODS
+        ]
+    return [f"{PROJECTION_GROUP}/{name}"]
+
+
+def project_image(volume, method: str = "max"):
+    """
+    Projects the Z axis (third from last) of a numpy or dask array.
+
+    Args:
+        volume: (..., Z, Y, X) image.
+        method (str): "max" keeps the dtype, "mean" gives float32.
+
+    Returns:
+        The (..., Y, X) projection.
+    """
+    if method == "max":
+        return volume.max(axis=-3)
+    if method == "mean":
+        return volume.mean(axis=-3, dtype=np.float32)
+    raise ValueError(
+        f"Unknown projection '{method}', expected one of {PROJECTION_METHODS}."
+    )
+
+
+def outline_labels(labels: np.ndarray) -> np.ndarray:
+    """
+    Keeps the inner boundary of every label of (..., Y, X) planes: pixels
+    whose 4-neighbourhood holds another ID, like ``find_boundaries`` with
+    ``mode="inner"`` applied plane by plane.
+    """
+    edge = np.zeros(labels.shape, dtype=bool)
+    vertical = labels[..., 1:, :] != labels[..., :-1, :]
+    edge[..., 1:, :] |= vertical
+    edge[..., :-1, :] |= vertical
+    horizontal = labels[..., :, 1:] != labels[..., :, :-1]
+    edge[..., :, 1:] |= horizontal
+    edge[..., :, :-1] |= horizontal
+    return np.where(edge, labels, 0).astype(labels.dtype, copy=False)
+
+
+def project_labels(volume: np.ndarray) -> np.ndarray:
+    """
+    Outlines of the maximum Z projection of a (..., Z, Y, X) label array.
+    Where nuclei overlap in Z the larger ID is drawn.
+    """
+    return outline_labels(volume.max(axis=-3))
+
+
+def require_projections(
+    position: zarr.Group, name: str, source: zarr.Array
+) -> list[zarr.Array]:
+    """
+    Opens the projection arrays of ``name`` in a position, (re)creating
+    those whose shape or dtype no longer matches ``source``. Projections
+    are (T, C, Y, X), chunked like the source planes, and grow along time
+    with it.
+
+    Args:
+        position (zarr.Group): Position group holding ``source``.
+        name (str): Name of ``source`` in the position.
+        source (zarr.Array): (T, C, Z, Y, X) image or label array.
+
+    Returns:
+        list[zarr.Array]: Arrays in the order of ``projection_names``.
+    """
+    shape = source.shape[:2] + source.shape[-2:]
+    chunks = (1, 1) + source.chunks[-2:]
+    targets = []
+    for target_name in projection_names(name):
+        dtype = (
+            np.dtype(np.float32)
+            if target_name.endswith("/mean")
+            else source.dtype
+        )
+        target = position.get(target_name)
+        if (
+            target is None
+            or target.shape[1:] != shape[1:]
+            or target.dtype != dtype
+        ):
+            target = position.zeros(
+                target_name,
+                shape=shape,
+                chunks=chunks,
+                dtype=dtype,
+                compressor=source.compressor,
+                dimension_separator="/",
+                overwrite=True,
+            )
+        elif target.shape[0] != shape[0]:
+            target.resize(shape)
+        targets.append(target)
+    return targets
+
+
+def stale_projections(
+    target: zarr.Array,
+    signatures: dict[int, int],
+    timepoints,
+    channels=None,
+) -> list[int]:
+    """
+    Timepoints of ``timepoints`` whose projection of some channel was built
+    from other source chunks than the current ones (see
+    ``timepoint_signatures``), or never built. Without signatures every
+    timepoint is stale.
+
+    Args:
+        target (zarr.Array): Projection array.
+        signatures (dict[int, int]): Current source signatures.
+        timepoints: Candidate timepoints.
+        channels: Channels to check, all of ``target`` when None.
+
+    Returns:
+        list[int]: Sorted stale timepoints.
+    """
+    if not signatures:
+        return sorted(timepoints)
+    recorded = target.attrs.get("signature", {})
+    channels = range(target.shape[1]) if channels is None else channels
+    return sorted(
+        t
+        for t in timepoints
+        if any(
+            recorded.get(f"{t}/{c}") != signatures.get(t, 0) for c in channels
+        )
+    )
+
+
+def record_projections(
+    target: zarr.Array,
+    signatures: dict[int, int],
+    timepoints,
+    channels=None,
+):
+    """
+    Stores the source signature each timepoint and channel of ``target``
+    was projected from, keeping the entries of the others.
+    """
+    channels = range(target.shape[1]) if channels is None else channels
+    recorded = dict(target.attrs.get("signature", {}))
+    for t in timepoints:
+        for c in channels:
+            recorded[f"{t}/{c}"] = signatures.get(t, 0)
+    target.attrs["signature"] = recorded
+
+
+def write_projections(
+    position: zarr.Group,
+    name: str,
+    t: int,
+    volume: np.ndarray,
+    signatures: dict[int, int],
+    channel: int = 0,
+):
+    """
+    Projects one (Z, Y, X) volume of ``name`` that is already in memory,
+    e.g. a frame being segmented, into ``channel`` of its projections and
+    records the signature of timepoint ``t`` it was read from.
+
+    Args:
+        position (zarr.Group): Position group holding ``name``.
+        name (str): Image ("0") or label array the volume belongs to.
+        t (int): Timepoint of the volume.
+        volume (np.ndarray): (Z, Y, X) volume.
+        signatures (dict[int, int]): Current signature of ``name``.
+        channel (int): Channel of the volume.
+    """
+    for target in require_projections(position, name, position[name]):
+        if name == "0":
+            target[t, channel] = project_image(
+                volume, target.name.rsplit("/", 1)[-1]
+            )
+        else:
+            target[t, channel] = project_labels(volume)
+        record_projections(target, signatures, [t], [channel])
+
+
+def projection_graph(
+    base: da.Array,
+    targets: list[zarr.Array],
+    time_range: tuple[int, int],
+    labels: bool = False,
+) -> tuple[list[da.Array], list, list[tuple[slice, ...]]]:
+    """
+    Lazy projections of a run of timepoints of a (T, C, Z, Y, X) dask
+    array, ready for ``da.store``. Computed in the same graph as other
+    outputs of ``base`` (e.g. pyramid levels), the chunks are read once.
+
+    Args:
+        base (da.Array): Whole source array.
+        targets (list[zarr.Array]): Output of ``require_projections``.
+        time_range (tuple[int, int]): Half-open range of timepoints.
+        labels (bool): ``base`` holds labels, its projection is outlined.
+
+    Returns:
+        Sources, targets and regions for ``da.store``.
+    """
+    t_start, t_stop = time_range
+    block = base[t_start:t_stop]
+    if labels:
+        # Outlines only look one pixel across chunk borders
+        projected = [
+            block.max(axis=2).map_overlap(
+                outline_labels, depth={2: 1, 3: 1}, boundary="none"
+            )
+        ]
+    else:
+        projected = [
+            project_image(block, target.name.rsplit("/", 1)[-1])
+            for target in targets
+        ]
+
+    regions = [
+        (slice(t_start, t_stop),)
+        + tuple(slice(0, n) for n in target.shape[1:])
+        for target in targets
+    ]
+    sources = [
+        source.rechunk(target.chunks)
+        for source, target in zip(projected, targets, strict=True)
+    ]
+    return sources, list(targets), regions
@@ -0,0 +1,193 @@
+import os
+import threading
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import zarr
+from iohub.ngff.nodes import Plate
+from zarr.storage import Store
+
+from chanzuck.utils.sharding import ShardedStore
+
+# Holds the fetch concurrency so every command and its workers see it
+FETCH_WORKERS_ENV = "CHANZUCK_FETCH_WORKERS"
+DEFAULT_FETCH_WORKERS = 16
+
+
+def is_url(location: str | Path) -> bool:
+    """Whether a dataset location is an fsspec URL like ``s3://bucket/x``."""
+    return "://" in str(location)
+
+
+def set_fetch_workers(workers: int):
+    """Sets the fetch concurrency of this process and its children."""
+    os.environ[FETCH_WORKERS_ENV] = str(workers)
+
+
+def get_fetch_workers() -> int:
+    """Concurrent chunk reads per store, from ``--fetch-workers``."""
+    return int(os.environ.get(FETCH_WORKERS_ENV) or DEFAULT_FETCH_WORKERS)
+
+
+class ConcurrentStore(Store):
+    """
+    Zarr store wrapper reading chunks on a bounded thread pool.
+
+    zarr asks for all chunks of a selection at once through ``getitems``,
+    which this store fans out over ``max_workers`` threads instead of
+    reading them one after the other, so a read costs about one round trip
+    of latency instead of one per chunk. Requests for a key already being
+    fetched, from any thread, wait for that fetch instead of issuing their
+    own. Writes go straight to the wrapped store.
+    """
+
+    def __init__(self, store, max_workers: int | None = None):
+        self._store = store
+        self.max_workers = max_workers or get_fetch_workers()
+        self.fetches = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="chanzuck-fetch"
+        )
+        self._in_flight: dict[str, Future] = {}
+        self._mutex = threading.Lock()
+        # Idle fetch threads go away with the store
+        weakref.finalize(self, self._executor.shutdown, wait=False)
+
+    @property
+    def path(self) -> str | None:
+        # Lets chunk files of local stores be inspected through the wrapper
+        return getattr(self._store, "path", None)
+
+    def _fetch(self, key: str) -> Future:
+        with self._mutex:
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self._executor.submit(self._read, key)
+                self._in_flight[key] = future
+                future.add_done_callback(lambda _: self._forget(key))
+        return future
+
+    def _forget(self, key: str):
+        with self._mutex:
+            self._in_flight.pop(key, None)
+
+    def _read(self, key: str):
+        with self._mutex:
+            self.fetches += 1
+        try:
+            return self._store[key]
+        except KeyError:
+            return None
+
+    def __getitem__(self, key: str):
+        value = self._fetch(key).result()
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def getitems(self, keys, *, contexts=None) -> dict:
+        futures = {key: self._fetch(key) for key in dict.fromkeys(keys)}
+        values = {key: future.result() for key, future in futures.items()}
+        # Missing chunks are left out, zarr fills them with the fill value
+        return {
+            key: value for key, value in values.items() if value is not None
+        }
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._store
+
+    def __setitem__(self, key, value):
+        self._store[key] = value
+
+    def __delitem__(self, key):
+        del self._store[key]
+
+    def __iter__(self):
+        return iter(self._store)
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def listdir(self, path: str = "") -> list[str]:
+        return self._store.listdir(path)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def open_store(
+    location: str | Path, max_workers: int | None = None
+) -> ConcurrentStore:
+    """
+    Opens a plate from a local path or an fsspec URL (``s3://``,
+    ``gs://``, ``http://``, ...) behind a ``ConcurrentStore``. Sharded
+    arrays are read through a ``ShardedStore`` like any other.
+
+    Args:
+        location (str | Path): Path or URL of the OME-Zarr plate.
+        max_workers (int | None): Concurrent chunk reads, the
+            ``--fetch-workers`` setting when None.
+
+    Returns:
+        ConcurrentStore: Store to open groups and arrays from.
+    """
+    if is_url(location):
+        store = zarr.storage.FSStore(
+            str(location), mode="r", dimension_separator="/"
+        )
+    else:
+        store = zarr.DirectoryStore(str(location), dimension_separator="/")
+    return ConcurrentStore(ShardedStore(store), max_workers=max_workers)
+
+
+def open_plate(
+    location: str | Path, max_workers: int | None = None
+) -> zarr.Group:
+    """Read-only root group of a plate opened with ``open_store``."""
+    return zarr.open_group(
+        store=open_store(location, max_workers=max_workers), mode="r"
+    )
+
+
+def open_group(location: str | Path, mode: str = "r") -> zarr.Group:
+    """
+    Group of a local plate, or of a well or position inside it, whose
+    arrays are read and written through a ``ShardedStore``. Sharded arrays
+    cannot be opened from a plain ``zarr.DirectoryStore``.
+    """
+    store = zarr.DirectoryStore(str(location), dimension_separator="/")
+    return zarr.open_group(store=ShardedStore(store), mode=mode)
+
+
+def open_dataset(location: str | Path, mode: str = "r") -> Plate:
+    """
+    ``iohub.open_ome_zarr`` for an existing local plate, opened with
+    ``open_group`` so its sharded arrays can be read and written. Closing
+    it writes the shards still incomplete.
+    """
+    return Plate(group=open_group(location, mode=mode), parse_meta=True)
+
+
+def plate_positions(plate: zarr.Group) -> list[tuple[str, str]]:
+    """
+    (well, position) names of a plate in metadata order, read from the
+    plate and well attributes without listing directories.
+
+    Args:
+        plate (zarr.Group): Root group of an OME-Zarr plate.
+
+    Returns:
+        list[tuple[str, str]]: Well paths like ``"A/1"`` and position names.
+    """
+    positions = []
+    for well in plate.attrs.get("plate", {}).get("wells", []):
+        images = plate[well["path"]].attrs.get("well", {}).get("images", [])
+        positions += [(well["path"], image["path"]) for image in images]
+    return positions
+
+
+def channel_names(position: zarr.Group) -> list[str]:
+    """Channel labels of a position from its omero metadata."""
+    channels = position.attrs.get("omero", {}).get("channels", [])
+    return [channel.get("label") for channel in channels]
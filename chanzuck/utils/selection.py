@@ -0,0 +1,106 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Selection:
+    """
+    Part of a plate to process: wells, positions, a time range and a Z
+    range. Fields left as None select everything.
+
+    Ranges are ``(start, stop)`` with an exclusive stop like Python slices,
+    a None stop runs to the end of the axis.
+
+    Attributes:
+        wells (tuple[str, ...] | None): Well IDs, e.g. ``("C/2",)``.
+        positions (tuple[str, ...] | None): Position IDs (``"000001"``) or
+            full position paths (``"C/2/000001"``).
+        time_range (tuple[int, int | None] | None): Timepoints to process.
+        z_range (tuple[int, int | None] | None): Z planes to process.
+    """
+
+    wells: tuple[str, ...] | None = None
+    positions: tuple[str, ...] | None = None
+    time_range: tuple[int, int | None] | None = None
+    z_range: tuple[int, int | None] | None = None
+
+    def includes(self, well_id: str, pos_id: str) -> bool:
+        """Whether a position is part of the selection."""
+        if self.wells is not None and well_id not in self.wells:
+            return False
+        if self.positions is not None:
+            return (
+                pos_id in self.positions
+                or f"{well_id}/{pos_id}" in self.positions
+            )
+        return True
+
+    def timepoints(self, n_timepoints: int) -> range:
+        """Selected timepoints of an axis holding ``n_timepoints``."""
+        return range(*self.time_slice(n_timepoints).indices(n_timepoints))
+
+    def time_slice(self, n_timepoints: int) -> slice:
+        """Selected timepoints as a slice clipped to the axis."""
+        return _clip(self.time_range, n_timepoints)
+
+    def z_slice(self, n_planes: int) -> slice:
+        """Selected Z planes as a slice clipped to the axis."""
+        return _clip(self.z_range, n_planes)
+
+    def covers(self, n_timepoints: int, n_planes: int) -> bool:
+        """Whether every timepoint and Z plane of a position is selected."""
+        return (
+            len(self.timepoints(n_timepoints)) == n_timepoints
+            and len(range(*self.z_slice(n_planes).indices(n_planes)))
+            == n_planes
+        )
+
+
+def parse_range(text: str) -> tuple[int, int | None]:
+    """
+    Parses ``"start:stop"``, ``"start:"`` or a single index ``"i"``.
+
+    Args:
+        text (str): Range with an exclusive stop.
+
+    Returns:
+        tuple[int, int | None]: Start and stop, stop is None for open ends.
+    """
+    start, sep, stop = text.partition(":")
+    try:
+        lo = int(start) if start.strip() else 0
+        hi = int(stop) if stop.strip() else None
+    except ValueError as e:
+        raise ValueError(f"'{text}' is not a 'start:stop' range.") from e
+    if not sep:
+        hi = lo + 1
+    if lo < 0 or (hi is not None and hi <= lo):
+        raise ValueError(f"'{text}' is empty or negative.")
+    return lo, hi
+
+
+def parse_shard(text: str) -> tuple[int, int]:
+    """
+    Parses a ``"i/N"`` shard, ``i`` counts from 0.
+
+    Args:
+        text (str): Shard such as ``"0/4"``.
+
+    Returns:
+        tuple[int, int]: Shard index and shard count.
+    """
+    index, sep, count = text.partition("/")
+    try:
+        shard = int(index), int(count)
+    except ValueError as e:
+        raise ValueError(f"'{text}' is not an 'i/N' shard.") from e
+    if not sep or not 0 <= shard[0] < shard[1]:
+        raise ValueError(f"'{text}' needs 0 <= i < N.")
+    return shard
+
+
+def _clip(bounds: tuple[int, int | None] | None, size: int) -> slice:
+    if bounds is None:
+        return slice(0, size)
+    start, stop = bounds
+    stop = size if stop is None else min(stop, size)
+    return slice(min(start, size), stop)
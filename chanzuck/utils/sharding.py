@@ -0,0 +1,499 @@
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import numpy as np
+import zarr
+from numcodecs.compat import ensure_bytes
+from zarr.storage import DirectoryStore, Store
+from zarr.util import json_dumps
+
+LAYOUTS = ("chunked", "sharded")
+# Uncompressed size a shard is allowed to cover
+DEFAULT_SHARD_BYTES = 512 * 1024**2
+SHARD_SUFFIX = ".shard"
+# Compressor id of sharded arrays on disk, no zarr codec has it so readers
+# that do not know about shards refuse to open them instead of reading the
+# missing chunk keys as fill values
+SHARDED_CODEC = "chanzuck.sharded"
+# Index entry of a chunk missing from its shard
+_MISSING = 2**64 - 1
+# Shard indices kept in memory per store
+_INDEX_CACHE_SIZE = 4096
+
+
+def shard_shape(
+    shape: tuple[int, ...],
+    chunks: tuple[int, ...],
+    itemsize: int,
+    max_bytes: int = DEFAULT_SHARD_BYTES,
+) -> tuple[int, ...]:
+    """
+    Chunks per shard along each axis: one chunk of the first (time) axis and
+    as many chunks of the other axes as fit in ``max_bytes`` uncompressed,
+    halving the axis with the most chunks until they do.
+
+    Args:
+        shape (tuple[int, ...]): Array shape.
+        chunks (tuple[int, ...]): Chunk shape.
+        itemsize (int): Bytes per element.
+        max_bytes (int): Largest uncompressed shard.
+
+    Returns:
+        tuple[int, ...]: Shard shape in chunks.
+    """
+    grid = [math.ceil(n / c) for n, c in zip(shape, chunks, strict=True)]
+    shards = [1, *grid[1:]]
+    chunk_bytes = math.prod(chunks) * itemsize
+    while math.prod(shards) * chunk_bytes > max_bytes and max(shards[1:]) > 1:
+        axis = 1 + int(np.argmax(shards[1:]))
+        shards[axis] = math.ceil(shards[axis] / 2)
+    return tuple(shards)
+
+
+def enable_sharding(
+    array: zarr.Array, shards: tuple[int, ...] | None = None
+) -> tuple[int, ...]:
+    """
+    Stores the chunks of an array in shards from now on. Call it on new,
+    empty arrays, chunks written before are not moved into shards.
+
+    The layout is recorded in the array metadata by replacing its
+    compressor with a ``chanzuck.sharded`` one holding the shard shape and
+    the real compressor. ``ShardedStore`` hands zarr the real compressor,
+    plain zarr readers (and iohub) fail on the unknown codec instead of
+    reading zeros. Reopen the array with ``sharded`` to write it.
+
+    Args:
+        array (zarr.Array): Array to shard.
+        shards (tuple[int, ...] | None): Shard shape in chunks, from
+            ``shard_shape`` when None.
+
+    Returns:
+        tuple[int, ...]: The shard shape.
+    """
+    if shards is None:
+        shards = shard_shape(array.shape, array.chunks, array.dtype.itemsize)
+    key = _join(array.path, ".zarray")
+    meta = json.loads(array.store[key])
+    meta["compressor"] = {
+        "id": SHARDED_CODEC,
+        "shards": [int(s) for s in shards],
+        "compressor": meta["compressor"],
+    }
+    array.store[key] = json_dumps(meta)
+    return tuple(shards)
+
+
+def array_shards(array: zarr.Array) -> tuple[int, ...] | None:
+    """Shard shape of an array in chunks, None when it is not sharded."""
+    store = _sharded_store(array.store)
+    if store is not None:
+        layout = store._layout(array.path)
+        return layout[1] if layout else None
+    try:
+        meta = json.loads(array.store[_join(array.path, ".zarray")])
+    except KeyError:
+        return None
+    return _codec_shards(meta)
+
+
+class ShardedStore(Store):
+    """
+    Zarr store wrapper packing the chunks of sharded arrays into one
+    storage object per shard.
+
+    A shard holds a block of chunks (see ``enable_sharding``) as their
+    encoded bytes one after the other, followed by an index of
+    ``(offset, nbytes)`` little-endian uint64 pairs, one per chunk of the
+    block in C order, ``2**64 - 1`` for missing chunks. This is the layout
+    of Zarr v3's sharding codec with the index at the end, which zarr 2 and
+    iohub cannot write. The ``.zarray`` of sharded arrays is read with
+    their real compressor and keeps the shard layout when zarr rewrites it
+    (e.g. on resize). Other arrays and metadata pass through.
+
+    Reading a chunk costs one ranged read of its shard once the shard's
+    index is known. Written chunks are buffered per shard and a shard is
+    written as soon as all of its chunks arrived, so writers that hand over
+    whole shards (like ``da.store`` on shard-aligned blocks) write them in
+    parallel without locking. ``flush`` writes the shards still incomplete,
+    merged with what they already hold.
+    """
+
+    def __init__(self, store):
+        self._store = store
+        self._layouts: dict[str, tuple | None] = {}
+        # Shard key -> (buffered chunks by slot, slots in the shard)
+        self._pending: dict[str, tuple[dict[int, bytes | None], int]] = {}
+        self._indices: OrderedDict[str, tuple] = OrderedDict()
+        self._mutex = threading.Lock()
+
+    def __getstate__(self):
+        # Worker processes start with empty buffers and caches
+        return {"_store": self._store, "_layouts": self._layouts}
+
+    def __setstate__(self, state):
+        self.__init__(state["_store"])
+        self._layouts.update(state["_layouts"])
+
+    @property
+    def path(self) -> str | None:
+        return getattr(self._store, "path", None)
+
+    @property
+    def _dimension_separator(self) -> str | None:
+        # New arrays pick their chunk key separator from the store
+        return getattr(self._store, "_dimension_separator", None)
+
+    def _layout(self, prefix: str) -> tuple | None:
+        # (chunk grid, shard shape) of a sharded array, None otherwise
+        if prefix not in self._layouts:
+            layout = None
+            try:
+                meta = json.loads(self._store[_join(prefix, ".zarray")])
+            except KeyError:
+                meta = None
+            shards = meta and _codec_shards(meta)
+            if shards:
+                grid = tuple(
+                    math.ceil(n / c)
+                    for n, c in zip(meta["shape"], meta["chunks"], strict=True)
+                )
+                layout = (grid, tuple(shards))
+            self._layouts[prefix] = layout
+        return self._layouts[prefix]
+
+    def _locate(self, key: str) -> tuple[str, int, tuple] | None:
+        # Shard key, slot in the shard and layout of a chunk key
+        prefix, _, last = key.rpartition("/")
+        if last.startswith("."):
+            return None
+        if "." in last:
+            candidates = [(prefix, last.split("."))]
+        else:
+            segments = key.split("/")
+            n_digits = 0
+            while (
+                n_digits < len(segments) and segments[-1 - n_digits].isdigit()
+            ):
+                n_digits += 1
+            candidates = [
+                ("/".join(segments[:-n]), segments[-n:])
+                for n in range(n_digits, 0, -1)
+            ]
+        for array_prefix, coords in candidates:
+            if not all(c.isdigit() for c in coords):
+                continue
+            layout = self._layout(array_prefix)
+            if layout is None or len(layout[0]) != len(coords):
+                continue
+            grid, shards = layout
+            coords = [int(c) for c in coords]
+            shard = [c // s for c, s in zip(coords, shards, strict=True)]
+            slot = int(
+                np.ravel_multi_index(
+                    [c % s for c, s in zip(coords, shards, strict=True)],
+                    shards,
+                )
+            )
+            shard_key = _join(
+                array_prefix, "/".join(map(str, shard)) + SHARD_SUFFIX
+            )
+            return shard_key, slot, (grid, shards, tuple(shard))
+        return None
+
+    def _local_path(self, key: str) -> str | None:
+        if isinstance(self._store, DirectoryStore):
+            return os.path.join(
+                self._store.path, self._store._normalize_key(key)
+            )
+        return None
+
+    def _read(self, key: str, start: int, stop: int | None) -> bytes:
+        # Byte range of a stored object, a negative start reads its tail
+        path = self._local_path(key)
+        if path is not None:
+            try:
+                with open(path, "rb") as f:
+                    f.seek(start, os.SEEK_SET if start >= 0 else os.SEEK_END)
+                    return f.read(None if stop is None else stop - start)
+            except FileNotFoundError as e:
+                raise KeyError(key) from e
+        fs = getattr(self._store, "fs", None)
+        if fs is not None:
+            try:
+                return fs.cat_file(
+                    self._store.map._key_to_str(
+                        self._store._normalize_key(key)
+                    ),
+                    start=start,
+                    end=stop,
+                )
+            except FileNotFoundError as e:
+                raise KeyError(key) from e
+        return ensure_bytes(self._store[key])[start:stop]
+
+    def _stamp(self, key: str):
+        # Local shards are revalidated by size and mtime, remote ones are
+        # treated as immutable
+        path = self._local_path(key)
+        if path is None:
+            return True
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def _index(self, shard_key: str, n_slots: int) -> np.ndarray | None:
+        stamp = self._stamp(shard_key)
+        if stamp is None:
+            return None
+        with self._mutex:
+            cached = self._indices.get(shard_key)
+            if cached is not None and cached[0] == stamp:
+                self._indices.move_to_end(shard_key)
+                return cached[1]
+        try:
+            raw = self._read(shard_key, -16 * n_slots, None)
+        except KeyError:
+            return None
+        index = np.frombuffer(raw, dtype="<u8").reshape(n_slots, 2)
+        with self._mutex:
+            self._indices[shard_key] = (stamp, index)
+            if len(self._indices) > _INDEX_CACHE_SIZE:
+                self._indices.popitem(last=False)
+        return index
+
+    def _read_shard(self, shard_key: str, n_slots: int) -> dict[int, bytes]:
+        index = self._index(shard_key, n_slots)
+        if index is None:
+            return {}
+        data = self._read(shard_key, 0, None)
+        return {
+            slot: data[int(offset) : int(offset + nbytes)]
+            for slot, (offset, nbytes) in enumerate(index)
+            if offset != _MISSING
+        }
+
+    def __getitem__(self, key: str):
+        values = self.getitems([key])
+        if key not in values:
+            raise KeyError(key)
+        return values[key]
+
+    def getitems(self, keys, *, contexts=None) -> dict:
+        values = {}
+        by_shard: dict[str, list] = {}
+        for key in keys:
+            located = self._locate(key)
+            if located is None:
+                try:
+                    values[key] = self._store[key]
+                except KeyError:
+                    continue
+                if key.endswith(".zarray"):
+                    values[key] = _unwrap_meta(values[key])
+                continue
+            shard_key, slot, (_, shards, _) = located
+            with self._mutex:
+                pending = self._pending.get(shard_key, ({}, 0))[0]
+                if slot in pending:
+                    if pending[slot] is not None:
+                        values[key] = pending[slot]
+                    continue
+            by_shard.setdefault(shard_key, []).append(
+                (key, slot, math.prod(shards))
+            )
+
+        for shard_key, wanted in by_shard.items():
+            index = self._index(shard_key, wanted[0][2])
+            if index is None:
+                continue
+            ranges = [
+                (key, int(index[slot, 0]), int(index[slot, 1]))
+                for key, slot, _ in wanted
+                if index[slot, 0] != _MISSING
+            ]
+            if not ranges:
+                continue
+            # One read covering every requested chunk of the shard
+            start = min(offset for _, offset, _ in ranges)
+            stop = max(offset + nbytes for _, offset, nbytes in ranges)
+            data = self._read(shard_key, start, stop)
+            for key, offset, nbytes in ranges:
+                values[key] = data[offset - start : offset - start + nbytes]
+        return values
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.getitems([key])
+
+    def setitems(self, values: dict):
+        complete = []
+        for key, value in values.items():
+            located = self._locate(key)
+            if located is None:
+                if key.endswith(".zarray"):
+                    value = self._wrap_meta(key, value)
+                    self._layouts.pop(key.rpartition("/")[0], None)
+                self._store[key] = value
+                continue
+            shard_key, slot, (grid, shards, shard) = located
+            with self._mutex:
+                chunks, _ = self._pending.setdefault(
+                    shard_key, ({}, math.prod(shards))
+                )
+                chunks[slot] = None if value is None else ensure_bytes(value)
+                if len(chunks) == _chunks_in_shard(grid, shards, shard):
+                    complete.append((shard_key, *self._pending.pop(shard_key)))
+        for shard_key, chunks, n_slots in complete:
+            self._write_shard(shard_key, chunks, n_slots)
+
+    def __setitem__(self, key: str, value):
+        self.setitems({key: value})
+
+    def _wrap_meta(self, key: str, value):
+        # zarr rewrites the metadata with the real compressor, the stored
+        # shard layout is kept unless the array is being recreated
+        meta = json.loads(ensure_bytes(value))
+        if _codec_shards(meta):
+            return value
+        try:
+            stored = json.loads(self._store[key])
+        except KeyError:
+            return value
+        if not _codec_shards(stored):
+            return value
+        meta["compressor"] = {
+            **stored["compressor"],
+            "compressor": meta["compressor"],
+        }
+        return json_dumps(meta)
+
+    def delitems(self, keys):
+        plain = [key for key in keys if self._locate(key) is None]
+        for key in plain:
+            del self._store[key]
+        self.setitems({key: None for key in keys if key not in plain})
+
+    def __delitem__(self, key: str):
+        self.delitems([key])
+
+    def flush(self):
+        """Writes the shards that did not receive all of their chunks."""
+        with self._mutex:
+            pending, self._pending = self._pending, {}
+        for shard_key, (chunks, n_slots) in pending.items():
+            merged = self._read_shard(shard_key, n_slots)
+            merged.update(chunks)
+            self._write_shard(shard_key, merged, n_slots)
+
+    def _write_shard(
+        self, shard_key: str, chunks: dict[int, bytes | None], n_slots: int
+    ):
+        present = {
+            slot: data for slot, data in chunks.items() if data is not None
+        }
+        with self._mutex:
+            self._indices.pop(shard_key, None)
+        if not present:
+            if shard_key in self._store:
+                del self._store[shard_key]
+            return
+        index = np.full((n_slots, 2), _MISSING, dtype="<u8")
+        offset = 0
+        for slot in sorted(present):
+            index[slot] = (offset, len(present[slot]))
+            offset += len(present[slot])
+        self._store[shard_key] = (
+            b"".join(present[slot] for slot in sorted(present))
+            + index.tobytes()
+        )
+
+    def __iter__(self):
+        return iter(self._store)
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def listdir(self, path: str = "") -> list[str]:
+        return self._store.listdir(path)
+
+    def rmdir(self, path: str = ""):
+        self._layouts.clear()
+        self._store.rmdir(path)
+
+    def getsize(self, path=None) -> int:
+        return self._store.getsize(path)
+
+    def close(self):
+        self.flush()
+
+
+def sharded(array: zarr.Array) -> zarr.Array:
+    """
+    The array opened through a ``ShardedStore`` when it is sharded and its
+    store does not already read shards, the array itself otherwise.
+    """
+    if _sharded_store(array.store) is not None or array_shards(array) is None:
+        return array
+    return zarr.open_array(
+        store=ShardedStore(array.store),
+        path=array.path,
+        mode="r" if array.read_only else "r+",
+    )
+
+
+@contextmanager
+def writing(array: zarr.Array) -> Iterator[zarr.Array]:
+    """
+    Context giving ``sharded(array)`` for writing, incomplete shards are
+    written when it exits.
+    """
+    out = sharded(array)
+    try:
+        yield out
+    finally:
+        store = _sharded_store(out.store)
+        if store is not None:
+            store.flush()
+
+
+def _sharded_store(store) -> ShardedStore | None:
+    # The ShardedStore a store reads through, if any
+    while store is not None:
+        if isinstance(store, ShardedStore):
+            return store
+        store = getattr(store, "_store", None)
+    return None
+
+
+def _codec_shards(meta: dict) -> tuple[int, ...] | None:
+    compressor = meta.get("compressor") or {}
+    if compressor.get("id") != SHARDED_CODEC:
+        return None
+    return tuple(compressor["shards"])
+
+
+def _unwrap_meta(value):
+    # The metadata zarr reads: the real compressor of sharded arrays
+    meta = json.loads(ensure_bytes(value))
+    if not _codec_shards(meta):
+        return value
+    meta["compressor"] = meta["compressor"]["compressor"]
+    return json_dumps(meta)
+
+
+def _chunks_in_shard(grid, shards, shard) -> int:
+    # Shards at the array edges hold fewer chunks
+    return math.prod(
+        min(s, n - i * s) for n, s, i in zip(grid, shards, shard, strict=True)
+    )
+
+
+def _join(prefix: str, name: str) -> str:
+    return f"{prefix}/{name}" if prefix else name
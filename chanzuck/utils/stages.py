@@ -0,0 +1,3 @@
+# Pipeline stages in the order they run, each one named after the config
+# section enabling it. Kept free of heavy imports for the CLI.
+STAGE_SECTIONS = ("segment", "track", "pyramid", "stats", "plots")
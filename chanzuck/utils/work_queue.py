@@ -0,0 +1,266 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import replace
+from pathlib import Path
+
+from chanzuck.utils.remote import is_url, open_plate, plate_positions
+from chanzuck.utils.selection import Selection
+
+# Directory of each position holding the queue markers, ignored by zarr
+QUEUE_DIR = ".chanzuck_queue"
+# Seconds without a heartbeat after which a claim is considered dead
+DEFAULT_LEASE = 120.0
+
+
+def list_positions(
+    dataset_path: str | Path,
+    selection: Selection | None = None,
+    shard: tuple[int, int] | None = None,
+) -> list[tuple[str, str]]:
+    """
+    (well, position) pairs of a plate in a stable order, filtered by a
+    selection and reduced to one shard.
+
+    Positions are dealt round robin over the shards, so ``N`` processes
+    given ``0/N`` to ``N-1/N`` split the plate without overlap.
+
+    Args:
+        dataset_path (str | Path): Path or fsspec URL of the plate.
+        selection (Selection | None): Wells and positions to keep.
+        shard (tuple[int, int] | None): ``(index, count)`` of this shard.
+
+    Returns:
+        list[tuple[str, str]]: Well and position IDs.
+    """
+    selection = selection or Selection()
+    positions = sorted(
+        (well_id, pos_id)
+        for well_id, pos_id in plate_positions(open_plate(dataset_path))
+        if selection.includes(well_id, pos_id)
+    )
+    if shard is not None:
+        index, count = shard
+        positions = positions[index::count]
+    return positions
+
+
+class WorkQueue:
+    """
+    Lock-file work queue coordinating workers that share a filesystem.
+
+    Every position gets a marker directory
+    ``<position>/.chanzuck_queue/<stage>/<name>/`` inside the store:
+
+    - ``claim`` is created exclusively by the worker processing the
+      position and touched every ``lease / 4`` seconds as a heartbeat.
+    - ``done`` is written once the position finished, so it is skipped by
+      every later worker of the same queue name.
+
+    A claim whose heartbeat is older than ``lease`` belongs to a dead worker
+    and is taken over by the next worker reaching it. Takeovers rename the
+    claim first, which only one worker can win. A worker only touches and
+    drops a claim holding its own ID, so one that was wrongly declared dead
+    (e.g. stalled longer than the lease) leaves the new owner's claim alone.
+    Hosts need roughly synced clocks since heartbeats are compared by
+    modification time.
+    """
+
+    def __init__(
+        self,
+        dataset_path: str | Path,
+        stage: str,
+        name: str = "default",
+        lease: float = DEFAULT_LEASE,
+    ):
+        if is_url(dataset_path):
+            raise ValueError(
+                "Work queues keep their markers next to the data and need "
+                f"a shared filesystem, not {dataset_path}. Use --shard."
+            )
+        self.dataset_path = Path(dataset_path)
+        self.stage = stage
+        self.name = name
+        self.lease = lease
+        self.worker_id = (
+            f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        )
+
+    def marker_dir(self, well_id: str, pos_id: str) -> Path:
+        return (
+            self.dataset_path
+            / well_id
+            / pos_id
+            / QUEUE_DIR
+            / self.stage
+            / self.name
+        )
+
+    def is_done(self, well_id: str, pos_id: str) -> bool:
+        return (self.marker_dir(well_id, pos_id) / "done").exists()
+
+    def try_claim(self, well_id: str, pos_id: str) -> bool:
+        """
+        Claims a position unless it is done or claimed by a live worker.
+
+        Returns:
+            bool: Whether this worker now owns the position.
+        """
+        directory = self.marker_dir(well_id, pos_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        if (directory / "done").exists():
+            return False
+
+        claim = directory / "claim"
+        if claim.exists() and not self._take_over(claim):
+            return False
+        try:
+            fd = os.open(claim, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            json.dump({"worker": self.worker_id, "time": time.time()}, f)
+        if (directory / "done").exists():
+            # Finished by another worker between the checks above
+            claim.unlink(missing_ok=True)
+            return False
+        return True
+
+    def _take_over(self, claim: Path) -> bool:
+        # Only a claim without a heartbeat for a whole lease can be taken
+        try:
+            age = time.time() - claim.stat().st_mtime
+        except FileNotFoundError:
+            return True
+        if age <= self.lease:
+            return False
+        dead = claim.with_name(f"claim.dead.{self.worker_id}")
+        try:
+            claim.rename(dead)
+        except FileNotFoundError:
+            return False  # Another worker won the takeover
+        if time.time() - dead.stat().st_mtime <= self.lease:
+            # The winner of a takeover already claimed it again, give the
+            # fresh claim back
+            try:
+                os.link(dead, claim)
+            except FileExistsError:
+                pass
+            dead.unlink()
+            return False
+        dead.unlink()
+        print(f"♻️ Taking over a dead claim in {claim.parent}")
+        return True
+
+    def complete(self, well_id: str, pos_id: str):
+        """Writes the done marker and drops the claim."""
+        directory = self.marker_dir(well_id, pos_id)
+        tmp = directory / f"done.{self.worker_id}"
+        tmp.write_text(
+            json.dumps({"worker": self.worker_id, "time": time.time()})
+        )
+        os.replace(tmp, directory / "done")
+        self.release(well_id, pos_id)
+
+    def release(self, well_id: str, pos_id: str):
+        """Drops this worker's claim so others can retry the position."""
+        claim = self.marker_dir(well_id, pos_id) / "claim"
+        if self._claim_owner(claim) == self.worker_id:
+            claim.unlink(missing_ok=True)
+
+    def _claim_owner(self, claim: Path) -> str | None:
+        # Worker ID written in a claim, None when there is no claim and ""
+        # while its creator has not written it yet
+        try:
+            return json.loads(claim.read_text()).get("worker", "")
+        except FileNotFoundError:
+            return None
+        except json.JSONDecodeError:
+            return ""
+
+    @contextmanager
+    def claim(self, well_id: str, pos_id: str) -> Iterator[bool]:
+        """
+        Context manager claiming a position and heartbeating while it runs.
+
+        Yields whether the claim succeeded. The position is marked done when
+        the block exits normally and released for other workers when it
+        raises.
+        """
+        if not self.try_claim(well_id, pos_id):
+            yield False
+            return
+
+        claim = self.marker_dir(well_id, pos_id) / "claim"
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(self.lease / 4):
+                owner = self._claim_owner(claim)
+                if owner == self.worker_id:
+                    try:
+                        os.utime(claim)
+                    except FileNotFoundError:
+                        pass
+                elif owner:
+                    print(f"⚠️ Lost the claim in {claim.parent} to {owner}")
+                    return
+                # A missing claim can be a takeover between its rename and
+                # giving the claim back, look again at the next beat
+
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+        try:
+            yield True
+        except BaseException:
+            stop.set()
+            thread.join()
+            self.release(well_id, pos_id)
+            raise
+        stop.set()
+        thread.join()
+        self.complete(well_id, pos_id)
+
+
+def run_positions(
+    dataset_path: str | Path,
+    process: Callable[[Selection], object],
+    selection: Selection | None = None,
+    shard: tuple[int, int] | None = None,
+    queue: WorkQueue | None = None,
+) -> dict[tuple[str, str], object]:
+    """
+    Calls ``process`` once per position of this worker, passing the
+    selection narrowed to that position.
+
+    Args:
+        dataset_path (str | Path): Path to the OME-Zarr plate.
+        process (Callable[[Selection], object]): Work for one position.
+        selection (Selection | None): Positions, time and Z range to run.
+        shard (tuple[int, int] | None): Only run this static shard.
+        queue (WorkQueue | None): Coordinate with other workers, skipping
+            positions that are done or claimed by a live worker.
+
+    Returns:
+        dict[tuple[str, str], object]: Result per processed position.
+    """
+    selection = selection or Selection()
+    results = {}
+    for well_id, pos_id in list_positions(dataset_path, selection, shard):
+        position_selection = replace(
+            selection, wells=(well_id,), positions=(f"{well_id}/{pos_id}",)
+        )
+        if queue is None:
+            results[(well_id, pos_id)] = process(position_selection)
+            continue
+        with queue.claim(well_id, pos_id) as claimed:
+            if not claimed:
+                continue
+            print(f"🔒 {queue.worker_id} claimed {well_id}/{pos_id}")
+            results[(well_id, pos_id)] = process(position_selection)
+    return results
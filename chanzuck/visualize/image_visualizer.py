@@ -1,13 +1,23 @@
 from pathlib import Path
-from typing import cast
 
 import dask.array as da
 import napari
-from iohub import open_ome_zarr
-from iohub.reader import Position
 from magicgui import magicgui, use_app
 
-from chanzuck.utils.describe import describe_dataset
+from chanzuck.utils.chunk_cache import (
+    DEFAULT_CACHE_MB,
+    ChunkPrefetcher,
+    open_cached_plate,
+    open_position_arrays,
+)
+from chanzuck.utils.describe import describe_dataset_fast
+from chanzuck.utils.image_pyramider import list_pyramid_levels
+from chanzuck.utils.memory import get_memory_budget
+from chanzuck.utils.projections import (
+    PROJECTION_GROUP,
+    PROJECTION_METHODS,
+    projection_names,
+)
 
 use_app("qt")
 
@@ -21,6 +31,8 @@ default_colormaps = [
     "orange",
     "purple",
 ]
+# "3D" shows the volumes, the others the cached Z projections
+VIEW_MODES = ("3D", *PROJECTION_METHODS)
 
 
 # gpt
@@ -35,10 +47,38 @@ def _safe_axis_labels(array_shape, axis_label_str):
     return labels[-len(array_shape) :]  # trim to match dimensions
 
 
-def view_image(dataset_path: str | Path, show_segmentations: bool):
+def view_image(
+    dataset_path: str | Path,
+    show_segmentations: bool,
+    cache_mb: int = DEFAULT_CACHE_MB,
+    prefetch: bool = True,
+    mode: str = "3D",
+):
+    """
+    Opens a plate in napari with a dropdown to switch positions.
+
+    Args:
+        dataset_path (str | Path): Path or fsspec URL of the plate.
+        show_segmentations (bool): Also show label arrays.
+        cache_mb (int): Memory budget of the shared chunk cache.
+        prefetch (bool): Warm the cache with neighbouring timepoints and
+            the next position.
+        mode (str): Initial view, "3D" or a projection method ("max",
+            "mean") to browse the cached Z projections as 2D time-lapses.
+            Positions without projections fall back to 3D.
+    """
     viewer = napari.Viewer()
-    dataset_metadata = describe_dataset(dataset_path=dataset_path)
-    dataset = open_ome_zarr(dataset_path, mode="r")
+    budget = get_memory_budget()
+    if budget is not None:
+        # The other half is left to napari and the chunks being decoded
+        cache_mb = min(cache_mb, budget // 2 // 1024**2)
+    dataset_metadata = describe_dataset_fast(dataset_path)
+    # One chunk cache shared by every position, so switching back to a
+    # position that was already viewed does not touch the disk again
+    dataset, cache = open_cached_plate(dataset_path, max_mb=cache_mb)
+    prefetcher = ChunkPrefetcher(cache) if prefetch else None
+    current = {"pos": None, "t": None, "mode": mode}
+    position_arrays: dict[str, dict[str, da.Array]] = {}
 
     # Build list of all available positions
     all_positions = []
@@ -50,69 +90,161 @@ def view_image(dataset_path: str | Path, show_segmentations: bool):
     @magicgui(
         auto_call=True,
         pos={"choices": all_positions},
+        mode={"choices": VIEW_MODES, "label": "view"},
         layout="vertical",
         call_button="Load position",
     )
-    def loader(pos: str):
+    def loader(pos: str, mode: str = mode):
         viewer.layers.clear()
+        current["pos"] = pos
         *well_parts, pos_id = pos.split("/")
         well_id = "/".join(well_parts)
 
         pos_info = dataset_metadata["Wells"][well_id][pos_id]
-        pos_data = dataset[well_id][pos_id]
-
-        if pos_info["multiscale"]:
-            # Add multiscale support here if needed later
-            image_array = da.from_array(pos_data["0"])
-            axis_labels = _safe_axis_labels(
-                image_array.shape, pos_info["axes"]
+        current["mode"] = mode
+        if mode != "3D":
+            if _projection_arrays(pos, mode):
+                _show_projections(pos, well_id, pos_id, pos_info, mode)
+                _prefetch_neighbours()
+                return
+            print(f"⚠️ No {mode} projections in {pos}, showing it in 3D.")
+            current["mode"] = "3D"
+
+        # Each array is opened once per position and reused on revisits,
+        # with dask chunks that slice storage chunks into single planes
+        if pos not in position_arrays:
+            position_arrays[pos] = open_position_arrays(
+                dataset[pos], plane_chunks=cache_mb > 0
+            )
+        arrays = position_arrays[pos]
+
+        image_array = arrays["0"]
+        axis_labels = _safe_axis_labels(image_array.shape, pos_info["axes"])
+        axis_labels.pop(1)  # Remove channel axis
+        level_names = (
+            [str(level["level"]) for level in pos_info["levels"]]
+            if pos_info["multiscale"]
+            else ["0"]
+        )
+
+        for idx, channel in enumerate(pos_info["channels"]):
+            colormap = default_colormaps[idx % len(default_colormaps)]
+            levels = [arrays[name][:, idx] for name in level_names]
+            multiscale = len(levels) > 1
+            viewer.add_image(
+                levels if multiscale else levels[0],
+                name=f"{well_id}_{pos_id}_channel_{channel}",
+                channel_axis=None,
+                colormap=colormap,
+                axis_labels=axis_labels,
+                multiscale=multiscale,
             )
-            axis_labels.pop(1)  # Remove channel axis
 
-            for idx, channel in enumerate(pos_info["channels"]):
-                multiscale_image = [
-                    da.from_array(pos_data[level["level"]][:, idx])
-                    for level in pos_info["levels"]
+        if show_segmentations:
+            array_names = list(arrays)
+            level_names = {
+                level
+                for name in array_names
+                for level in list_pyramid_levels(array_names, name)[1:]
+            }
+            for array_name in array_names:
+                if "Segmentation" not in array_name or (
+                    array_name in level_names
+                ):
+                    continue
+
+                # Label pyramids are downsampled without mixing IDs, so they
+                # can be shown as multiscale labels
+                label_levels = [
+                    arrays[name][:, 0]
+                    for name in list_pyramid_levels(array_names, array_name)
                 ]
-                colormap = default_colormaps[idx % len(default_colormaps)]
-
-                viewer.add_image(
-                    multiscale_image,
-                    name=f"{well_id}_{pos_id}_channel_{channel}",
-                    channel_axis=None,
-                    colormap=colormap,
-                    axis_labels=axis_labels,
-                    multiscale=True,
+                multiscale = len(label_levels) > 1
+                viewer.add_labels(
+                    label_levels if multiscale else label_levels[0],
+                    name=f"{well_id}_{pos_id}_segmentation_{array_name}",
+                    multiscale=multiscale,
                 )
 
-        else:
-            image_array = da.from_array(pos_data["0"])
-            axis_labels = _safe_axis_labels(
-                image_array.shape, pos_info["axes"]
-            )
-            axis_labels.pop(1)  # Remove channel axis
-
-            for idx, channel in enumerate(pos_info["channels"]):
-                colormap = default_colormaps[idx % len(default_colormaps)]
-                viewer.add_image(
-                    image_array[:, idx],
-                    name=f"{well_id}_{pos_id}_channel_{channel}",
-                    channel_axis=None,
-                    colormap=colormap,
-                    axis_labels=axis_labels,
-                )
+        _prefetch_neighbours()
 
+    def _projection_arrays(pos: str, method: str) -> list:
+        """Projection arrays shown by a 2D view, empty when not built."""
+        position = dataset[pos]
+        names = [f"{PROJECTION_GROUP}/{method}"]
+        if names[0] not in position:
+            return []
         if show_segmentations:
-            for array_name, _ in cast(Position, pos_data).images():
-                if "Segmentation" in array_name:
-                    viewer.add_labels(
-                        pos_data[array_name][:, 0],
-                        name=f"{well_id}_{pos_id}_segmentation_{array_name}",
-                    )
+            names += [
+                name
+                for label_name, _ in position.arrays()
+                if "Segmentation" in label_name
+                for name in projection_names(label_name)
+                if name in position
+            ]
+        return [position[name] for name in names]
+
+    def _show_projections(pos, well_id, pos_id, pos_info, method):
+        """Adds the cached (T, Y, X) projections of a position."""
+        image, *outlines = _projection_arrays(pos, method)
+        # The projections are small, whole planes are read at once
+        image = da.from_zarr(image)
+        axis_labels = _safe_axis_labels(
+            pos_info["levels"][0]["shape"], pos_info["axes"]
+        )
+        axis_labels = [axis_labels[0], *axis_labels[-2:]]
+        for idx, channel in enumerate(pos_info["channels"]):
+            viewer.add_image(
+                image[:, idx],
+                name=f"{well_id}_{pos_id}_{method}_{channel}",
+                colormap=default_colormaps[idx % len(default_colormaps)],
+                blending="additive",
+                axis_labels=axis_labels,
+            )
+        for outline in outlines:
+            label_name = outline.name.rsplit("/", 1)[-1]
+            viewer.add_labels(
+                da.from_zarr(outline)[:, 0],
+                name=f"{well_id}_{pos_id}_outlines_{label_name}",
+            )
 
+    def _prefetch_neighbours():
+        """
+        Warms the cache with the timepoints around the current one and the
+        current timepoint of the next position in the dropdown.
+        """
+        if prefetcher is None or current["pos"] is None:
+            return
+        t = viewer.dims.current_step[0] if viewer.dims.ndim else 0
+        current["t"] = t
+
+        next_pos = all_positions[
+            (all_positions.index(current["pos"]) + 1) % len(all_positions)
+        ]
+
+        def shown_arrays(pos: str) -> list:
+            if current["mode"] != "3D":
+                return _projection_arrays(pos, current["mode"])
+            return [array for _, array in dataset[pos].arrays()]
+
+        requests = [
+            (array, step)
+            for array in shown_arrays(current["pos"])
+            for step in (t + 1, t - 1)
+        ]
+        requests += [(array, t) for array in shown_arrays(next_pos)]
+        prefetcher.prefetch(requests)
+
+    def _on_step_change(event=None):
+        if viewer.dims.ndim and viewer.dims.current_step[0] != current["t"]:
+            _prefetch_neighbours()
+
+    viewer.dims.events.current_step.connect(_on_step_change)
     viewer.window.add_dock_widget(loader, area="right")
 
     napari.run()
+    if prefetcher is not None:
+        prefetcher.shutdown()
 
 
 if __name__ == "__main__":
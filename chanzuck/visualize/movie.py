@@ -0,0 +1,305 @@
+import math
+from concurrent.futures import ProcessPoolExecutor
+from importlib.util import find_spec
+from pathlib import Path
+
+import numpy as np
+from matplotlib.image import imsave
+from tqdm import tqdm
+
+from chanzuck.spatial.stats import load_infection
+from chanzuck.utils.image_pyramider import (
+    list_pyramid_levels,
+    pyramid_level_name,
+)
+from chanzuck.utils.label_storage import LABEL_NAME
+from chanzuck.utils.memory import limit_workers
+from chanzuck.utils.projections import outline_labels
+from chanzuck.utils.remote import open_plate
+from chanzuck.utils.selection import Selection
+from chanzuck.utils.work_queue import list_positions
+
+MOVIE_FORMATS = ("mp4", "gif", "png")
+# RGB of each channel, in the order of the viewer's colormaps
+CHANNEL_COLORS = (
+    (1.0, 0.0, 1.0),  # magenta
+    (0.0, 1.0, 0.0),  # green
+    (0.0, 0.0, 1.0),  # blue
+    (1.0, 1.0, 0.0),  # yellow
+    (1.0, 0.0, 0.0),  # red
+    (0.0, 1.0, 1.0),  # cyan
+    (1.0, 0.5, 0.0),  # orange
+    (0.5, 0.0, 1.0),  # purple
+)
+# Outline colors of cells without stats, uninfected and infected cells
+OUTLINE_COLORS = np.array(
+    [[160, 160, 160], [255, 255, 255], [255, 48, 48]], dtype=np.uint8
+)
+# Percentiles of the projections mapped to black and full color
+CONTRAST_PERCENTILES = (1.0, 99.8)
+
+# Plate opened once per worker process
+_worker_plate = None
+
+
+def movie_level(array_names, level: int | None = None) -> str:
+    """
+    Image array a movie is rendered from: pyramid ``level``, or the
+    coarsest level of the position when None.
+    """
+    levels = list_pyramid_levels(array_names, "0")
+    if level is None:
+        return levels[-1]
+    if level >= len(levels):
+        raise ValueError(
+            f"Level {level} does not exist, the position has {len(levels)}."
+        )
+    return levels[level]
+
+
+def contrast_limits(projections: np.ndarray) -> np.ndarray:
+    """
+    Per channel (low, high) intensities of (T, C, Y, X) projections, shared
+    by every frame so brightness does not flicker over time.
+    """
+    channels = np.moveaxis(projections, 1, 0).reshape(projections.shape[1], -1)
+    limits = np.percentile(channels, CONTRAST_PERCENTILES, axis=1).T
+    limits[:, 1] = np.maximum(limits[:, 1], limits[:, 0] + 1e-6)
+    return limits.astype(np.float32)
+
+
+def compose_frame(
+    projection: np.ndarray,
+    limits: np.ndarray,
+    colors=CHANNEL_COLORS,
+    outlines: np.ndarray | None = None,
+    infected=(),
+    uninfected=(),
+) -> np.ndarray:
+    """
+    Blends (C, Y, X) projections additively in the channel colors and
+    draws label outlines on top, colored by infection state.
+
+    Args:
+        projection (np.ndarray): (C, Y, X) projections.
+        limits (np.ndarray): (C, 2) contrast limits, see
+            ``contrast_limits``.
+        colors: RGB in [0, 1] of each channel.
+        outlines (np.ndarray | None): (Y, X) outlines from
+            ``outline_labels``.
+        infected: Labels drawn as infected.
+        uninfected: Labels drawn as uninfected, other labels in gray.
+
+    Returns:
+        np.ndarray: (Y, X, 3) uint8 RGB frame.
+    """
+    low, high = limits[:, 0, None, None], limits[:, 1, None, None]
+    scaled = np.clip((projection - low) / (high - low), 0, 1)
+    rgb = np.tensordot(
+        scaled,
+        np.asarray(colors[: len(scaled)], dtype=np.float32),
+        axes=(0, 0),
+    )
+    frame = (np.clip(rgb, 0, 1) * 255).astype(np.uint8)
+
+    if outlines is not None:
+        states = np.zeros(int(outlines.max(initial=0)) + 1, dtype=np.intp)
+        for state, labels in ((1, uninfected), (2, infected)):
+            labels = np.asarray(labels, dtype=np.intp)
+            states[labels[labels < len(states)]] = state
+        edge = outlines > 0
+        frame[edge] = OUTLINE_COLORS[states[outlines[edge]]]
+    return frame
+
+
+def can_encode(fmt: str) -> bool:
+    """Whether ``fmt`` can be written here, mp4 needs imageio-ffmpeg."""
+    if fmt == "png":
+        return True
+    if find_spec("imageio") is None:
+        return False
+    return fmt == "gif" or find_spec("imageio_ffmpeg") is not None
+
+
+def render_movie(
+    dataset_path: str | Path,
+    out_dir: str | Path,
+    fmt: str = "mp4",
+    fps: float = 10,
+    level: int | None = None,
+    channels: list[int] | None = None,
+    stats_dir: str | Path | None = None,
+    outlines: bool = True,
+    selection: Selection | None = None,
+    max_workers: int = 4,
+) -> list[Path]:
+    """
+    Renders a time-lapse movie of every selected position without a
+    display: per channel max Z projections in the viewer's colors, with
+    the nuclei outlines colored by infection state.
+
+    Frames are rendered from a low pyramid level in worker processes and
+    encoded in order by the parent. PNG sequences are written by the
+    workers directly. mp4 needs ``imageio`` with ``imageio-ffmpeg`` and
+    gif ``imageio``, without them the frames are written as PNGs.
+
+    Args:
+        dataset_path (str | Path): Path or fsspec URL of the plate.
+        out_dir (str | Path): Directory receiving ``<well>_<position>.mp4``
+            (or ``.gif``, or a directory of PNGs) per position.
+        fmt (str): "mp4", "gif" or "png".
+        fps (float): Frames per second.
+        level (int | None): Pyramid level, the coarsest one when None.
+            Outlines need labels at the same level (``chanzuck pyramid``).
+        channels (list[int] | None): Channels to show, all when None.
+        stats_dir (str | Path | None): Stats from ``generate-stats``, used
+            to color infected cells. Without it outlines are gray.
+        outlines (bool): Draw the nuclei outlines.
+        selection (Selection | None): Wells, positions and timepoints to
+            render, Z ranges are ignored.
+        max_workers (int): Rendering processes, fewer when frames would
+            not fit in the memory budget.
+
+    Returns:
+        list[Path]: Written movies or PNG directories.
+    """
+    if fmt not in MOVIE_FORMATS:
+        raise ValueError(f"Unknown format '{fmt}', expected {MOVIE_FORMATS}.")
+    if not can_encode(fmt):
+        print(f"⚠️ Cannot encode {fmt} without imageio[ffmpeg], writing PNGs.")
+        fmt = "png"
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    selection = selection or Selection()
+
+    # (stats name, t) -> (infected, uninfected) labels
+    infection: dict[tuple[str, int], tuple[list[int], list[int]]] = {}
+    if stats_dir is not None:
+        for (name, t, label), state in load_infection(stats_dir).items():
+            frame = infection.setdefault((name, int(t)), ([], []))
+            frame[0 if state else 1].append(int(label))
+
+    plate = open_plate(dataset_path)
+    jobs = []
+    for well_id, pos_id in list_positions(dataset_path, selection):
+        position = plate[f"{well_id}/{pos_id}"]
+        array_names = list(position.array_keys())
+        image_name = movie_level(array_names, level)
+        image = position[image_name]
+        shown = channels or list(range(image.shape[1]))
+        timepoints = selection.timepoints(image.shape[0])
+
+        label_name = None
+        # Plates that were never segmented are rendered without outlines
+        if outlines and LABEL_NAME in array_names:
+            image_level = list_pyramid_levels(array_names, "0").index(
+                image_name
+            )
+            label_name = pyramid_level_name(LABEL_NAME, image_level)
+            if label_name not in array_names:
+                print(
+                    f"⚠️ {well_id}/{pos_id} has no {label_name}, rendering "
+                    "without outlines. Build label levels with "
+                    "'chanzuck pyramid'."
+                )
+                label_name = None
+
+        # A few evenly spaced frames set the contrast of the whole movie
+        samples = timepoints[:: max(1, math.ceil(len(timepoints) / 5))]
+        limits = contrast_limits(
+            np.stack(
+                [
+                    image.get_orthogonal_selection((t, shown)).max(axis=1)
+                    for t in samples
+                ]
+            )
+        )
+        name = f"{well_id.replace('/', '_')}_{pos_id}"
+        stats_name = f"{well_id}_{pos_id}"
+        jobs.append(
+            (
+                name,
+                [
+                    (
+                        f"{well_id}/{pos_id}/{image_name}",
+                        label_name and f"{well_id}/{pos_id}/{label_name}",
+                        t,
+                        shown,
+                        limits,
+                        *infection.get((stats_name, t), ([], [])),
+                        (
+                            out_dir / name / f"frame_{t:05d}.png"
+                            if fmt == "png"
+                            else None
+                        ),
+                    )
+                    for t in timepoints
+                ],
+                math.prod(image.shape[1:]) * image.dtype.itemsize,
+            )
+        )
+    if not jobs:
+        raise ValueError(f"The selection matches nothing in {dataset_path}.")
+
+    # A frame, its float copies while blending and the labels
+    frame_bytes = 4 * max(size for *_, size in jobs)
+    written = []
+    with ProcessPoolExecutor(
+        max_workers=limit_workers(frame_bytes, max_workers),
+        initializer=_open_worker_plate,
+        initargs=(str(dataset_path),),
+    ) as executor:
+        for name, tasks, _ in jobs:
+            if fmt == "png":
+                (out_dir / name).mkdir(exist_ok=True)
+            frames = executor.map(_render_frame, tasks)
+            if fmt == "png":
+                for _ in tqdm(frames, total=len(tasks), desc=f"🎞️ {name}"):
+                    pass
+                written.append(out_dir / name)
+                continue
+
+            path = out_dir / f"{name}.{fmt}"
+            with _open_writer(path, fmt, fps) as writer:
+                for frame in tqdm(frames, total=len(tasks), desc=f"🎞️ {name}"):
+                    writer.append_data(frame)
+            written.append(path)
+
+    print(f"🎬 Wrote {len(written)} movies to {out_dir}")
+    return written
+
+
+def _open_worker_plate(dataset_path: str):
+    global _worker_plate
+    _worker_plate = open_plate(dataset_path)
+
+
+def _render_frame(task) -> np.ndarray | None:
+    # Runs in a worker process, reads and composes one frame
+    image_key, label_key, t, shown, limits, infected, uninfected, path = task
+    image = _worker_plate[image_key]
+    projection = image.get_orthogonal_selection((t, shown)).max(axis=1)
+    outlines = None
+    if label_key is not None:
+        outlines = outline_labels(_worker_plate[label_key][t, 0].max(axis=0))
+
+    colors = [CHANNEL_COLORS[c % len(CHANNEL_COLORS)] for c in shown]
+    frame = compose_frame(
+        projection, limits, colors, outlines, infected, uninfected
+    )
+    if path is None:
+        return frame
+    imsave(path, frame)
+    return None
+
+
+def _open_writer(path: Path, fmt: str, fps: float):
+    import imageio.v2 as imageio
+
+    if fmt == "gif":
+        # The pillow plugin takes the frame duration in milliseconds
+        return imageio.get_writer(path, duration=1000 / fps, loop=0)
+    # yuv420p needs even frame sizes, imageio pads them
+    return imageio.get_writer(
+        path, format="FFMPEG", fps=fps, macro_block_size=2
+    )
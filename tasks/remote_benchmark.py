@@ -0,0 +1,125 @@
+import sys
+import tempfile
+import time
+from pathlib import Path
+from time import perf_counter
+
+import fsspec
+import numpy as np
+from fsspec.implementations.local import LocalFileSystem
+from iohub import open_ome_zarr
+
+from chanzuck.spatial.stats import extract_cell_stats
+from chanzuck.utils.chunk_cache import open_cached_plate
+from chanzuck.utils.dataloader import CellposeZarrLoader
+from chanzuck.utils.label_storage import (
+    LABEL_NAME,
+    create_label_array,
+    label_compressor,
+)
+from chanzuck.utils.remote import set_fetch_workers
+
+
+class SlowFileSystem(LocalFileSystem):
+    """
+    Local files served with a fixed delay per request, standing in for an
+    object store or a network filesystem (``slow:///path/to/plate.zarr``).
+    """
+
+    protocol = "slow"
+    latency = 0.02
+
+    @classmethod
+    def _strip_protocol(cls, path):
+        return super()._strip_protocol(str(path).removeprefix("slow://"))
+
+    def cat_file(self, path, start=None, end=None, **kwargs):
+        time.sleep(self.latency)
+        return super().cat_file(path, start=start, end=end, **kwargs)
+
+    def info(self, path, **kwargs):
+        time.sleep(self.latency)
+        return super().info(path, **kwargs)
+
+    def ls(self, path, detail=False, **kwargs):
+        time.sleep(self.latency)
+        return super().ls(path, detail=detail, **kwargs)
+
+
+def make_plate(root: Path) -> Path:
+    """Two positions of (4, 3, 8, 256, 256), 16 chunks per channel frame."""
+    path = root / "plate.zarr"
+    rng = np.random.default_rng(0)
+    with open_ome_zarr(
+        path,
+        layout="hcs",
+        mode="w",
+        channel_names=["Phase3D", "nuclei_DAPI", "virus_mCherry"],
+    ) as dataset:
+        for pos_id in ("0", "1"):
+            pos = dataset.create_position("A", "1", pos_id)
+            pos.create_image(
+                "0",
+                rng.random((4, 3, 8, 256, 256), dtype=np.float32),
+                chunks=(1, 1, 2, 128, 128),
+            )
+            labels = np.zeros((4, 1, 8, 256, 256), dtype=np.uint16)
+            for label, y in enumerate(range(16, 240, 32), start=1):
+                labels[:, 0, 2:6, y : y + 16, 16:240] = label
+            create_label_array(
+                pos,
+                LABEL_NAME,
+                shape=labels.shape,
+                chunks=(1, 1, 2, 128, 128),
+                dtype="uint16",
+                compressor=label_compressor(),
+            )
+            pos.zgroup[LABEL_NAME][:] = labels
+    return path
+
+
+def read_with_loader(url: str):
+    loader = CellposeZarrLoader(url, channel_indices=[0, 1, 2])
+    for i in range(len(loader)):
+        loader[i]
+
+
+def read_stats(url: str):
+    extract_cell_stats(url, seg_name=LABEL_NAME)
+
+
+def view_timepoints(url: str):
+    # What the viewer reads when stepping through time on one position
+    root, _ = open_cached_plate(url)
+    image = root["A/1/0/0"]
+    for t in range(image.shape[0]):
+        image[t]
+
+
+if __name__ == "__main__":
+    latency_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 20
+    SlowFileSystem.latency = latency_ms / 1000
+    fsspec.register_implementation("slow", SlowFileSystem, clobber=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"slow://{make_plate(Path(tmp))}"
+        print(f"\n🚀 Reading {url} with {latency_ms:.0f} ms per request")
+        for name, task in (
+            ("loader", read_with_loader),
+            ("stats", read_stats),
+            ("viewer", view_timepoints),
+        ):
+            times = {}
+            for workers in (1, 4, 16):
+                set_fetch_workers(workers)
+                start = perf_counter()
+                task(url)
+                times[workers] = perf_counter() - start
+            print(
+                f"  ✅ {name:<7}"
+                + "".join(
+                    f"  |  {workers:>2} fetch workers: {elapsed:6.2f} s"
+                    for workers, elapsed in times.items()
+                )
+                + f"  |  Speedup: {times[1] / times[16]:4.1f}x"
+            )
@@ -0,0 +1,69 @@
+import sys
+from time import perf_counter
+
+import dask.array as da
+import numpy as np
+import zarr
+
+from chanzuck.utils.chunk_cache import open_cached_plate, open_position_arrays
+
+
+def legacy_layers(position: zarr.Group) -> list[da.Array]:
+    # What the viewer used to build for multiscale positions
+    array = position["0"]
+    return [da.from_array(array[:, c]) for c in range(array.shape[1])]
+
+
+def aligned_layers(position: zarr.Group) -> list[da.Array]:
+    image = open_position_arrays(position)["0"]
+    return [image[:, c] for c in range(image.shape[1])]
+
+
+def run_benchmark(
+    dataset_path: str, position_path: str, build_layers, cached: bool
+):
+    """
+    Times what napari does when a position is loaded: build one layer per
+    channel, draw the middle Z plane of the first timepoint, then step
+    through every Z plane of the next timepoint.
+    """
+    root = (
+        open_cached_plate(dataset_path)[0]
+        if cached
+        else zarr.open_group(dataset_path, mode="r")
+    )
+
+    start = perf_counter()
+    layers = build_layers(root[position_path])
+    n_z = layers[0].shape[1]
+    for layer in layers:
+        layer[0, n_z // 2].compute()
+    first_frame = perf_counter() - start
+
+    slice_times = []
+    t = min(1, layers[0].shape[0] - 1)
+    for z in range(n_z):
+        start = perf_counter()
+        for layer in layers:
+            layer[t, z].compute()
+        slice_times.append(perf_counter() - start)
+
+    print(
+        f"  ✅ {build_layers.__name__:<15} cache={'✅' if cached else '❌'}"
+        f"  |  First frame: {first_frame * 1000:7.1f} ms"
+        f"  |  Slice p50: {np.median(slice_times) * 1000:6.1f} ms"
+        f"  |  Slice max: {max(slice_times) * 1000:6.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    dataset_path = (
+        sys.argv[1] if len(sys.argv) > 1 else "data/20241107_infection.zarr"
+    )
+    position_path = sys.argv[2] if len(sys.argv) > 2 else "C/2/000001"
+    print(
+        f"\n🚀 Benchmarking viewer slicing on {dataset_path}/{position_path}"
+    )
+    for build_layers in (legacy_layers, aligned_layers):
+        for cached in (False, True):
+            run_benchmark(dataset_path, position_path, build_layers, cached)
@@ -1,4 +1,13 @@
+import numpy as np
 import pytest
+from iohub import open_ome_zarr
+from iohub.ngff.models import TransformationMeta
+
+from chanzuck.utils.label_storage import (
+    LABEL_NAME,
+    create_label_array,
+    label_compressor,
+)
 
 
 @pytest.fixture
@@ -28,3 +37,72 @@ def mock_plate_dataset(tmp_path):
     plate_path.mkdir()
     # Simulate .zattrs or fake open_ome_zarr patch if necessary
     return plate_path
+
+
+@pytest.fixture
+def small_plate(tmp_path):
+    """A real two-position OME-Zarr plate with random float32 data."""
+    plate_path = tmp_path / "small_plate.zarr"
+    rng = np.random.default_rng(0)
+    with open_ome_zarr(
+        plate_path,
+        layout="hcs",
+        mode="w",
+        channel_names=["Phase3D", "nuclei_DAPI", "virus_mCherry"],
+    ) as dataset:
+        for pos_name in ("000000", "000001"):
+            pos = dataset.create_position("A", "1", pos_name)
+            pos.create_image(
+                "0",
+                rng.random((2, 3, 5, 32, 48), dtype=np.float32),
+                chunks=(1, 1, 5, 32, 48),
+                transform=[
+                    TransformationMeta(
+                        type="scale", scale=[1.0, 1.0, 2.0, 0.5, 0.5]
+                    )
+                ],
+            )
+    return plate_path
+
+
+@pytest.fixture
+def tracked_plate(small_plate):
+    """Two cells over two timepoints, labels chunked in 16x16 tiles."""
+    labels = np.zeros((2, 1, 5, 32, 48), dtype=np.uint16)
+    labels[0, 0, 1:3, 2:6, 3:8] = 1
+    labels[1, 0, 2:4, 4:9, 5:10] = 1
+    labels[:, 0, 0:5, 20:30, 30:40] = 2
+    with open_ome_zarr(small_plate, mode="a") as dataset:
+        pos = dataset["A/1/000000"]
+        create_label_array(
+            pos,
+            LABEL_NAME,
+            shape=labels.shape,
+            chunks=(1, 1, 5, 16, 16),
+            dtype="uint16",
+            compressor=label_compressor(),
+        )
+        pos.zgroup[LABEL_NAME][:] = labels
+    return small_plate
+
+
+@pytest.fixture
+def gap_plate(small_plate):
+    """Cell A missed at t=2 and both cells relabeled at t=3."""
+    labels = np.zeros((4, 1, 5, 32, 48), dtype=np.uint16)
+    for t in (0, 1, 3):
+        labels[t, 0, 1:3, 2:6, 3:8] = 1 if t < 3 else 2
+    labels[:3, 0, :, 20:30, 30:40] = 2
+    labels[3, 0, :, 20:30, 30:40] = 1
+    with open_ome_zarr(small_plate, mode="a") as dataset:
+        pos = dataset["A/1/000000"]
+        create_label_array(
+            pos,
+            LABEL_NAME,
+            shape=labels.shape,
+            chunks=(1, 1, 5, 16, 16),
+            dtype="uint16",
+            compressor=label_compressor(),
+        )
+        pos.zgroup[LABEL_NAME][:] = labels
+    return small_plate
@@ -0,0 +1,68 @@
+import numpy as np
+import zarr
+
+from chanzuck.utils.cell_index import (
+    INDEX_GROUP,
+    crop_track,
+    frame_bounding_boxes,
+    load_cell_index,
+)
+from chanzuck.utils.chunk_cache import open_cached_plate
+from chanzuck.utils.label_storage import LABEL_NAME
+
+
+def test_frame_bounding_boxes():
+    frame = np.zeros((1, 4, 8, 8), dtype=np.uint16)
+    frame[0, 1:3, 2:5, 6:8] = 3
+
+    rows = frame_bounding_boxes(frame, t=7)
+
+    np.testing.assert_array_equal(rows, [[3, 7, 1, 2, 6, 3, 5, 8]])
+
+
+def test_index_is_stored_and_reused(tracked_plate):
+    position = zarr.open_group(str(tracked_plate / "A/1/000000"))
+
+    index = load_cell_index(position)
+
+    assert f"{INDEX_GROUP}/{LABEL_NAME}" in position
+    assert index["label"].tolist() == [1, 1, 2, 2]
+    assert index["t"].tolist() == [0, 1, 0, 1]
+    assert index.iloc[1][["z0", "y0", "x0", "z1", "y1", "x1"]].tolist() == [
+        2,
+        4,
+        5,
+        4,
+        9,
+        10,
+    ]
+
+    # Rewriting the labels makes the stored index stale, only the
+    # rewritten timepoint is measured again
+    stored = position[f"{INDEX_GROUP}/{LABEL_NAME}"].attrs["signature"]
+    position[LABEL_NAME][1] = 0
+    assert load_cell_index(position)["t"].tolist() == [0, 0]
+    updated = position[f"{INDEX_GROUP}/{LABEL_NAME}"].attrs["signature"]
+    assert updated["0"] == stored["0"] and updated["1"] != stored["1"]
+
+
+def test_crop_track_reads_only_intersecting_chunks(tracked_plate):
+    load_cell_index(zarr.open_group(str(tracked_plate / "A/1/000000")))
+    root, cache = open_cached_plate(tracked_plate)
+    position = root["A/1/000000"]
+
+    crops = crop_track(position, label=1, channels=[2], padding=(0, 1, 1))
+
+    assert [crop["t"] for crop in crops] == [0, 1]
+    assert crops[1]["origin"] == (2, 3, 4)
+    assert crops[1]["image"].shape == (1, 2, 7, 7)
+    assert crops[1]["mask"].sum() == 2 * 5 * 5
+    np.testing.assert_array_equal(
+        crops[1]["image"][0],
+        zarr.open_group(str(tracked_plate))["A/1/000000/0"][
+            1, 2, 2:4, 3:10, 4:11
+        ],
+    )
+    # The index chunk, then one full-frame image chunk and one 16x16 label
+    # tile per timepoint
+    assert cache.misses == 5
@@ -0,0 +1,77 @@
+import concurrent.futures
+
+import numpy as np
+import zarr
+
+from chanzuck.utils.chunk_cache import (
+    ChunkPrefetcher,
+    open_cached_plate,
+    open_position_arrays,
+)
+
+
+def test_cached_reads_match_store(small_plate):
+    """Decoded chunks are served from memory on repeat reads."""
+    root, cache = open_cached_plate(small_plate)
+    expected = zarr.open_group(str(small_plate), mode="r")["A/1/000000/0"][:]
+
+    first = root["A/1/000000"]["0"][:]
+    misses = cache.misses
+    second = root["A/1/000000"]["0"][:]
+
+    np.testing.assert_array_equal(first, expected)
+    np.testing.assert_array_equal(second, expected)
+    assert cache.misses == misses
+    assert cache.hits == misses
+    # Array attributes are passed through rather than decoded as chunks
+    assert dict(root["A/1/000000/0"].attrs) == {}
+
+
+def test_cache_respects_memory_budget(small_plate):
+    """Least recently used chunks are evicted to stay within the budget."""
+    root, cache = open_cached_plate(small_plate)
+    chunk_bytes = 5 * 32 * 48 * 4
+    cache.max_size = 2 * chunk_bytes
+
+    for pos in ("A/1/000000", "A/1/000001"):
+        root[pos]["0"][:]
+
+    assert cache.current_size == 2 * chunk_bytes
+    # The last chunk read is still cached
+    hits = cache.hits
+    root["A/1/000001"]["0"][1, 2]
+    assert cache.hits == hits + 1
+
+
+def test_prefetch_warms_requested_timepoints(small_plate):
+    """Prefetched timepoints are read without touching the disk again."""
+    root, cache = open_cached_plate(small_plate)
+    array = root["A/1/000001"]["0"]
+    prefetcher = ChunkPrefetcher(cache)
+
+    futures = prefetcher.prefetch([(array, 1), (array, 5)])
+    concurrent.futures.wait(futures)
+    prefetcher.shutdown()
+    misses = cache.misses
+    array[1]
+
+    assert len(futures) == 3
+    assert cache.misses == misses
+
+
+def test_position_arrays_slice_storage_chunks_into_planes(small_plate):
+    """Dask chunks are single planes that never straddle storage chunks."""
+    root, cache = open_cached_plate(small_plate)
+    arrays = open_position_arrays(root["A/1/000000"])
+    image = arrays["0"]
+
+    assert image.chunksize == (1, 1, 1, 32, 48)
+    assert open_position_arrays(root["A/1/000000"], plane_chunks=False)[
+        "0"
+    ].chunksize == (1, 1, 5, 32, 48)
+
+    # Every plane of a chunk after the first is served from the cache
+    for z in range(5):
+        plane = image[1, 2, z].compute()
+    np.testing.assert_array_equal(plane, root["A/1/000000"]["0"][1, 2, 4])
+    assert cache.misses == 1
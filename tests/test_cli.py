@@ -0,0 +1,82 @@
+import json
+import subprocess
+import sys
+
+from click.testing import CliRunner
+
+from chanzuck.cli import cli
+
+HEAVY_MODULES = [
+    "cellpose",
+    "dask",
+    "iohub",
+    "magicgui",
+    "matplotlib",
+    "napari",
+    "pandas",
+    "seaborn",
+    "torch",
+    "zarr",
+]
+# Seconds allowed for importing the CLI and printing its help
+HELP_BUDGET = 0.5
+
+HELP_SCRIPT = f"""
+import json, sys, time
+start = time.perf_counter()
+from chanzuck.cli import cli
+try:
+    cli(["--help"])
+except SystemExit:
+    pass
+elapsed = time.perf_counter() - start
+heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+print(json.dumps({{"elapsed": elapsed, "heavy": heavy}}))
+"""
+
+
+def test_help_does_not_import_heavy_modules():
+    """`chanzuck --help` lists every command without importing their deps."""
+    result = subprocess.run(
+        [sys.executable, "-c", HELP_SCRIPT],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+
+    for command in ("describe", "pyramid", "segment", "view"):
+        assert command in result.stdout
+    assert report["heavy"] == []
+    assert report["elapsed"] < HELP_BUDGET
+
+
+def test_lazy_command_runs(small_plate):
+    """Lazily registered commands still resolve and run."""
+    result = CliRunner().invoke(
+        cli, ["describe", "--dataset-path", str(small_plate), "--json"]
+    )
+
+    assert result.exit_code == 0, result.output
+    assert '"A/1"' in result.output
+
+
+def test_describe_accepts_urls(tmp_path, monkeypatch):
+    """URLs reach describe untouched, missing local paths are refused."""
+    seen = []
+    monkeypatch.setattr(
+        "chanzuck.utils.describe.describe_dataset_fast",
+        lambda path, use_cache: seen.append(path) or {"wells": {}},
+    )
+
+    result = CliRunner().invoke(
+        cli, ["describe", "--dataset-path", "s3://bucket/plate.zarr", "--json"]
+    )
+    assert result.exit_code == 0, result.output
+    assert seen == ["s3://bucket/plate.zarr"]
+
+    result = CliRunner().invoke(
+        cli, ["describe", "--dataset-path", str(tmp_path / "missing.zarr")]
+    )
+    assert result.exit_code != 0
+    assert "does not exist" in result.output
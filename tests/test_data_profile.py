@@ -0,0 +1,81 @@
+import json
+
+import numpy as np
+from iohub import open_ome_zarr
+
+import chanzuck.utils.data_profile as data_profile
+import chanzuck.utils.describe as describe
+from chanzuck.utils.data_profile import PROFILE_FILE_NAME, profile_dataset
+from chanzuck.utils.describe import describe_dataset_fast, format_pretty_output
+
+
+def test_profile_matches_numpy(small_plate):
+    """Chunked statistics agree with a direct computation on the array."""
+    with open_ome_zarr(small_plate, mode="a") as dataset:
+        image = dataset["A/1/000000"]["0"]
+        image[1, 2] = 0
+        data = image.numpy()
+
+    metadata = profile_dataset(
+        small_plate, describe_dataset_fast(small_plate), use_cache=False
+    )
+    profile = metadata["Wells"]["A/1"]["000000"]["profile"]
+
+    assert profile["nbytes"] == data.nbytes
+    assert profile["nbytes_stored"] > 0
+    for c, name in enumerate(["Phase3D", "nuclei_DAPI", "virus_mCherry"]):
+        stats = profile["channels"][name]
+        values = data[:, c]
+        assert stats["min"] == values.min()
+        assert stats["max"] == values.max()
+        assert np.isclose(stats["mean"], values.mean(dtype=np.float64))
+        assert np.isclose(stats["p50"], np.median(values))
+        assert (
+            stats["nonzero_fraction"] == np.count_nonzero(values) / values.size
+        )
+        assert stats["saturated_fraction"] is None
+
+    assert profile["channels"]["virus_mCherry"]["empty_timepoints"] == [1]
+    assert profile["channels"]["Phase3D"]["empty_timepoints"] == []
+    assert "Empty timepoints : [1]" in format_pretty_output(metadata)
+
+
+def test_profile_cache_is_invalidated_by_writes(small_plate, mocker):
+    """Cached profiles are reused until the position's chunks change."""
+    zattrs = (small_plate / "A/1/000000/.zattrs").read_bytes()
+    first = profile_dataset(small_plate, describe_dataset_fast(small_plate))
+    cache = json.loads((small_plate / PROFILE_FILE_NAME).read_text())
+    assert set(cache["positions"]) == {"A/1/000000", "A/1/000001"}
+    # The plate is left alone, so the describe index stays valid
+    assert (small_plate / "A/1/000000/.zattrs").read_bytes() == zattrs
+    spy_scan = mocker.spy(describe, "_scan_plate_metadata")
+    describe_dataset_fast(small_plate)
+    assert spy_scan.call_count == 0
+
+    spy = mocker.spy(data_profile, "profile_array")
+    second = profile_dataset(small_plate, describe_dataset_fast(small_plate))
+    assert spy.call_count == 0
+    assert second == first
+
+    with open_ome_zarr(small_plate, mode="a") as dataset:
+        dataset["A/1/000001"]["0"][0, 0] = 5.0
+
+    third = profile_dataset(small_plate, describe_dataset_fast(small_plate))
+    assert spy.call_count == 1
+    assert (
+        third["Wells"]["A/1"]["000001"]["profile"]["channels"]["Phase3D"][
+            "max"
+        ]
+        == 5.0
+    )
+
+
+def test_profile_without_writable_cache(small_plate):
+    """Plates where the cache cannot be written are still profiled."""
+    # A directory in the way makes the sidecar unwritable, even as root
+    (small_plate / PROFILE_FILE_NAME).mkdir()
+
+    metadata = profile_dataset(small_plate, describe_dataset_fast(small_plate))
+
+    assert "profile" in metadata["Wells"]["A/1"]["000000"]
+    assert (small_plate / PROFILE_FILE_NAME).is_dir()
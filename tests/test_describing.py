@@ -1,10 +1,14 @@
+import json
 from pathlib import Path
 from types import SimpleNamespace
 
 import pytest
+from iohub import open_ome_zarr
 
 from chanzuck.utils.describe import (
+    INDEX_FILE_NAME,
     describe_dataset,
+    describe_dataset_fast,
     format_axes,
     format_pretty_output,
 )
@@ -41,7 +45,7 @@ class TestDescribeDataset:
 
         # Patch the actual iohub call
         mocker.patch(
-            "chanzuck.utils.describe.open_ome_zarr", return_value=mock_dataset
+            "chanzuck.utils.describe.open_dataset", return_value=mock_dataset
         )
 
         # Run the describe
@@ -91,3 +95,37 @@ class TestDescribeDataset:
         """Test format_axes fallback when given a string or N/A."""
         assert format_axes("N/A") == "N/A"
         assert format_axes("just_a_string") == "just_a_string"
+
+
+class TestDescribeDatasetFast:
+
+    def test_matches_iohub_describe(self, small_plate):
+        """The JSON-only path reports the same metadata as iohub."""
+        expected = describe_dataset(small_plate)
+        metadata = describe_dataset_fast(small_plate, use_cache=False)
+
+        assert json.dumps(metadata) == json.dumps(expected, default=list)
+
+    def test_index_is_reused_until_metadata_changes(self, small_plate):
+        """Adding an array invalidates the cached sidecar index."""
+        first = describe_dataset_fast(small_plate)
+        assert (small_plate / INDEX_FILE_NAME).exists()
+        assert describe_dataset_fast(small_plate) == first
+
+        with open_ome_zarr(small_plate, mode="a") as dataset:
+            dataset["A/1/000000"].create_zeros(
+                "1", shape=(2, 3, 5, 16, 24), dtype="float32"
+            )
+
+        updated = describe_dataset_fast(small_plate)
+        assert updated["Wells"]["A/1"]["000000"]["multiscale"]
+
+    def test_non_plate_dataset_raises(self, tmp_path):
+        non_plate_path = tmp_path / "fake.zarr"
+        non_plate_path.mkdir()
+        (non_plate_path / ".zattrs").write_text("{}")
+
+        with pytest.raises(ValueError) as excinfo:
+            describe_dataset_fast(non_plate_path)
+
+        assert "Could not parse metadata" in str(excinfo.value)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from iohub import open_ome_zarr
+
+from chanzuck.utils.data_profile import stored_size
+from chanzuck.utils.label_storage import (
+    LABEL_NAME,
+    create_label_array,
+    ensure_label_capacity,
+    label_compressor,
+)
+
+
+@pytest.fixture
+def label_position(small_plate):
+    with open_ome_zarr(small_plate, mode="a") as dataset:
+        pos = dataset["A/1/000000"]
+        create_label_array(
+            pos,
+            LABEL_NAME,
+            shape=(2, 1, 5, 32, 48),
+            chunks=(1, 1, 5, 32, 48),
+            dtype="uint16",
+            compressor=label_compressor("zstd", 5, "byte"),
+        )
+        yield pos
+
+
+def test_label_array_uses_its_own_codec(label_position):
+    labels = label_position.zgroup[LABEL_NAME]
+
+    assert labels.dtype == np.uint16
+    assert labels.compressor.cname == "zstd"
+    assert labels.compressor.clevel == 5
+    # The multiscales only list image levels
+    assert label_position.metadata.multiscales[0].get_dataset_paths() == ["0"]
+    assert label_compressor("none") is None
+
+
+def test_labels_are_promoted_when_ids_overflow(label_position):
+    frame = np.zeros((1, 5, 32, 48), dtype=np.uint16)
+    frame[0, 1:3, 4:9, 4:9] = 7
+    label_position.zgroup[LABEL_NAME][0] = frame
+
+    same = ensure_label_capacity(label_position, LABEL_NAME, max_label=65535)
+    assert same.dtype == np.uint16
+
+    promoted = ensure_label_capacity(
+        label_position, LABEL_NAME, max_label=70_000
+    )
+    promoted[1, 0, 0, 0, 0] = 70_000
+
+    assert promoted.dtype == np.uint32
+    assert promoted.compressor.cname == "zstd"
+    np.testing.assert_array_equal(promoted[0], frame)
+    assert promoted[1, 0, 0, 0, 0] == 70_000
+    assert 0 < stored_size(promoted, timepoint=0) < frame.nbytes
+
+
+def test_narrow_dtype_is_not_promoted_when_fixed(label_position):
+    with pytest.raises(ValueError, match="does not fit in uint16"):
+        ensure_label_capacity(
+            label_position, LABEL_NAME, max_label=70_000, promote=False
+        )
@@ -0,0 +1,171 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import zarr
+from click.testing import CliRunner
+from iohub import open_ome_zarr
+from scipy.ndimage import gaussian_filter
+from scipy.ndimage import label as ndi_label
+from skimage.filters import threshold_otsu
+from skimage.measure import regionprops_table
+
+from chanzuck.cli import cli
+from chanzuck.segment.chunked import (
+    centroid_table,
+    filter_small,
+    label_in_slabs,
+    segment_otsu_in_slabs,
+    streaming_otsu,
+    tracking_lut,
+)
+from chanzuck.spatial.stats import (
+    CELL_PROPERTIES,
+    extract_cell_stats,
+    frame_stats_in_slabs,
+)
+from chanzuck.utils.label_storage import LABEL_NAME
+from chanzuck.utils.memory import (
+    MEMORY_ENV,
+    limit_workers,
+    parse_memory,
+    slab_planes,
+)
+from chanzuck.utils.selection import Selection
+
+
+@pytest.fixture
+def blobs():
+    """Two frames of smooth random blobs that span many Z planes."""
+    rng = np.random.default_rng(0)
+    raw = gaussian_filter(
+        rng.random((2, 1, 12, 40, 40)), sigma=(0, 0, 2, 2, 2)
+    )
+    array = zarr.array(raw.astype(np.float32), chunks=(1, 1, 3, 40, 40))
+    return raw.astype(np.float32), array
+
+
+class TestBudget:
+
+    @pytest.mark.parametrize(
+        "text, expected",
+        [("512MB", 512 * 1024**2), ("8g", 8 * 1024**3), ("1.5GiB", 3 << 29)],
+    )
+    def test_parse_memory(self, text, expected):
+        assert parse_memory(text) == expected
+
+    @pytest.mark.parametrize("text", ["lots", "-1G", "8Q"])
+    def test_parse_memory_rejects_bad_sizes(self, text):
+        with pytest.raises(ValueError):
+            parse_memory(text)
+
+    def test_limits(self, monkeypatch):
+        monkeypatch.delenv(MEMORY_ENV, raising=False)
+        assert limit_workers(10**9, 8) == 8
+        assert limit_workers(100, 8, budget=350) == 3
+        assert limit_workers(1000, 8, budget=10) == 1
+        assert slab_planes(100, 12, budget=450) == 4
+        assert slab_planes(100, 12, budget=10**6) == 12
+
+    def test_cli_option_sets_budget(self, monkeypatch):
+        monkeypatch.setenv(MEMORY_ENV, "1G")
+        result = CliRunner().invoke(
+            cli, ["--max-memory", "2GB", "run", "--help"]
+        )
+        assert result.exit_code == 0
+        assert os.environ[MEMORY_ENV] == "2GB"
+
+        result = CliRunner().invoke(
+            cli, ["--max-memory", "lots", "run", "--help"]
+        )
+        assert result.exit_code != 0
+
+
+def test_slab_labels_match_whole_frame(blobs):
+    raw, array = blobs
+    z_slice = slice(0, raw.shape[2])
+    threshold = streaming_otsu(array, 0, 0, z_slice, planes=3)
+    assert threshold == pytest.approx(threshold_otsu(raw[0, 0]), rel=1e-4)
+
+    scratch = zarr.zeros(raw.shape[2:], chunks=(3, 40, 40), dtype=np.uint32)
+    lut = label_in_slabs(array, 0, 0, z_slice, 3, threshold, scratch)
+    expected, n = ndi_label(raw[0, 0] > threshold)
+
+    assert n > 1
+    np.testing.assert_array_equal(lut[scratch[:]], expected)
+
+
+def test_slab_tracking_matches_whole_frame(blobs):
+    raw, array = blobs
+    z_slice = slice(0, raw.shape[2])
+    scales = (2.0, 1.0, 1.0)
+    scratch = zarr.zeros(raw.shape[2:], chunks=(3, 40, 40), dtype=np.uint32)
+
+    first, table = segment_otsu_in_slabs(array, 0, 0, z_slice, 3, scratch)
+    first_labels = first[scratch[:]]
+    lut, _ = segment_otsu_in_slabs(
+        array, 1, 0, z_slice, 3, scratch, table, scales, max_dist_um=50
+    )
+
+    # Whole frame reference
+    masks, _ = ndi_label(raw[1, 0] > threshold_otsu(raw[1, 0]))
+    expected_lut = tracking_lut(
+        *filter_small(*centroid_table(first_labels, None, 12)),
+        *filter_small(*centroid_table(masks, None, 12)),
+        scales,
+        max_label=int(masks.max()),
+    )
+    np.testing.assert_array_equal(lut[scratch[:]], expected_lut[masks])
+
+
+def test_tracking_lut_keeps_ids_and_numbers_new_labels():
+    lut = tracking_lut(
+        np.array([[0, 0, 0], [0, 10, 10]]),
+        np.array([4, 7]),
+        np.array([[0, 1, 1], [0, 11, 10], [0, 90, 90]]),
+        np.array([1, 2, 3]),
+        (1, 1, 1),
+        max_dist_um=5,
+    )
+    np.testing.assert_array_equal(lut, [0, 4, 7, 8])
+    assert (
+        tracking_lut(np.zeros((0, 3)), [], [[0, 0, 0]], [1], (1, 1, 1)) is None
+    )
+
+
+def test_slab_stats_match_regionprops(tracked_plate):
+    with open_ome_zarr(tracked_plate, mode="r") as dataset:
+        pos = dataset["A/1/000000"]
+        seg, img = pos[LABEL_NAME], pos["0"]
+        for t in range(2):
+            expected = pd.DataFrame(
+                regionprops_table(
+                    seg[t, 0],
+                    intensity_image=np.moveaxis(img[t], 0, -1),
+                    properties=CELL_PROPERTIES,
+                )
+            )
+            result = frame_stats_in_slabs(seg, img, t, slice(0, 5), planes=2)
+            pd.testing.assert_frame_equal(
+                result, expected, check_dtype=False, rtol=1e-5
+            )
+
+
+def test_stats_under_a_budget_are_unchanged(tracked_plate, monkeypatch):
+    # Only the first position is segmented
+    selection_kwargs = {
+        "seg_name": LABEL_NAME,
+        "selection": Selection(positions=("000000",)),
+    }
+    whole = extract_cell_stats(tracked_plate, **selection_kwargs)
+    # A few kB forces one Z plane at a time
+    monkeypatch.setenv(MEMORY_ENV, "8KB")
+    slabs = extract_cell_stats(tracked_plate, **selection_kwargs)
+
+    pd.testing.assert_frame_equal(
+        slabs["A/1"]["000000"],
+        whole["A/1"]["000000"],
+        check_dtype=False,
+        rtol=1e-5,
+    )
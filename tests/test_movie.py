@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from matplotlib.image import imread
+
+from chanzuck.cli import cli
+from chanzuck.utils.image_pyramider import (
+    create_downsample_pyramid_for_dataset,
+)
+from chanzuck.utils.label_storage import LABEL_NAME
+from chanzuck.visualize.movie import (
+    OUTLINE_COLORS,
+    can_encode,
+    compose_frame,
+    contrast_limits,
+    movie_level,
+)
+
+
+@pytest.fixture
+def movie_plate(tracked_plate, tmp_path):
+    """Tracked plate with a label pyramid and stats marking cell 2 infected."""
+    create_downsample_pyramid_for_dataset(
+        tracked_plate, levels=2, label_names=(LABEL_NAME,)
+    )
+    stats_dir = tmp_path / "stats"
+    (stats_dir / "A" / "1").mkdir(parents=True)
+    pd.DataFrame(
+        {
+            "time": [0, 0, 1, 1],
+            "label": [1, 2, 1, 2],
+            "mean_intensity-virus_mCherry": [0.1, 0.9, 0.1, 0.9],
+        }
+    ).to_csv(stats_dir / "A" / "1" / "000000_stats.csv", index=False)
+    return tracked_plate, stats_dir
+
+
+def test_compose_frame_colors_channels_and_outlines():
+    projection = np.zeros((2, 4, 4), dtype=np.float32)
+    projection[0, 0, 0] = 1  # magenta
+    projection[1, 0, 1] = 1  # green
+    outlines = np.zeros((4, 4), dtype=np.uint16)
+    outlines[3, 1:4] = [1, 2, 5]
+    limits = np.array([[0, 1], [0, 1]], dtype=np.float32)
+
+    frame = compose_frame(
+        projection,
+        limits,
+        outlines=outlines,
+        infected=[2],
+        uninfected=[1, 9],
+    )
+
+    assert frame.dtype == np.uint8 and frame.shape == (4, 4, 3)
+    assert frame[0, 0].tolist() == [255, 0, 255]
+    assert frame[0, 1].tolist() == [0, 255, 0]
+    assert frame[1, 1].tolist() == [0, 0, 0]
+    np.testing.assert_array_equal(frame[3, 1:4], OUTLINE_COLORS[[1, 2, 0]])
+
+
+def test_contrast_limits_and_levels():
+    projections = np.stack([np.arange(100.0), np.full(100, 3.0)])[None]
+    limits = contrast_limits(projections.reshape(1, 2, 10, 10))
+    assert limits[0, 0] == pytest.approx(0.99)
+    assert limits[1, 1] > limits[1, 0] == 3
+
+    names = ["0", "1", "2", LABEL_NAME]
+    assert movie_level(names) == "2"
+    assert movie_level(names, 1) == "1"
+    with pytest.raises(ValueError, match="Level 3"):
+        movie_level(names, 3)
+
+
+def test_render_movie_writes_png_frames(movie_plate, tmp_path):
+    plate, stats_dir = movie_plate
+    out_dir = tmp_path / "movies"
+
+    result = CliRunner().invoke(
+        cli,
+        [
+            "render-movie",
+            "--dataset-path",
+            str(plate),
+            "--out-dir",
+            str(out_dir),
+            "--format",
+            "png",
+            "--stats-dir",
+            str(stats_dir),
+            "--positions",
+            "000000",
+            "--workers",
+            "2",
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    frames = sorted((out_dir / "A_1_000000").glob("*.png"))
+    assert [f.name for f in frames] == ["frame_00000.png", "frame_00001.png"]
+    frame = (imread(frames[0])[..., :3] * 255).round().astype(np.uint8)
+    # Rendered from the coarsest level, with the infected cell in red
+    assert frame.shape == (16, 24, 3)
+    colors = {tuple(c) for c in frame.reshape(-1, 3)}
+    assert tuple(OUTLINE_COLORS[2]) in colors
+    assert tuple(OUTLINE_COLORS[1]) in colors
+
+
+@pytest.mark.skipif(not can_encode("gif"), reason="needs imageio")
+def test_render_movie_encodes_gif(movie_plate, tmp_path):
+    import imageio.v2 as imageio
+
+    from chanzuck.visualize.movie import render_movie
+
+    plate, _ = movie_plate
+    paths = render_movie(
+        plate,
+        tmp_path / "movies",
+        fmt="gif",
+        level=0,
+        channels=[1],
+        outlines=False,
+        max_workers=1,
+    )
+
+    assert [p.name for p in paths] == ["A_1_000000.gif", "A_1_000001.gif"]
+    frames = imageio.mimread(paths[0])
+    assert len(frames) == 2
+    assert frames[0].shape[:2] == (32, 48)
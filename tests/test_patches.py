@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import zarr
+
+from chanzuck.spatial.patches import export_patches, load_patches
+
+
+def test_export_patches(tracked_plate, tmp_path):
+    """Every cell gets a centred, zero-padded patch and its own mask."""
+    stats_dir = tmp_path / "stats"
+    (stats_dir / "A" / "1").mkdir(parents=True)
+    pd.DataFrame(
+        {
+            "label": [1, 2, 1, 2],
+            "time": [0, 0, 1, 1],
+            "mean_intensity-virus_mCherry": [1.0, 9.0, 1.0, 9.0],
+        }
+    ).to_csv(stats_dir / "A" / "1" / "000000_stats.csv", index=False)
+
+    export_patches(
+        tracked_plate,
+        tmp_path / "out",
+        patch_size=(2, 12, 12),
+        stats_dir=stats_dir,
+        max_workers=2,
+    )
+    patches, masks, metadata = load_patches(tmp_path / "out")
+
+    assert isinstance(patches, np.memmap)
+    # The second position is not segmented and is skipped
+    assert patches.shape == (4, 3, 2, 12, 12)
+    assert masks.shape == (4, 2, 12, 12)
+    assert metadata["position"].tolist()[:2] == ["000000", "000000"]
+
+    cell = metadata[
+        (metadata["label"] == 2) & (metadata["t"] == 1)
+    ].index.item()
+    assert metadata.loc[cell, "infected"] == 1
+    origin = metadata.loc[cell, ["origin_z", "origin_y", "origin_x"]]
+    assert origin.tolist() == [1, 19, 29]
+    image = zarr.open_group(str(tracked_plate))["A/1/000000/0"]
+    np.testing.assert_array_equal(
+        patches[cell], image[1, :, 1:3, 19:31, 29:41]
+    )
+    assert masks[cell].sum() == 2 * 10 * 10
+
+    # Cell 1 at t=0 sits against the top left corner and is zero padded
+    first = metadata[
+        (metadata["label"] == 1) & (metadata["t"] == 0)
+    ].index.item()
+    assert metadata.loc[first, "infected"] == 0
+    assert metadata.loc[first, ["origin_y", "origin_x"]].tolist() == [-2, -1]
+    assert not patches[first, :, :, :2].any()
+    assert not patches[first, :, :, :, :1].any()
+    np.testing.assert_array_equal(
+        patches[first, :, :, 2:, 1:], image[0, :, 1:3, 0:10, 0:11]
+    )
+    assert masks[first].sum() == 2 * 4 * 5
@@ -0,0 +1,169 @@
+import threading
+
+import numpy as np
+import pytest
+from click.testing import CliRunner
+from iohub import open_ome_zarr
+
+from chanzuck.cli import cli
+from chanzuck.utils.label_storage import LABEL_NAME
+from chanzuck.utils.pipeline import Stage, fingerprint, run_stages
+
+
+def make_stage(name, deps=(), inputs=None, run=None, complete=True):
+    inputs = inputs if inputs is not None else {}
+    return Stage(
+        name,
+        deps,
+        lambda: fingerprint(inputs.get(name)),
+        run or (lambda: None),
+        lambda: complete,
+    )
+
+
+class TestRunStages:
+
+    def test_independent_stages_run_concurrently(self):
+        # Both branches must be inside run() at the same time to pass
+        barrier = threading.Barrier(2, timeout=5)
+        stages = [
+            make_stage("a"),
+            make_stage("b", ("a",), run=barrier.wait),
+            make_stage("c", ("a",), run=barrier.wait),
+        ]
+        status = run_stages(stages, {})
+        assert status == {"a": "ran", "b": "ran", "c": "ran"}
+
+    def test_up_to_date_stages_are_skipped(self):
+        inputs = {"a": 1, "b": 1}
+        record = {}
+        stages = [make_stage("a", inputs=inputs), make_stage("b", ("a",))]
+        run_stages(stages, record)
+
+        assert run_stages(stages, record) == {"a": "skipped", "b": "skipped"}
+        inputs["a"] = 2
+        assert run_stages(stages, record)["a"] == "ran"
+        assert run_stages(stages, record, force=("b",))["b"] == "ran"
+
+    def test_missing_outputs_rerun(self):
+        record = {}
+        stages = [make_stage("a", complete=False)]
+        run_stages(stages, record)
+        assert run_stages(stages, record) == {"a": "ran"}
+
+    def test_failure_blocks_downstream_only(self):
+        def fail():
+            raise RuntimeError("boom")
+
+        record = {}
+        stages = [
+            make_stage("a", run=fail),
+            make_stage("b", ("a",)),
+            make_stage("c"),
+        ]
+        status = run_stages(stages, record)
+        assert status == {"a": "failed", "b": "blocked", "c": "ran"}
+        assert "a" not in record
+
+    def test_cycles_are_rejected(self):
+        with pytest.raises(ValueError, match="cycle"):
+            run_stages([make_stage("a", ("b",)), make_stage("b", ("a",))], {})
+
+
+def test_run_command_caches_stages(tracked_plate, tmp_path):
+    config = tmp_path / "pipeline.toml"
+    config.write_text(
+        f"""
+dataset = "{tracked_plate}"
+stats_dir = "stats"
+plots_dir = "plots"
+
+[selection]
+positions = ["000000"]
+
+[pyramid]
+levels = 2
+
+[stats]
+
+[plots]
+format = "png"
+"""
+    )
+
+    first = CliRunner().invoke(cli, ["run", str(config)])
+    assert first.exit_code == 0, first.output
+    assert (tmp_path / "stats" / "A" / "1" / "000000_stats.csv").exists()
+    assert (tmp_path / "plots" / "cell_count_over_time.png").exists()
+
+    second = CliRunner().invoke(cli, ["run", str(config)])
+    assert second.output.count("skipped") == 3
+
+    # New labels make everything downstream of them stale
+    with open_ome_zarr(tracked_plate, mode="a") as dataset:
+        labels = dataset["A/1/000000"][LABEL_NAME]
+        labels[1] = np.zeros(labels.shape[1:], dtype=labels.dtype)
+    third = CliRunner().invoke(cli, ["run", str(config)])
+    assert third.output.count("ran") == 3
+
+
+def test_track_stage_runs_before_stats(tracked_plate, tmp_path):
+    config = tmp_path / "pipeline.toml"
+    config.write_text(
+        f"""
+dataset = "{tracked_plate}"
+stats_dir = "stats"
+
+[selection]
+positions = ["000000"]
+
+[track]
+max_gap = 1
+
+[stats]
+"""
+    )
+
+    first = CliRunner().invoke(cli, ["run", str(config)])
+    assert first.exit_code == 0, first.output
+    assert first.output.index("'track'") < first.output.index("'stats'")
+    with open_ome_zarr(tracked_plate, mode="r") as dataset:
+        labels = dataset["A/1/000000"].zgroup[LABEL_NAME]
+        assert labels.attrs["chanzuck"]["tracks"]["max_gap"] == 1
+
+    # Already tracked labels are left as they are, so nothing is stale
+    second = CliRunner().invoke(cli, ["run", str(config)])
+    assert second.output.count("skipped") == 2
+
+    forced = CliRunner().invoke(cli, ["run", str(config), "--force", "track"])
+    assert forced.exit_code == 0, forced.output
+    assert "track    ran" in forced.output
+
+
+def test_relabeling_track_stage_is_up_to_date_after_one_run(
+    gap_plate, tmp_path
+):
+    config = tmp_path / "pipeline.toml"
+    config.write_text(
+        f"""
+dataset = "{gap_plate}"
+
+[selection]
+positions = ["000000"]
+
+[track]
+"""
+    )
+    with open_ome_zarr(gap_plate, mode="r") as dataset:
+        before = dataset["A/1/000000"].zgroup[LABEL_NAME][:]
+
+    first = CliRunner().invoke(cli, ["run", str(config)])
+    assert first.exit_code == 0, first.output
+    with open_ome_zarr(gap_plate, mode="r") as dataset:
+        after = dataset["A/1/000000"].zgroup[LABEL_NAME][:]
+    assert not np.array_equal(before, after)
+
+    # The relabeled labels are what the record holds
+    second = CliRunner().invoke(cli, ["run", str(config)])
+    assert second.exit_code == 0, second.output
+    assert "track    skipped" in second.output
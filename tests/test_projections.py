@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+import zarr
+from skimage.segmentation import find_boundaries
+
+from chanzuck.segment.tracking import track_dataset
+from chanzuck.utils.image_pyramider import (
+    create_downsample_pyramid_for_dataset,
+    timepoint_signatures,
+)
+from chanzuck.utils.label_storage import LABEL_NAME
+from chanzuck.utils.projections import (
+    outline_labels,
+    project_image,
+    project_labels,
+    stale_projections,
+)
+
+
+def test_outlines_match_inner_boundaries():
+    labels = np.zeros((2, 12, 14), dtype=np.uint16)
+    labels[0, 2:7, 3:9] = 1
+    labels[0, 5:10, 8:13] = 2
+    labels[1, :4, :4] = 3
+
+    outlines = outline_labels(labels)
+
+    assert outlines.dtype == labels.dtype
+    for plane, outline in zip(labels, outlines, strict=True):
+        expected = find_boundaries(plane, connectivity=1, mode="inner")
+        np.testing.assert_array_equal(outline, np.where(expected, plane, 0))
+
+
+def test_unknown_projection_raises():
+    with pytest.raises(ValueError, match="median"):
+        project_image(np.zeros((2, 3, 4)), "median")
+
+
+def test_pyramid_keeps_projections_up_to_date(tracked_plate):
+    position = zarr.open_group(str(tracked_plate / "A/1/000000"))
+    image, labels = position["0"][:], position[LABEL_NAME][:]
+
+    create_downsample_pyramid_for_dataset(
+        tracked_plate, levels=2, label_names=(LABEL_NAME,)
+    )
+
+    projections = position["projections"]
+    np.testing.assert_array_equal(projections["max"][:], image.max(axis=2))
+    np.testing.assert_allclose(
+        projections["mean"][:], image.mean(axis=2), rtol=1e-6
+    )
+    np.testing.assert_array_equal(
+        projections[LABEL_NAME][:], project_labels(labels)
+    )
+    assert projections["mean"].dtype == np.float32
+    assert projections[LABEL_NAME].shape == (2, 1, 32, 48)
+
+    # Only the outlines of the relabeled timepoint are rebuilt
+    stored = dict(projections[LABEL_NAME].attrs["signature"])
+    position[LABEL_NAME][1, 0, 2:4, 4:9, 5:10] = 3
+    labels[1, 0, 2:4, 4:9, 5:10] = 3
+    create_downsample_pyramid_for_dataset(
+        tracked_plate, levels=2, label_names=(LABEL_NAME,), incremental=True
+    )
+
+    updated = projections[LABEL_NAME].attrs["signature"]
+    assert updated["0/0"] == stored["0/0"] and updated["1/0"] != stored["1/0"]
+    np.testing.assert_array_equal(
+        projections[LABEL_NAME][:], project_labels(labels)
+    )
+    assert 3 in projections[LABEL_NAME][1]
+
+
+def test_tracking_remaps_outlines(tracked_plate):
+    position = zarr.open_group(str(tracked_plate / "A/1/000000"))
+    # Swapped IDs at t=1 are swapped back by tracking
+    labels = position[LABEL_NAME][:]
+    swapped = labels.copy()
+    swapped[1][labels[1] == 1] = 2
+    swapped[1][labels[1] == 2] = 1
+    position[LABEL_NAME][:] = swapped
+    create_downsample_pyramid_for_dataset(
+        tracked_plate, levels=2, label_names=(LABEL_NAME,)
+    )
+
+    results = track_dataset(tracked_plate, max_dist_um=5)
+
+    assert results["A/1/000000"]["relabeled"] == [1]
+
+    outlines = position[f"projections/{LABEL_NAME}"]
+    np.testing.assert_array_equal(outlines[:], project_labels(labels))
+    signatures = timepoint_signatures(position[LABEL_NAME])
+    assert stale_projections(outlines, signatures, range(2)) == []
@@ -0,0 +1,209 @@
+import dask.array as da
+import numpy as np
+import pytest
+from iohub import open_ome_zarr
+
+from chanzuck.utils.image_pyramider import (
+    coarsen_labels,
+    compute_level_factors,
+    create_downsample_pyramid_for_dataset,
+    list_pyramid_levels,
+)
+
+
+def mean_coarsened(array: np.ndarray, factor) -> np.ndarray:
+    """Reference coarsening of the last three axes, edge padded."""
+    pad = [(0, 0)] * (array.ndim - 3) + [
+        (0, -n % f) for n, f in zip(array.shape[-3:], factor, strict=True)
+    ]
+    padded = np.pad(array, pad, mode="edge")
+    shape = padded.shape[:-3]
+    for n, f in zip(padded.shape[-3:], factor, strict=True):
+        shape += (n // f, f)
+    return padded.reshape(shape).mean(axis=(-5, -3, -1))
+
+
+class TestLevelFactors:
+
+    def test_isotropic_keeps_z_until_xy_catches_up(self):
+        """Coarse Z is only reduced once Y/X voxels reach its size."""
+        factors = compute_level_factors(
+            (2.0, 0.325, 0.325), (10, 800, 1100), 6
+        )
+        assert factors == [
+            (1, 2, 2),
+            (1, 2, 2),
+            (1, 2, 2),
+            (2, 2, 2),
+            (2, 2, 2),
+        ]
+
+    def test_uniform_halves_every_axis(self):
+        factors = compute_level_factors(
+            (2.0, 0.325, 0.325), (10, 800, 1100), 3, isotropic=False
+        )
+        assert factors == [(2, 2, 2), (2, 2, 2)]
+
+    def test_single_slice_axis_is_never_reduced(self):
+        factors = compute_level_factors((1.0, 1.0, 1.0), (1, 64, 64), 3)
+        assert factors == [(1, 2, 2), (1, 2, 2)]
+
+
+class TestPyramidBuild:
+
+    def test_levels_are_cascaded_means(self, small_plate):
+        """Each level is the mean-coarsening of the previous one."""
+        create_downsample_pyramid_for_dataset(small_plate, levels=3)
+
+        with open_ome_zarr(small_plate, mode="r") as dataset:
+            pos = dataset["A/1/000000"]
+            base = pos["0"][:]
+            level_1 = pos["1"][:]
+            level_2 = pos["2"][:]
+            scale_2 = pos.get_effective_scale("2")
+
+        # Z (2.0 um) is coarser than Y/X (0.5 um), so only Y/X are halved
+        assert level_1.shape == (2, 3, 5, 16, 24)
+        assert level_2.shape == (2, 3, 5, 8, 12)
+        assert scale_2[-3:] == [2.0, 2.0, 2.0]
+
+        expected = base.reshape(2, 3, 5, 16, 2, 24, 2).mean(axis=(4, 6))
+        np.testing.assert_allclose(level_1, expected, rtol=1e-5)
+
+    def test_each_level_coarsens_the_previous_one(self, small_plate):
+        """Odd axes are edge padded, so the last Z slice is kept."""
+        factors = [(1, 2, 2), (2, 2, 2)]
+        create_downsample_pyramid_for_dataset(
+            small_plate, levels=3, factors=factors
+        )
+
+        with open_ome_zarr(small_plate, mode="r") as dataset:
+            pos = dataset["A/1/000000"]
+            levels = [pos[name][:] for name in ("0", "1", "2")]
+
+        # Z has 5 slices, the second level pads it to 6 before halving
+        assert levels[2].shape == (2, 3, 3, 8, 12)
+        for previous, level, factor in zip(
+            levels[:-1], levels[1:], factors, strict=True
+        ):
+            np.testing.assert_allclose(
+                level, mean_coarsened(previous, factor), rtol=1e-5
+            )
+
+    def test_incremental_only_builds_new_timepoints(self, small_plate):
+        """Appended timepoints are built, untouched ones are left alone."""
+        create_downsample_pyramid_for_dataset(small_plate, levels=2)
+
+        with open_ome_zarr(small_plate, mode="a") as dataset:
+            pos = dataset["A/1/000000"]
+            # Mark old level data so a rebuild would be noticed
+            pos["1"][0] = -1
+            pos["0"].resize((3,) + pos["0"].shape[1:])
+            pos["0"][2] = 1.0
+
+        create_downsample_pyramid_for_dataset(
+            small_plate, levels=2, incremental=True
+        )
+
+        with open_ome_zarr(small_plate, mode="r") as dataset:
+            level_1 = dataset["A/1/000000"]["1"][:]
+
+        assert level_1.shape[0] == 3
+        assert np.all(level_1[0] == -1)
+        np.testing.assert_allclose(level_1[2], 1.0)
+
+    @pytest.mark.parametrize("incremental", [False, True])
+    def test_fewer_levels_drop_the_deeper_ones(self, small_plate, incremental):
+        with open_ome_zarr(small_plate, mode="a") as dataset:
+            pos = dataset["A/1/000000"]
+            pos.create_zeros(
+                "Nuclei_Segmentation",
+                shape=(2, 1, 5, 32, 48),
+                dtype="uint32",
+                chunks=(1, 1, 5, 32, 48),
+            )
+        create_downsample_pyramid_for_dataset(small_plate, levels=3)
+
+        create_downsample_pyramid_for_dataset(
+            small_plate, levels=2, incremental=incremental
+        )
+
+        with open_ome_zarr(small_plate, mode="r") as dataset:
+            pos = dataset["A/1/000000"]
+            names = set(pos.array_keys())
+            datasets = pos.metadata.multiscales[0].get_dataset_paths()
+
+        assert datasets == ["0", "1"]
+        assert "2" not in names
+        assert "Nuclei_Segmentation_2" not in names
+        assert "Nuclei_Segmentation_1" in names
+
+    def test_wrong_number_of_factors_raises(self, small_plate):
+        with pytest.raises(ValueError):
+            create_downsample_pyramid_for_dataset(
+                small_plate, levels=3, factors=[(1, 2, 2)]
+            )
+
+
+class TestLabelPyramid:
+
+    def test_mode_keeps_majority_and_prefers_foreground(self):
+        labels = np.array(
+            [
+                [0, 7, 3, 3],
+                [0, 7, 3, 5],
+            ],
+            dtype=np.uint32,
+        )[None, None, None]
+
+        result = coarsen_labels(da.from_array(labels), (1, 2, 2)).compute()
+
+        # Tied 0/7 block goes to the label, 3 wins its block outright
+        np.testing.assert_array_equal(result[0, 0, 0], [[7, 3]])
+
+    @pytest.mark.parametrize("method", ["mode", "nearest"])
+    def test_never_invents_label_ids(self, method):
+        rng = np.random.default_rng(0)
+        labels = rng.choice([0, 4, 9, 1000], size=(1, 1, 5, 31, 33))
+        labels = labels.astype(np.uint32)
+
+        result = coarsen_labels(
+            da.from_array(labels, chunks=(1, 1, 5, 16, 16)),
+            (2, 2, 2),
+            method=method,
+        ).compute()
+
+        assert result.shape == (1, 1, 3, 16, 17)
+        assert result.dtype == np.uint32
+        assert set(np.unique(result)) <= {0, 4, 9, 1000}
+
+    def test_segmentation_gets_matching_levels(self, small_plate):
+        with open_ome_zarr(small_plate, mode="a") as dataset:
+            pos = dataset["A/1/000000"]
+            pos.create_zeros(
+                "Nuclei_Segmentation",
+                shape=(2, 1, 5, 32, 48),
+                dtype="uint32",
+                chunks=(1, 1, 5, 32, 48),
+            )
+            pos["Nuclei_Segmentation"][:, :, :, 4:12, 4:12] = 3
+
+        create_downsample_pyramid_for_dataset(small_plate, levels=3)
+
+        with open_ome_zarr(small_plate, mode="r") as dataset:
+            pos = dataset["A/1/000000"]
+            names = list_pyramid_levels(
+                pos.array_keys(), "Nuclei_Segmentation"
+            )
+            level_2 = pos["Nuclei_Segmentation_2"][:]
+            assert pos["2"].shape[-3:] == level_2.shape[-3:]
+            # The multiscales keep listing the image levels only
+            datasets = pos.metadata.multiscales[0].get_dataset_paths()
+
+        assert names == [
+            "Nuclei_Segmentation",
+            "Nuclei_Segmentation_1",
+            "Nuclei_Segmentation_2",
+        ]
+        assert datasets == ["0", "1", "2"]
+        assert set(np.unique(level_2)) == {0, 3}
@@ -0,0 +1,107 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+
+from chanzuck.cli import cli
+from chanzuck.spatial.stats import extract_cell_stats
+from chanzuck.utils.chunk_cache import open_cached_plate
+from chanzuck.utils.dataloader import CellposeZarrLoader
+from chanzuck.utils.describe import describe_dataset_fast
+from chanzuck.utils.label_storage import LABEL_NAME
+from chanzuck.utils.remote import FETCH_WORKERS_ENV, ConcurrentStore
+from chanzuck.utils.selection import Selection
+
+
+class SlowStore(dict):
+    """Dict store answering every read after a delay, counting reads."""
+
+    def __init__(self, *args, delay=0.05):
+        super().__init__(*args)
+        self.delay = delay
+        self.reads = 0
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            self.reads += 1
+        time.sleep(self.delay)
+        return super().__getitem__(key)
+
+
+class TestConcurrentStore:
+
+    def test_batches_are_fetched_concurrently(self):
+        store = ConcurrentStore(
+            SlowStore({f"a/{i}": b"x" for i in range(8)}), max_workers=8
+        )
+        start = time.perf_counter()
+        values = store.getitems([f"a/{i}" for i in range(8)] + ["a/missing"])
+        elapsed = time.perf_counter() - start
+
+        # Missing keys are left out like zarr expects
+        assert sorted(values) == [f"a/{i}" for i in range(8)]
+        assert elapsed < 8 * 0.05 / 2
+
+    def test_concurrent_requests_for_a_key_share_one_read(self):
+        inner = SlowStore({"a/0": b"x"}, delay=0.1)
+        store = ConcurrentStore(inner, max_workers=4)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lambda _: store["a/0"], range(4)))
+
+        assert results == [b"x"] * 4
+        assert inner.reads == 1
+        with pytest.raises(KeyError):
+            store["a/missing"]
+
+
+def test_url_reads_match_local_reads(tracked_plate):
+    url = f"file://{tracked_plate}"
+    local = CellposeZarrLoader(tracked_plate, channel_indices=[0, 1])
+    remote = CellposeZarrLoader(url, channel_indices=[0, 1])
+    assert remote.entries == local.entries
+    np.testing.assert_array_equal(remote[3]["image"], local[3]["image"])
+
+    selection = Selection(positions=("000000",))
+    pd.testing.assert_frame_equal(
+        extract_cell_stats(url, LABEL_NAME, selection=selection)["A/1"][
+            "000000"
+        ],
+        extract_cell_stats(tracked_plate, LABEL_NAME, selection=selection)[
+            "A/1"
+        ]["000000"],
+    )
+
+    assert describe_dataset_fast(url) == describe_dataset_fast(
+        tracked_plate, use_cache=False
+    )
+
+    root, cache = open_cached_plate(url)
+    np.testing.assert_array_equal(
+        root["A/1/000000/0"][1], local.array("A/1", "000000")[1]
+    )
+    assert cache.misses > 0
+
+
+def test_stats_command_accepts_urls(tracked_plate, tmp_path, monkeypatch):
+    monkeypatch.setenv(FETCH_WORKERS_ENV, "16")
+    result = CliRunner().invoke(
+        cli,
+        [
+            "--fetch-workers",
+            "4",
+            "generate-stats",
+            "--dataset-path",
+            f"file://{tracked_plate}",
+            "--stats-dir",
+            str(tmp_path),
+            "--positions",
+            "000000",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / "A" / "1" / "000000_stats.csv").exists()
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from iohub import open_ome_zarr
+
+from chanzuck.cli import cli
+from chanzuck.spatial.stats import extract_cell_stats
+from chanzuck.utils.dataloader import CellposeZarrLoader
+from chanzuck.utils.image_pyramider import (
+    create_downsample_pyramid_for_dataset,
+)
+from chanzuck.utils.selection import Selection, parse_range
+
+
+class TestSelection:
+
+    @pytest.mark.parametrize(
+        "text, expected",
+        [("1:3", (1, 3)), ("2:", (2, None)), (":4", (0, 4)), ("5", (5, 6))],
+    )
+    def test_parse_range(self, text, expected):
+        assert parse_range(text) == expected
+
+    @pytest.mark.parametrize("text", ["3:1", "a:b", "-1:2"])
+    def test_parse_range_rejects_bad_ranges(self, text):
+        with pytest.raises(ValueError):
+            parse_range(text)
+
+    def test_positions_match_ids_and_paths(self):
+        selection = Selection(wells=("A/1",), positions=("B/2/000001",))
+        assert not selection.includes("A/1", "000001")
+        assert Selection(positions=("000001",)).includes("A/1", "000001")
+        assert Selection(positions=("A/1/000001",)).includes("A/1", "000001")
+
+    def test_ranges_are_clipped(self):
+        selection = Selection(time_range=(1, None), z_range=(3, 99))
+        assert list(selection.timepoints(3)) == [1, 2]
+        assert selection.z_slice(5) == slice(3, 5)
+        assert not selection.covers(3, 5)
+        assert Selection().covers(3, 5)
+
+
+def test_loader_reads_only_selection(small_plate):
+    selection = Selection(
+        positions=("000001",), time_range=(1, 2), z_range=(1, 3)
+    )
+    loader = CellposeZarrLoader(
+        small_plate, channel_indices=[1], selection=selection
+    )
+
+    assert loader.positions == [("A/1", "000001")]
+    assert len(loader) == 1
+    sample = loader[0]
+    assert (sample["position"], sample["time"]) == ("000001", 1)
+    assert sample["image"].shape == (1, 2, 32, 48)
+
+
+def test_stats_of_a_time_range_update_existing_csv(tracked_plate, tmp_path):
+    # Only the first position is segmented
+    extract_cell_stats(
+        tracked_plate,
+        save_dir=tmp_path,
+        selection=Selection(positions=("000000",)),
+    )
+    csv = tmp_path / "A" / "1" / "000000_stats.csv"
+    before = pd.read_csv(csv)
+
+    stats = extract_cell_stats(
+        tracked_plate,
+        save_dir=tmp_path,
+        selection=Selection(positions=("000000",), time_range=(1, 2)),
+    )
+    after = pd.read_csv(csv)
+
+    assert list(stats["A/1"]["000000"]["time"].unique()) == [1]
+    pd.testing.assert_frame_equal(before, after)
+
+
+def test_stats_z_range_keeps_volume_coordinates(tracked_plate):
+    stats = extract_cell_stats(
+        tracked_plate,
+        selection=Selection(
+            positions=("000000",), time_range=(0, 1), z_range=(2, 5)
+        ),
+    )
+    df = stats["A/1"]["000000"].set_index("label")
+    # Cell 2 spans every plane, only planes 2-4 are measured
+    assert df.loc[2, "area"] == 3 * 10 * 10
+    assert df.loc[2, "centroid-0"] == pytest.approx(3.0)
+
+
+def test_pyramid_time_range_keeps_other_timepoints(small_plate):
+    create_downsample_pyramid_for_dataset(small_plate, levels=2)
+    with open_ome_zarr(small_plate, mode="a") as dataset:
+        pos = dataset["A/1/000000"]
+        before = pos["1"][:]
+        pos["0"][:] = 0
+
+    create_downsample_pyramid_for_dataset(
+        small_plate,
+        levels=2,
+        selection=Selection(positions=("000000",), time_range=(1, 2)),
+    )
+
+    with open_ome_zarr(small_plate, mode="r") as dataset:
+        level_1 = dataset["A/1/000000"]["1"][:]
+        other = dataset["A/1/000001"]["1"][:]
+    np.testing.assert_array_equal(level_1[0], before[0])
+    assert not level_1[1].any()
+    assert other.any()
+
+
+def test_cli_rejects_bad_range(small_plate):
+    result = CliRunner().invoke(
+        cli,
+        ["pyramid", "--dataset-path", str(small_plate), "--time-range", "3:1"],
+    )
+    assert result.exit_code != 0
+    assert "--time-range" in result.output
@@ -0,0 +1,160 @@
+import os
+
+import numpy as np
+import pytest
+import zarr
+from iohub import open_ome_zarr
+from numcodecs.errors import UnknownCodecError
+
+from chanzuck.segment.tracking import track_dataset
+from chanzuck.utils.chunk_cache import open_cached_plate
+from chanzuck.utils.image_pyramider import (
+    create_downsample_pyramid_for_dataset,
+)
+from chanzuck.utils.label_storage import (
+    LABEL_NAME,
+    create_label_array,
+    ensure_label_capacity,
+    label_compressor,
+)
+from chanzuck.utils.remote import open_dataset, open_group, open_plate
+from chanzuck.utils.sharding import (
+    SHARD_SUFFIX,
+    array_shards,
+    enable_sharding,
+    shard_shape,
+    sharded,
+    writing,
+)
+
+
+def files_under(path) -> list[str]:
+    return [
+        name
+        for _, _, names in os.walk(path)
+        for name in names
+        if not name.startswith(".")
+    ]
+
+
+def test_shard_shape_keeps_one_timepoint_per_shard():
+    assert shard_shape((4, 2, 8, 64, 64), (1, 1, 8, 16, 16), 2) == (
+        1,
+        2,
+        1,
+        4,
+        4,
+    )
+    # 16 chunks of 1 MiB per timepoint, 4 MiB shards
+    assert shard_shape(
+        (4, 1, 1, 2048, 2048), (1, 1, 1, 512, 512), 4, max_bytes=4 * 2**20
+    ) == (1, 1, 1, 2, 2)
+
+
+class TestShardedStore:
+
+    def test_chunks_round_trip_through_few_files(self, tmp_path):
+        array = zarr.open_group(str(tmp_path)).zeros(
+            "labels",
+            shape=(3, 1, 4, 40, 40),
+            chunks=(1, 1, 2, 16, 16),
+            dtype="uint16",
+            dimension_separator="/",
+        )
+        enable_sharding(array, (1, 1, 2, 2, 2))
+        data = np.random.default_rng(0).integers(0, 5, array.shape)
+        expected = np.zeros(array.shape, dtype=np.uint16)
+        expected[0] = data[0]
+        expected[1, 0, 1:3, 5:30, 5:30] = data[1, 0, 1:3, 5:30, 5:30]
+
+        with writing(array) as out:
+            out[0] = data[0]
+            # A partial write leaves incomplete shards for the flush
+            out[1, 0, 1:3, 5:30, 5:30] = data[1, 0, 1:3, 5:30, 5:30]
+
+        # 18 chunks at t=0 fit in 4 shards
+        files = files_under(tmp_path / "labels" / "0")
+        assert len(files) == 4
+        assert all(name.endswith(SHARD_SUFFIX) for name in files)
+        np.testing.assert_array_equal(sharded(array)[:], expected)
+
+        # Updating a chunk keeps the rest of its shard
+        with writing(array) as out:
+            out[1, 0, 0, :3, :3] = 7
+        expected[1, 0, 0, :3, :3] = 7
+        np.testing.assert_array_equal(sharded(array)[:], expected)
+
+        # Plate readers see through the shards
+        plate = open_plate(tmp_path)
+        np.testing.assert_array_equal(plate["labels"][:], expected)
+
+
+def test_sharded_pyramid_matches_chunked(tracked_plate, tmp_path):
+    create_downsample_pyramid_for_dataset(
+        tracked_plate, levels=2, label_names=(LABEL_NAME,)
+    )
+    with open_ome_zarr(tracked_plate, mode="r") as dataset:
+        pos = dataset["A/1/000000"]
+        chunked = {name: pos[name][:] for name in ("1", f"{LABEL_NAME}_1")}
+
+    create_downsample_pyramid_for_dataset(
+        tracked_plate, levels=2, label_names=(LABEL_NAME,), layout="sharded"
+    )
+    position = tracked_plate / "A" / "1" / "000000"
+    root, _ = open_cached_plate(tracked_plate)
+    for name, expected in chunked.items():
+        assert array_shards(open_group(position)[name]) is not None
+        # One shard per timepoint instead of one file per chunk
+        assert len(files_under(position / name)) == expected.shape[0]
+        np.testing.assert_array_equal(root[f"A/1/000000/{name}"][:], expected)
+
+
+def test_sharded_labels_are_promoted_and_tracked(small_plate):
+    labels = np.zeros((2, 1, 5, 32, 48), dtype=np.uint16)
+    labels[0, 0, 1:3, 2:6, 3:8] = 1
+    labels[1, 0, 1:3, 2:6, 3:8] = 2
+    with open_dataset(small_plate, mode="a") as dataset:
+        pos = dataset["A/1/000000"]
+        array = create_label_array(
+            pos,
+            LABEL_NAME,
+            shape=labels.shape,
+            chunks=(1, 1, 5, 16, 16),
+            dtype="uint16",
+            compressor=label_compressor(),
+            shards=True,
+        )
+        with writing(array) as out:
+            out[:] = labels
+        promoted = ensure_label_capacity(pos, LABEL_NAME, max_label=70_000)
+        assert promoted.dtype == np.uint32
+        assert array_shards(promoted) == (1, 1, 1, 2, 3)
+        np.testing.assert_array_equal(sharded(promoted)[:], labels)
+
+    track_dataset(small_plate, max_dist_um=5)
+
+    plate = open_plate(small_plate)
+    tracked = plate[f"A/1/000000/{LABEL_NAME}"]
+    assert tracked[1, 0, 2, 3, 4] == tracked[0, 0, 2, 3, 4] == 1
+
+
+def test_plain_readers_refuse_sharded_arrays(tracked_plate):
+    create_downsample_pyramid_for_dataset(
+        tracked_plate, levels=2, label_names=(LABEL_NAME,), layout="sharded"
+    )
+    name = f"{LABEL_NAME}_1"
+
+    # Reading the missing chunk keys would give zeros without an error
+    with pytest.raises(UnknownCodecError, match="chanzuck.sharded"):
+        zarr.open_group(str(tracked_plate / "A" / "1" / "000000"))[name]
+    with open_ome_zarr(tracked_plate, mode="r") as dataset:
+        with pytest.raises(UnknownCodecError):
+            dataset["A/1/000000"][name]
+
+    # Resizing through the shards keeps the layout
+    with open_dataset(tracked_plate, mode="a") as dataset:
+        array = dataset["A/1/000000"][name]
+        array.resize((3, *array.shape[1:]))
+        assert array_shards(array) is not None
+    with pytest.raises(UnknownCodecError):
+        zarr.open_group(str(tracked_plate / "A" / "1" / "000000"))[name]
@@ -0,0 +1,43 @@
+import pandas as pd
+
+from chanzuck.spatial.stats import (
+    find_stats_files,
+    load_stats_files,
+    stats_file_name,
+)
+
+
+class TestStatsLoading:
+
+    def test_finds_nested_well_directories(self, tmp_path):
+        """Stats written as <well>/<pos>_stats.csv are discovered."""
+        (tmp_path / "C" / "2").mkdir(parents=True)
+        (tmp_path / "C" / "2" / "000001_stats.csv").write_text("time\n0\n")
+        (tmp_path / "flat.csv").write_text("time\n0\n")
+        (tmp_path / "notes.txt").write_text("ignored")
+
+        files = find_stats_files(tmp_path)
+
+        assert [f.name for f in files] == ["000001_stats.csv", "flat.csv"]
+
+    def test_names_match_generate_stats(self, tmp_path):
+        """Names are <well_id>_<pos_id>, like generate-stats uses."""
+        path = tmp_path / "C" / "2" / "000001_stats.csv"
+        assert stats_file_name(path, tmp_path) == "C/2_000001"
+        assert stats_file_name(tmp_path / "A1.csv", tmp_path) == "A1"
+
+    def test_projects_columns_and_applies_dtypes(self, tmp_path):
+        """Only requested columns are parsed, missing ones are skipped."""
+        pd.DataFrame(
+            {"label": [1, 2], "time": [0, 1], "extent": [0.5, 0.6]}
+        ).to_csv(tmp_path / "A1_stats.csv", index=False)
+
+        names, dfs = load_stats_files(
+            [tmp_path / "A1_stats.csv"],
+            tmp_path,
+            dtypes={"label": "int64", "time": "int32", "infected": "int8"},
+        )
+
+        assert names == ["A1"]
+        assert list(dfs[0].columns) == ["label", "time"]
+        assert dfs[0]["time"].dtype == "int32"
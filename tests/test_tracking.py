@@ -0,0 +1,131 @@
+import pandas as pd
+import zarr
+from click.testing import CliRunner
+
+from chanzuck.cli import cli
+from chanzuck.segment.tracking import (
+    OBJECT_COLUMNS,
+    OBJECT_GROUP,
+    link_tracks,
+    load_object_table,
+    track_dataset,
+)
+from chanzuck.utils.cell_index import load_cell_index
+from chanzuck.utils.label_storage import (
+    LABEL_NAME,
+)
+
+
+def objects(rows) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=list(OBJECT_COLUMNS))
+
+
+class TestLinkTracks:
+
+    def test_gaps_are_closed(self):
+        table = objects(
+            [(1, t, 2, 10 + t, 10, 100) for t in (0, 1, 4)]
+            + [(2, t, 2, 40, 40, 100) for t in range(5)]
+        )
+
+        luts, _ = link_tracks(table, (1, 1, 1), max_dist_um=5, max_gap=2)
+        assert luts[4][1] == luts[0][1] == 1
+        assert [lut[2] for lut in luts.values()] == [2] * 5
+
+        # A gap longer than max_gap starts a new track
+        luts, _ = link_tracks(table, (1, 1, 1), max_dist_um=5, max_gap=1)
+        assert luts[4][1] == 3
+
+    def test_divisions_end_the_mother_track(self):
+        table = objects(
+            [
+                (1, 0, 2, 10, 10, 100),
+                (1, 1, 2, 8, 10, 50),
+                (2, 1, 2, 12, 10, 50),
+                # Too small to be a daughter of label 1
+                (3, 1, 2, 40, 40, 100),
+                (1, 2, 2, 40, 41, 10),
+            ]
+        )
+
+        luts, divisions = link_tracks(table, (1, 1, 1), max_dist_um=5)
+
+        assert divisions == [{"t": 1, "parent": 1, "daughters": [2, 3]}]
+        assert luts[1].tolist() == [0, 2, 3, 4]
+        assert luts[2].tolist() == [0, 4]
+
+        _, divisions = link_tracks(
+            table, (1, 1, 1), max_dist_um=5, split_dist_um=0
+        )
+        assert divisions == []
+
+
+def test_object_table_only_remeasures_changed_timepoints(tracked_plate):
+    position = zarr.open_group(str(tracked_plate / "A/1/000000"))
+
+    table = load_object_table(position)
+    assert f"{OBJECT_GROUP}/{LABEL_NAME}" in position
+    assert table[["label", "t"]].values.tolist() == [
+        [1, 0],
+        [2, 0],
+        [1, 1],
+        [2, 1],
+    ]
+    assert table.iloc[0][["z", "y", "x", "area"]].tolist() == [
+        1.5,
+        3.5,
+        5.0,
+        40.0,
+    ]
+
+    position[LABEL_NAME][1] = 0
+    stored = position[f"{OBJECT_GROUP}/{LABEL_NAME}"].attrs["signature"]
+    assert load_object_table(position)["t"].tolist() == [0, 0]
+    updated = position[f"{OBJECT_GROUP}/{LABEL_NAME}"].attrs["signature"]
+    assert updated["0"] == stored["0"] and updated["1"] != stored["1"]
+
+
+def test_track_dataset_relabels_once(gap_plate):
+    position = zarr.open_group(str(gap_plate / "A/1/000000"))
+    load_cell_index(position)
+
+    results = track_dataset(gap_plate, max_dist_um=5, max_gap=2)
+
+    assert results["A/1/000000"]["tracks"] == 2
+    assert results["A/1/000000"]["relabeled"] == [3]
+    labels = position[LABEL_NAME]
+    assert labels[3, 0, 2, 3, 4] == labels[0, 0, 2, 3, 4] == 1
+    assert labels[3, 0, 2, 25, 35] == 2
+    assert labels.attrs["chanzuck"]["tracks"]["max_gap"] == 2
+
+    # The stored tables follow the new labels without measuring again
+    index = load_cell_index(position)
+    assert index[index["label"] == 1]["t"].tolist() == [0, 1, 3]
+    table = load_object_table(position)
+    assert table[table["t"] == 3]["label"].tolist() == [1, 2]
+
+    # Tracking tracked labels changes nothing
+    again = track_dataset(gap_plate, max_dist_um=5, max_gap=2)
+    assert again["A/1/000000"]["relabeled"] == []
+
+
+def test_track_command(gap_plate):
+    result = CliRunner().invoke(
+        cli,
+        [
+            "track",
+            "--dataset-path",
+            str(gap_plate),
+            "--max-dist-um",
+            "5",
+            "--max-gap",
+            "0",
+            "--positions",
+            "000000",
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    labels = zarr.open_group(str(gap_plate / "A/1/000000"))[LABEL_NAME]
+    # Without gap closing the cell comes back as a new track
+    assert labels[3, 0, 2, 3, 4] == 3
@@ -0,0 +1,81 @@
+import matplotlib
+import numpy as np
+import pandas as pd
+
+from chanzuck.spatial.visualize import (
+    PLOTS,
+    density_histogram,
+    plot_mean_dapi_vs_virus,
+    render_plots_to_dir,
+)
+
+matplotlib.use("agg")
+
+
+class TestDapiVsVirusDensity:
+
+    def test_density_histogram_counts_every_point(self):
+        """Every point inside the extent lands in exactly one bin."""
+        rng = np.random.default_rng(0)
+        x = rng.uniform(0, 10, 5000)
+        y = rng.uniform(0, 5, 5000)
+
+        grid = density_histogram(x, y, bins=32, extent=(0, 10, 0, 5))
+
+        assert grid.shape == (32, 32)
+        assert grid.sum() == 5000
+
+    def test_density_histogram_is_indexed_y_then_x(self):
+        """Points are binned as [y_bin, x_bin] for imshow(origin='lower')."""
+        grid = density_histogram(
+            np.array([9.5]), np.array([0.5]), bins=10, extent=(0, 10, 0, 10)
+        )
+        assert grid[0, 9] == 1
+
+    def test_auto_mode_falls_back_to_density(self, tmp_path, mocker):
+        """Large tables are rendered as a binned density, not a scatter."""
+        scatter = mocker.patch("chanzuck.spatial.visualize.plt.scatter")
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame(
+            {
+                "mean_intensity-nuclei_DAPI": rng.normal(400, 50, 1000),
+                "mean_intensity-virus_mCherry": rng.gamma(2, 50, 1000),
+            }
+        )
+        out = tmp_path / "density.png"
+
+        plot_mean_dapi_vs_virus(
+            ["A1_0", "A1_1"], [df, df], save_path=out, max_scatter_points=100
+        )
+
+        scatter.assert_not_called()
+        assert out.exists()
+
+
+def test_render_plots_to_dir_writes_every_plot(tmp_path):
+    """One non-empty file per plot, in the requested format."""
+    rng = np.random.default_rng(0)
+    dfs = [
+        pd.DataFrame(
+            {
+                "label": np.tile(np.arange(1, 21), 3),
+                "time": np.repeat(np.arange(3), 20),
+                "mean_intensity-Phase3D": rng.normal(100, 10, 60),
+                "mean_intensity-nuclei_DAPI": rng.normal(400, 50, 60),
+                "mean_intensity-virus_mCherry": rng.gamma(2, 50, 60),
+            }
+        )
+        for _ in range(2)
+    ]
+
+    paths = render_plots_to_dir(
+        ["A1_0", "A1_1"], dfs, tmp_path / "plots", fmt="svg", max_workers=2
+    )
+
+    assert sorted(p.name for p in paths) == sorted(f"{n}.svg" for n in PLOTS)
+    assert sorted(p.name for p in (tmp_path / "plots").iterdir()) == sorted(
+        p.name for p in paths
+    )
+    for path in paths:
+        assert path.stat().st_size > 0
+        assert path.read_text().lstrip().startswith("<?xml")
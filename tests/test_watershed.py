@@ -0,0 +1,69 @@
+import sys
+
+import numpy as np
+import pytest
+import zarr
+from scipy.ndimage import label as ndi_label
+
+from chanzuck.segment.nuclei_segmentation import (
+    segment_and_track_3d_over_time,
+)
+from chanzuck.segment.watershed import watershed_segment
+from chanzuck.utils.label_storage import LABEL_NAME
+
+
+@pytest.fixture
+def touching_nuclei():
+    """Three ellipsoids, the first two touching, with a little noise."""
+    zz, yy, xx = np.indices((20, 64, 64))
+    truth = np.zeros(zz.shape, dtype=np.int32)
+    for label, (y, x) in enumerate([(20, 22), (20, 36), (44, 30)], start=1):
+        inside = (zz - 10) ** 2 / 49 + ((yy - y) ** 2 + (xx - x) ** 2) / 64
+        truth[inside < 1] = label
+    noise = np.random.default_rng(0).normal(0, 0.05, truth.shape)
+    return (truth > 0) + noise.astype(np.float32), truth
+
+
+def majority_labels(truth, labels):
+    majority = {}
+    for label in np.unique(truth[truth > 0]):
+        values, counts = np.unique(labels[truth == label], return_counts=True)
+        majority[label] = (
+            values[counts.argmax()],
+            counts.max() / counts.sum(),
+        )
+    return majority
+
+
+@pytest.mark.parametrize("tile", [64, 24])
+def test_touching_nuclei_are_split(touching_nuclei, tile):
+    image, truth = touching_nuclei
+    # Otsu alone merges the touching pair
+    assert ndi_label(image > 0.5)[1] == 2
+
+    labels = watershed_segment(image, tile=tile, overlap=12)
+    majority = majority_labels(truth, labels)
+
+    assert len(np.unique(labels)) - 1 == 3
+    assert len({label for label, _ in majority.values()}) == 3
+    assert all(fraction > 0.95 for _, fraction in majority.values())
+
+
+def test_tiles_agree_with_a_single_tile(touching_nuclei):
+    image, _ = touching_nuclei
+    whole = watershed_segment(image, tile=64)
+    tiled = watershed_segment(image, tile=24, overlap=12)
+    # Same partition of the foreground, whatever the IDs
+    pairs = np.unique(np.stack([whole.ravel(), tiled.ravel()]), axis=1)
+    assert pairs.shape[1] == len(np.unique(whole))
+
+
+def test_cpu_models_run_without_torch(small_plate, monkeypatch):
+    """The watershed mode never imports torch or Cellpose."""
+    monkeypatch.setitem(sys.modules, "torch", None)
+    monkeypatch.setitem(sys.modules, "cellpose", None)
+
+    segment_and_track_3d_over_time(small_plate, model_type="watershed")
+
+    labels = zarr.open_group(str(small_plate), mode="r")["A/1/000000"]
+    assert labels[LABEL_NAME].shape[0] == 2
@@ -0,0 +1,151 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+from click.testing import CliRunner
+from iohub import open_ome_zarr
+
+from chanzuck.cli import cli
+from chanzuck.utils.selection import parse_shard
+from chanzuck.utils.work_queue import WorkQueue, list_positions, run_positions
+
+# One worker: claims positions off the queue and logs each one it processes
+WORKER = """
+import sys, time
+from chanzuck.utils.work_queue import WorkQueue, run_positions
+
+plate, log = sys.argv[1], sys.argv[2]
+
+def process(selection):
+    with open(log, "a") as f:
+        f.write(selection.positions[0] + "\\n")
+    time.sleep(0.05)
+
+run_positions(plate, process, queue=WorkQueue(plate, "test", lease=30))
+"""
+
+
+@pytest.fixture
+def many_positions(tmp_path):
+    plate_path = tmp_path / "many.zarr"
+    with open_ome_zarr(
+        plate_path, layout="hcs", mode="w", channel_names=["DAPI"]
+    ) as dataset:
+        for well in ("1", "2"):
+            for i in range(6):
+                pos = dataset.create_position("A", well, f"{i:06d}")
+                pos.create_zeros("0", (1, 1, 1, 4, 4), dtype=np.uint8)
+    return plate_path
+
+
+def test_parse_shard():
+    assert parse_shard("1/4") == (1, 4)
+    for text in ("4/4", "1", "a/b"):
+        with pytest.raises(ValueError):
+            parse_shard(text)
+
+
+def test_shards_split_positions(many_positions):
+    shards = [list_positions(many_positions, shard=(i, 5)) for i in range(5)]
+    flat = [p for shard in shards for p in shard]
+    assert sorted(flat) == list_positions(many_positions)
+    assert len(set(flat)) == len(flat) == 12
+
+
+def test_processes_share_queue_without_double_work(many_positions, tmp_path):
+    log = tmp_path / "log.txt"
+    workers = [
+        subprocess.Popen(
+            [sys.executable, "-c", WORKER, str(many_positions), str(log)],
+            env={**os.environ, "PYTHONPATH": os.getcwd()},
+        )
+        for _ in range(3)
+    ]
+    assert all(worker.wait(timeout=120) == 0 for worker in workers)
+
+    processed = log.read_text().split()
+    assert sorted(processed) == [
+        f"{w}/{p}" for w, p in list_positions(many_positions)
+    ]
+    queue = WorkQueue(many_positions, "test")
+    assert all(queue.is_done(*key) for key in list_positions(many_positions))
+    # The markers do not disturb reading the plate
+    with open_ome_zarr(many_positions, mode="r") as dataset:
+        assert len(list(dataset.positions())) == 12
+
+
+def test_dead_claims_are_taken_over(many_positions):
+    queue = WorkQueue(many_positions, "test", lease=5)
+    (dead, alive, *_) = list_positions(many_positions)
+    for key, age in ((dead, 60), (alive, 0)):
+        claim = queue.marker_dir(*key) / "claim"
+        claim.parent.mkdir(parents=True)
+        claim.write_text("{}")
+        os.utime(claim, (time.time() - age,) * 2)
+
+    processed = run_positions(
+        many_positions, lambda selection: None, queue=queue
+    )
+    assert dead in processed
+    assert alive not in processed
+    assert len(processed) == 11
+
+
+def test_failures_release_the_claim(many_positions):
+    queue = WorkQueue(many_positions, "test")
+    key = list_positions(many_positions)[0]
+    with pytest.raises(RuntimeError):
+        with queue.claim(*key) as claimed:
+            assert claimed
+            raise RuntimeError("boom")
+    assert not (queue.marker_dir(*key) / "claim").exists()
+    assert not queue.is_done(*key)
+    assert queue.try_claim(*key)
+
+
+def test_taken_over_claims_are_left_to_the_new_owner(many_positions):
+    key = list_positions(many_positions)[0]
+    stalled = WorkQueue(many_positions, "test", lease=0.2)
+    other = WorkQueue(many_positions, "test", lease=0.2)
+    claim = stalled.marker_dir(*key) / "claim"
+
+    with stalled.claim(*key) as claimed:
+        assert claimed
+        # Stalled past its lease, the claim is taken over
+        os.utime(claim, (time.time() - 10,) * 2)
+        assert other.try_claim(*key)
+        time.sleep(0.2)
+        # The heartbeat stopped instead of refreshing the other claim
+        os.utime(claim, (time.time() - 10,) * 2)
+        time.sleep(0.2)
+        assert time.time() - claim.stat().st_mtime > 5
+
+    assert claim.exists()
+    assert json.loads(claim.read_text())["worker"] == other.worker_id
+    other.release(*key)
+    assert not claim.exists()
+
+
+def test_generate_stats_queue(tracked_plate, tmp_path):
+    args = [
+        "generate-stats",
+        "--dataset-path",
+        str(tracked_plate),
+        "--stats-dir",
+        str(tmp_path),
+        "--positions",
+        "000000",
+        "--queue",
+        "run1",
+    ]
+    first = CliRunner().invoke(cli, args)
+    second = CliRunner().invoke(cli, args)
+
+    assert first.exit_code == 0, first.output
+    assert "Processed 1 positions" in first.output
+    assert "Processed 0 positions" in second.output
+    assert (tmp_path / "A" / "1" / "000000_stats.csv").exists()